@@ -0,0 +1,130 @@
+import csv
+import io
+
+from storage import get_store, transact
+from utils import read_users
+from metrics import timed
+
+# Bulk roster administration for the teacher panel: CSV import/export, a paged
+# and filterable view of the roster, and one batch that applies any number of
+# cash and team changes (and new students) as a single transaction, i.e. one
+# log record no matter how many students it touches.
+
+ROSTER_FIELDS = ("name", "team", "cash")
+DEFAULT_CASH = 10000
+
+
+def _team(record):
+    return record.get("team") or "No Team"
+
+
+def export_roster(users_file):
+    users = read_users(users_file)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(ROSTER_FIELDS)
+    for name in sorted(users):
+        writer.writerow((name, _team(users[name]), users[name]["cash"]))
+    return out.getvalue()
+
+
+def parse_roster(text):
+    # CSV with a "name" column and optional "team" / "cash" columns. Returns
+    # (changes, errors): {name: {"team"?, "cash"?}} and ["line N: ..."].
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    fields = {f.strip().lower() for f in reader.fieldnames or ()}
+    if "name" not in fields:
+        return {}, ["missing a \"name\" column"]
+    changes, errors = {}, []
+    for line, row in enumerate(reader, start=2):
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+        name = row.get("name", "")
+        if not name:
+            errors.append(f"line {line}: no name")
+            continue
+        if len(name) > 30:
+            errors.append(f"line {line}: name longer than 30 characters")
+            continue
+        change = {}
+        if row.get("team"):
+            change["team"] = row["team"]
+        if row.get("cash"):
+            try:
+                cash = float(row["cash"].replace(",", "").lstrip("$"))
+            except ValueError:
+                errors.append(f"line {line}: cash {row['cash']!r} is not a number")
+                continue
+            if cash < 0:
+                errors.append(f"line {line}: cash can't be negative")
+                continue
+            change["cash"] = int(cash) if cash.is_integer() else cash
+        changes[name] = change
+    return changes, errors
+
+
+@timed("admin.apply_roster")
+def apply_roster(users_file, changes, create=True, after=None):
+    # Apply {name: {"team"?, "cash"?}} in one transaction. Unknown names become
+    # new students when create is set. Returns {"created", "updated", "unchanged", "skipped"}.
+    get_store(users_file).collection(users_file, {})
+
+    def run(tx):
+        counts = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        for name, change in changes.items():
+            record = tx.get(users_file, name)
+            if record is None:
+                if not create:
+                    counts["skipped"] += 1
+                    continue
+                record = {"cash": change.get("cash", DEFAULT_CASH), "positions": {}, "pnl": 0,
+                          "team": change.get("team") or "No Team"}
+                tx.put(users_file, name, record)
+                counts["created"] += 1
+                continue
+            updated = dict(record)
+            for field in ("team", "cash"):
+                if field in change:
+                    updated[field] = change[field]
+            if updated == record:
+                counts["unchanged"] += 1
+                continue
+            tx.put(users_file, name, updated)
+            counts["updated"] += 1
+        return counts
+    return transact(users_file, run, after=after)
+
+
+def roster_teams(users_file):
+    return sorted({_team(record) for record in read_users(users_file).values()})
+
+
+@timed("admin.roster_page")
+def roster_page(users_file, search="", team=None, page=0, page_size=25):
+    # (rows, total) for one page of the roster editor; rows are
+    # {"name", "team", "cash"} sorted by name
+    users = read_users(users_file)
+    search = search.strip().lower()
+    names = sorted(
+        name for name, record in users.items()
+        if (not search or search in name.lower()) and (team is None or _team(record) == team)
+    )
+    rows = [
+        {"name": name, "team": _team(users[name]), "cash": users[name]["cash"]}
+        for name in names[page * page_size:(page + 1) * page_size]
+    ]
+    return rows, len(names)
+
+
+def edited_rows(before, after):
+    # {name: change} for the rows of a page whose team or cash were edited
+    changes = {}
+    for old, new in zip(before, after):
+        change = {}
+        team = (new.get("team") or "").strip() or "No Team"
+        if team != old["team"]:
+            change["team"] = team
+        if new.get("cash") is not None and new["cash"] != old["cash"]:
+            change["cash"] = new["cash"]
+        if change:
+            changes[old["name"]] = change
+    return changes
@@ -0,0 +1,300 @@
+import numpy as np
+
+from storage import get_store, collection_name
+from archive import get_archive, ARCHIVE_NAME
+from ledger import get_ledger
+from prices import current_market
+from metrics import timed, count
+from utils import is_bot
+
+# Trading statistics per student and per team, kept as running totals.
+#
+# Realized numbers come from closed positions (that is where this game books
+# PnL): trade count, wins, realized PnL, the running peak and deepest drawdown
+# of cumulative realized PnL, the notional of closed round trips, and PnL per
+# ticker. A close counts for the team it was recorded with, so moving a student
+# keeps their past closes with the old team. Each close updates its student
+# and team in O(1). A full rebuild
+# (startup, reset, a close we could not follow) recomputes everything from the
+# archive and the hot closed trades in a few NumPy passes.
+#
+# Unrealized PnL and the notional of open positions come from the ledger at
+# the shared market prices when asked for. Liquidity bots' trades are left out.
+
+
+class Stats:
+    __slots__ = ("trades", "wins", "pnl", "peak", "drawdown", "notional", "by_ticker")
+
+    def __init__(self):
+        self.trades = 0
+        self.wins = 0
+        self.pnl = 0.0
+        self.peak = 0.0
+        self.drawdown = 0.0
+        self.notional = 0.0
+        self.by_ticker = {}
+
+    def add(self, ticker, pnl, notional):
+        self.trades += 1
+        self.wins += pnl > 0
+        self.pnl += pnl
+        self.peak = max(self.peak, self.pnl)
+        self.drawdown = max(self.drawdown, self.peak - self.pnl)
+        self.notional += notional
+        self.by_ticker[ticker] = self.by_ticker.get(ticker, 0.0) + pnl
+
+    def summary(self, unrealized=0.0, open_notional=0.0):
+        return {
+            "trades": self.trades,
+            "win_rate": self.wins / self.trades if self.trades else None,
+            "realized": self.pnl,
+            "avg_pnl": self.pnl / self.trades if self.trades else None,
+            "max_drawdown": self.drawdown,
+            "unrealized": unrealized,
+            "turnover": self.notional + open_notional,
+            "by_ticker": dict(sorted(self.by_ticker.items(), key=lambda kv: -abs(kv[1]))),
+        }
+
+
+def _notional(qty, entry_price, exit_price):
+    # A closed round trip traded its entry and its exit
+    return abs(qty) * (entry_price + exit_price)
+
+
+def _drawdowns(group, pnl, n_groups):
+    # Peak-to-trough drop of cumulative PnL within each group, in row order
+    out = np.zeros(n_groups)
+    peaks = np.zeros(n_groups)
+    if len(pnl) == 0:
+        return out, peaks
+    order = np.argsort(group, kind="stable")
+    g, p = group[order], pnl[order]
+    first = np.concatenate(([0], np.flatnonzero(np.diff(g)) + 1))
+    lengths = np.diff(np.append(first, len(p)))
+    cs = np.cumsum(p)
+    cum = cs - np.repeat(cs[first] - p[first], lengths)
+    # Lift each group above the previous ones so one running max never leaks across groups
+    lift = 2.0 * (np.abs(cum).max() + 1.0) * np.repeat(np.arange(len(first)), lengths)
+    peak = np.maximum.accumulate(np.maximum(cum, 0.0) + lift) - lift
+    out[g[first]] = np.maximum.reduceat(peak - cum, first)
+    peaks[g[first]] = np.maximum.reduceat(peak, first)
+    return out, peaks
+
+
+class Analytics:
+    def __init__(self):
+        self.users = {}
+        self.teams = {}
+        self.members = {}    # team -> names, for the open side of team stats
+        self.team_of = {}
+        self.closes = 0      # closes counted, archived and hot
+        self.hot_seen = 0    # hot closed trades already counted
+        self.generation = None
+        self.dirty = True
+
+    def set_team(self, name, team):
+        old = self.team_of.get(name)
+        if old == team:
+            return
+        if old is not None:
+            self.members[old].discard(name)
+        if team is None:
+            self.team_of.pop(name, None)
+        else:
+            self.team_of[name] = team
+            self.members.setdefault(team, set()).add(name)
+
+    def load_teams(self, users):
+        self.members = {}
+        self.team_of = {}
+        for name in users:
+            if not is_bot(name):
+                self.set_team(name, _team(users, name))
+
+    def add(self, close, team):
+        self.closes += 1
+        if is_bot(close["user"]):
+            return
+        notional = _notional(close["qty"], close["entry_price"], close["exit_price"])
+        for key, table in ((close["user"], self.users), (team, self.teams)):
+            stats = table.get(key)
+            if stats is None:
+                stats = table[key] = Stats()
+            stats.add(close["ticker"], close["pnl"], notional)
+
+    def rebuild(self, archive, hot, team_of):
+        # Vectorized recompute over every close ever made, oldest first
+        table = archive.tables["closed_trades"]
+        names = list(archive.strings)
+        ids = dict(archive.ids)
+
+        def code(s):
+            if s not in ids:
+                ids[s] = len(names)
+                names.append(s)
+            return ids[s]
+
+        user = np.concatenate((table.column("user"), np.array([code(t["user"]) for t in hot], dtype=np.int64)))
+        ticker = np.concatenate((table.column("ticker"), np.array([code(t["ticker"]) for t in hot], dtype=np.int64)))
+        pnl = np.concatenate((table.column("pnl"), np.array([t["pnl"] for t in hot], dtype=np.float64)))
+        team = np.concatenate((table.column("team"), np.array([code(t["team"]) if t.get("team") else -1 for t in hot], dtype=np.int64)))
+        qty = np.concatenate((table.column("qty"), np.array([t["qty"] for t in hot], dtype=np.int64)))
+        entry = np.concatenate((table.column("entry_price"), np.array([t["entry_price"] for t in hot], dtype=np.float64)))
+        exit_ = np.concatenate((table.column("exit_price"), np.array([t["exit_price"] for t in hot], dtype=np.float64)))
+        notional = np.abs(qty) * (entry + exit_)
+        self.closes = len(pnl)
+        bots = [i for i, n in enumerate(names) if is_bot(n)]
+        if bots:
+            keep = ~np.isin(user, bots)
+            user, team, ticker, pnl, notional = user[keep], team[keep], ticker[keep], pnl[keep], notional[keep]
+
+        # Closes recorded without their team count for the student's current one
+        unknown = team < 0
+        if unknown.any():
+            fill = {u: code(team_of(names[u])) for u in np.unique(user[unknown]).tolist()}
+            current = np.zeros(len(names), dtype=np.int64)
+            current[list(fill)] = list(fill.values())
+            team[unknown] = current[user[unknown]]
+        team_codes, team = np.unique(team, return_inverse=True)
+        team_names = [names[t] for t in team_codes.tolist()]
+        team = team.ravel()
+
+        self.users = self._group(user, ticker, pnl, notional, names, names)
+        self.teams = self._group(team, ticker, pnl, notional, team_names, names)
+        self.hot_seen = len(hot)
+        count("analytics_rebuilds_total")
+        count("analytics_records_scanned_total", self.closes)
+        self.generation = archive.generation
+        self.dirty = False
+
+    def _group(self, group, ticker, pnl, notional, labels, tickers):
+        n = len(labels)
+        trades = np.bincount(group, minlength=n)
+        wins = np.bincount(group, weights=(pnl > 0).astype(np.float64), minlength=n)
+        total = np.bincount(group, weights=pnl, minlength=n)
+        traded = np.bincount(group, weights=notional, minlength=n)
+        drawdown, peak = _drawdowns(group, pnl, n)
+        pairs, inverse = np.unique(group * len(tickers) + ticker, return_inverse=True)
+        pair_pnl = np.bincount(inverse.ravel(), weights=pnl, minlength=len(pairs))
+        out = {}
+        for g in np.flatnonzero(trades):
+            stats = out[labels[g]] = Stats()
+            stats.trades = int(trades[g])
+            stats.wins = int(wins[g])
+            stats.pnl = float(total[g])
+            stats.peak = float(peak[g])
+            stats.drawdown = float(drawdown[g])
+            stats.notional = float(traded[g])
+        for pair, value in zip(pairs.tolist(), pair_pnl.tolist()):
+            g, t = divmod(pair, len(tickers))
+            out[labels[g]].by_ticker[tickers[t]] = value
+        return out
+
+
+def _team(users, name):
+    record = users.get(name) or {}
+    return record.get("team") or "No Team"
+
+
+def get_analytics(users_file, closed_trades_file):
+    store = get_store(users_file)
+    users_name, closed_name = collection_name(users_file), collection_name(closed_trades_file)
+    store.collection(users_file, {})
+    store.collection(closed_trades_file, [])
+    get_archive(closed_trades_file)
+
+    def build(store):
+        analytics = Analytics()
+        analytics.load_teams(store.collections[users_name])
+
+        def on_op(op):
+            if op is None or (op[0] == users_name and op[1] == "replace"):
+                analytics.load_teams(store.collections.get(users_name) or {})
+            elif op[0] == users_name:
+                student = op[1] == "put" and not is_bot(op[2])
+                analytics.set_team(op[2], _team(store.collections[users_name], op[2]) if student else None)
+            if op is None or op[0] == ARCHIVE_NAME or (op[0] == closed_name and op[1] != "put"):
+                analytics.dirty = True
+            elif op[0] == closed_name and not analytics.dirty:
+                if op[2] == analytics.hot_seen:
+                    close = store.collections[closed_name][op[2]]
+                    analytics.add(close, close.get("team") or analytics.team_of.get(close["user"], "No Team"))
+                    analytics.hot_seen += 1
+                else:
+                    analytics.dirty = True
+        store.listeners.append(on_op)
+        return analytics
+    return store.index(("analytics", users_name, closed_name), build)
+
+
+def _current(users_file, closed_trades_file):
+    # The analytics index, caught up; call under the store lock
+    store = get_store(users_file)
+    analytics = get_analytics(users_file, closed_trades_file)
+    archive = get_archive(closed_trades_file)
+    if analytics.dirty:
+        hot = store.collections[collection_name(closed_trades_file)]
+        archived = archive.tables["closed_trades"].rows
+        if archive.generation == analytics.generation and archived + len(hot) == analytics.closes:
+            # Only moved from the hot list to the archive
+            analytics.hot_seen = len(hot)
+            analytics.dirty = False
+        else:
+            users = store.collections[collection_name(users_file)]
+            analytics.rebuild(archive, [t for t in hot if t is not None], lambda name: _team(users, name))
+    return analytics
+
+
+@timed("analytics.performance")
+def performance(users_file, closed_trades_file, market_file, name=None, team=None):
+    # {"student": stats or None, "team": stats or None} for one student and/or team
+    store = get_store(users_file)
+    ledger = get_ledger(users_file)
+    engine = current_market(market_file)
+    store.refresh()
+    with store.lock():
+        analytics = _current(users_file, closed_trades_file)
+        prices = engine.snapshot()
+        out = {"student": None, "team": None}
+        if name is not None:
+            unrealized, open_notional = ledger.open_pnl(name, prices)
+            out["student"] = analytics.users.get(name, Stats()).summary(unrealized, open_notional)
+        if team is not None:
+            unrealized = open_notional = 0.0
+            for member in analytics.members.get(team, ()):
+                pnl, notional = ledger.open_pnl(member, prices)
+                unrealized += pnl
+                open_notional += notional
+            out["team"] = analytics.teams.get(team, Stats()).summary(unrealized, open_notional)
+        return out
+
+
+@timed("analytics.class_performance")
+def class_performance(users_file, closed_trades_file, market_file):
+    # (students, teams): summary rows for everyone, for the teacher panel
+    store = get_store(users_file)
+    ledger = get_ledger(users_file)
+    engine = current_market(market_file)
+    store.refresh()
+    with store.lock():
+        analytics = _current(users_file, closed_trades_file)
+        prices = engine.snapshot()
+        pnl, notional = ledger.unrealized(prices), ledger.open_notional()
+        users = store.collections[collection_name(users_file)]
+        students, team_open = {}, {}
+        for name in users:
+            if is_bot(name):
+                continue
+            uid = ledger.user_ids.get(name)
+            open_pnl = float(pnl[uid]) if uid is not None else 0.0
+            open_notional = float(notional[uid]) if uid is not None else 0.0
+            students[name] = analytics.users.get(name, Stats()).summary(open_pnl, open_notional)
+            team = _team(users, name)
+            acc = team_open.setdefault(team, [0.0, 0.0])
+            acc[0] += open_pnl
+            acc[1] += open_notional
+        teams = {
+            team: analytics.teams.get(team, Stats()).summary(*acc)
+            for team, acc in team_open.items()
+        }
+        return students, teams
@@ -2,8 +2,22 @@ import streamlit as st
 import json
 import os
 import random
-from datetime import datetime
-from utils import load_users, save_users, load_trades, save_trades, load_closed_trades, save_closed_trades
+from datetime import datetime, timedelta
+from utils import read_users, remaining, BOT_PREFIX, BOT_TEAM
+from orderbook import offers_page, open_tickers
+from leaderboard import standings
+from ledger import class_overview
+from history import closed_trades_page, closed_tickers
+import events
+import metrics
+from archive import ticker_volume
+from analytics import performance, class_performance
+from admin import export_roster, parse_roster, roster_page, roster_teams, edited_rows
+from classrooms import Classroom, create_classroom, shard_for, configured_shards
+from engine import get_engine
+from risk import RiskError, account_risk, limits as risk_limits
+from bots import start_bots, stop_bots, bots_running
+from timeline import state_at, time_range, market_at, standings_at, describe
 
 st.set_page_config(page_title="Moneyhub Demo", layout="wide")
 
@@ -52,13 +66,27 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-USERS_FILE = "data/users.json"
-TRADES_FILE = "data/trades.json"
-CLOSED_TRADES_FILE = "data/closed_trades.json"
+LIVE_REFRESH_SECONDS = 2
+PAGE_SIZE = 20
 
-users = load_users(USERS_FILE)
-trades = load_trades(TRADES_FILE)
-closed_trades = load_closed_trades(CLOSED_TRADES_FILE)
+
+def current_page(name, filters):
+    # Page number for a paged list; back to the first page whenever its filters change
+    if st.session_state.get(f"{name}_filters") != filters:
+        st.session_state[f"{name}_filters"] = filters
+        st.session_state[f"{name}_page"] = 0
+    return st.session_state.get(f"{name}_page", 0)
+
+
+def page_controls(name, page, has_more):
+    prev_col, label_col, next_col = st.columns([1, 2, 1])
+    if prev_col.button("⬅️ Previous", key=f"{name}_prev", disabled=page == 0):
+        st.session_state[f"{name}_page"] = page - 1
+        st.rerun()
+    label_col.markdown(f"<div style='text-align:center;'>Page {page + 1}</div>", unsafe_allow_html=True)
+    if next_col.button("Next ➡️", key=f"{name}_next", disabled=not has_more):
+        st.session_state[f"{name}_page"] = page + 1
+        st.rerun()
 
 st.title("\U0001F4CA MoneyHub Trading Demo – Classroom Edition")
 
@@ -79,31 +107,141 @@ if "username" not in st.session_state or "team" not in st.session_state:
     with st.form("login_form"):
         username_input = st.text_input("Enter your name:", max_chars=30)
         team_input = st.text_input("Enter your team name (optional):", max_chars=30)
+        code_input = st.text_input("Class code (leave blank for the demo class):", value=st.query_params.get("class", ""), max_chars=12)
         submitted = st.form_submit_button("Start")
 
     if submitted:
         if username_input.strip() == "":
             st.warning("Please enter your name to begin.")
             st.stop()
+        if username_input.strip().lower().startswith(BOT_PREFIX) or team_input.strip() == BOT_TEAM:
+            st.warning(f"Names starting with \"{BOT_PREFIX}\" and the {BOT_TEAM} team are reserved for liquidity bots.")
+            st.stop()
+        try:
+            room = Classroom(code_input or None)
+        except ValueError as e:
+            st.warning(str(e))
+            st.stop()
+        if not room.exists():
+            if username_input.strip() != "teacher":
+                st.warning(f"There is no class with code {room.code}. Ask your teacher for the code.")
+                st.stop()
+            create_classroom(code=room.code)
         # ✅ Set session state BEFORE rerun
         st.session_state.username = username_input.strip()
         st.session_state.team = team_input.strip() if team_input else "No Team"
+        st.session_state.class_code = room.code
         st.rerun()
+    st.stop()
 
 # ✅ Now safe to access these values
 username = st.session_state.get("username")
 team = st.session_state.get("team")
 
+# Everything below reads and writes this session's classroom only
+room = Classroom(st.session_state.get("class_code"))
+shards, this_shard = configured_shards()
+if shards and this_shard and shard_for(room.code, shards) != this_shard:
+    owner = shard_for(room.code, shards)
+    st.error(f"Class {room.name} is hosted on another server.")
+    st.markdown(f"[Continue to your class]({owner}/?class={room.code or ''})")
+    st.stop()
+
+# Every change goes through the classroom's engine; the page only reads and renders
+engine = get_engine(room.data_dir)
+USERS_FILE = engine.users_file
+TRADES_FILE = engine.trades_file
+CLOSED_TRADES_FILE = engine.closed_trades_file
+MARKET_FILE = engine.market_file
+
+# Timing spans for this run; the teacher can also profile their own reruns
+session_label = f"{room.name} · {username}"
+metrics.start_rerun(session_label, profile=st.session_state.get("profile_mode"))
+
+with metrics.span("load"):
+    # Finished offers and closed trades move to the archive once enough pile up, so
+    # the files below only hold open interest
+    engine.maintain()
+
+    # Shared read-only views: parsed once per process and only rebuilt after a write
+    users = read_users(USERS_FILE)
 
 
 if username not in users:
-    users[username] = {"cash": 10000, "positions": {}, "pnl": 0, "team": team}
-    save_users(USERS_FILE, users)
+    engine.join(username, team)
+    users = read_users(USERS_FILE)
 
 user_data = users[username]
 st.success(f"Welcome, {username}! Your starting cash: ${user_data['cash']:,.2f}")
 
-view = st.sidebar.radio("Navigation", ["Submit Trade", "View Trades", "My Portfolio", "Leaderboard", "💡 Tips & Strategy"])
+st.sidebar.caption(f"🏫 Class: **{room.name}**")
+if st.sidebar.button("🚪 Switch class"):
+    for key in ("username", "team", "class_code"):
+        st.session_state.pop(key, None)
+    st.rerun()
+
+view = st.sidebar.radio("Navigation", ["Submit Trade", "View Trades", "My Portfolio", "Leaderboard", "💡 Tips & Strategy"], key="view")
+
+# Live updates: each session gets its own event queue. The live panels below
+# (offers, portfolio, leaderboard) are fragments on a timer: each run drains
+# the queue and toasts what came in, and only the panel itself reruns. It
+# reuses what it read last time unless an event touched it, its inputs
+# changed (prices count: anything marked to market is keyed on the price
+# tick), or this session acted on it; a full rerun always reads afresh.
+if st.session_state.get("feed_user") != (room.data_dir, username):
+    if "feed" in st.session_state:
+        st.session_state.feed.close()
+    st.session_state.feed = events.subscribe(username, scope=room.data_dir)
+    st.session_state.feed_user = (room.data_dir, username)
+
+LIVE_VIEWS = {
+    "View Trades": {"offer", "fill"},
+    "My Portfolio": {"fill"},
+    "Leaderboard": {"fill", "close"},
+}
+
+
+def forget_panel(panel):
+    for key in [k for k in st.session_state if k.startswith(f"panel:{panel}:")]:
+        del st.session_state[key]
+
+
+def panel_data(panel, part, inputs, compute):
+    # compute(), or what it returned for the same inputs on the panel's last run
+    key = f"panel:{panel}:{part}"
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] != inputs:
+        cached = st.session_state[key] = (inputs, compute())
+    return cached[1]
+
+
+def live_updates(panel=None):
+    news = st.session_state.feed.drain()
+    for event in news:
+        if event["topic"] != events.MARKET:
+            st.toast(event["message"])
+    if panel is not None and any(event["kind"] in LIVE_VIEWS[panel] for event in news):
+        forget_panel(panel)
+
+
+def refresh_panel(panel):
+    # After this session's own action: the actor gets no event for it
+    forget_panel(panel)
+    st.rerun(scope="fragment")
+
+
+for live_view in LIVE_VIEWS:
+    forget_panel(live_view)
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_feed():
+    # Toasts on the pages without a live panel
+    live_updates()
+
+
+if view not in LIVE_VIEWS:
+    live_feed()
 
 if view == "Submit Trade":
     st.header("\U0001F4DD Submit Trade Offer")
@@ -112,7 +250,7 @@ if view == "Submit Trade":
     <b>Why place a trade?</b><br>
     Submitting a trade is your way of making a move in the market! 💥 Whether you want to <b>Buy</b> shares or <b>Sell</b> what you already own, this is how you start.
     <br><br>
-    Once submitted, your offer appears in the "View Trades" tab — classmates can accept your deal and you'll see your portfolio and cash balance update automatically.
+    If a classmate has already posted a matching offer, your trade fills instantly at their price. Anything left over appears in the "View Trades" tab — classmates can accept your deal and you'll see your portfolio and cash balance update automatically.
     <br><br>
     <i>Tip: Be the first to post trades to get the market moving!</i> 🕹️
     </div>
@@ -125,19 +263,28 @@ if view == "Submit Trade":
     direction = st.selectbox("Direction", ["Buy", "Sell"])
     price = st.number_input("Price per Share", min_value=1.0, help="Choose the price you're offering for each share. Keep it realistic or get creative!")
     quantity = st.number_input("Quantity", min_value=1, step=1)
+    account = account_risk(USERS_FILE, TRADES_FILE, username)
+    st.caption(
+        f"Buying power: ${account['buying_power']:,.2f} "
+        f"(${account['reserved']:,.2f} of your cash is held for your open Buy offers)"
+    )
 
     if st.button("Submit Offer"):
-        trade = {
-            "user": username,
-            "ticker": ticker.upper(),
-            "direction": direction,
-            "price": price,
-            "quantity": quantity,
-            "matched": False
-        }
-        trades.append(trade)
-        save_trades(TRADES_FILE, trades)
-        st.success("Trade submitted!")
+        try:
+            with metrics.span("view.submit.compute"):
+                trade, fills = engine.submit(username, ticker, direction, price, quantity)
+        except RiskError as e:
+            st.error(f"🛑 {e}")
+        else:
+            if fills:
+                filled = sum(f["qty"] for f in fills)
+                avg = sum(f["qty"] * f["price"] for f in fills) / filled
+                st.success(f"🎯 Matched right away: {'bought' if direction == 'Buy' else 'sold'} {filled} of {trade['quantity']} shares of {trade['ticker']} at an average ${avg:.2f}!")
+                if remaining(trade):
+                    st.info(f"The other {remaining(trade)} shares are waiting in \"View Trades\".")
+                st.balloons()
+            else:
+                st.success("Trade submitted!")
 
 
 # View Trades --------------
@@ -166,65 +313,60 @@ elif view == "View Trades":
     </div>
     """, unsafe_allow_html=True)
 
-    open_trades = [t for t in trades if not t["matched"] and t["user"] != username]
-
-    if not open_trades:
-        st.info("No open trades to match right now.")
-    else:
-        for i, trade in enumerate(open_trades):
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.markdown(f"""
-                <div style='background-color:#e0f7fa;padding:15px;border-radius:12px;box-shadow:2px 2px 5px rgba(0,0,0,0.1);font-size:16px;'>
-                    👤 <b>{trade['user']}</b><br>
-                    📈 Wants to <b>{trade['direction']} {trade['quantity']} shares of {trade['ticker']}</b><br>
-                    💵 At Price: <b>${trade['price']:.2f}</b>
-                    <hr style='margin:10px 0;'>
-                    You would be <b>{"selling" if trade["direction"]=="Buy" else "buying"}</b> these shares.
-                </div>
-                """, unsafe_allow_html=True)
-            with col2:
-                button_label = f"✅ {'Sell' if trade['direction']=='Buy' else 'Buy'} to {trade['user']}"
-                if st.button(button_label, key=f"match_{i}"):
-                    reverse = "Buy" if trade["direction"] == "Sell" else "Sell"
-                    total = trade["price"] * trade["quantity"]
-
-                    buyer, seller = (
-                        (username, trade["user"]) if reverse == "Buy" else (trade["user"], username)
-                    )
-
-                    if users[buyer]["cash"] >= total:
-                        users[buyer]["cash"] -= total
-                        users[seller]["cash"] += total
-
-                        ticker = trade["ticker"]
-                        qty = trade["quantity"]
-                        price = trade["price"]
-
-                        # Buyer's position
-                        if ticker in users[buyer]["positions"]:
-                            old_qty = users[buyer]["positions"][ticker]["qty"]
-                            old_price = users[buyer]["positions"][ticker]["entry_price"]
-                            new_qty = old_qty + qty
-                            avg_price = (old_price * old_qty + price * qty) / new_qty
-                            users[buyer]["positions"][ticker] = {"qty": new_qty, "entry_price": avg_price}
-                        else:
-                            users[buyer]["positions"][ticker] = {"qty": qty, "entry_price": price}
-
-                        # Seller's position (short if not previously owned)
-                        if ticker in users[seller]["positions"]:
-                            users[seller]["positions"][ticker]["qty"] -= qty
-                        else:
-                            users[seller]["positions"][ticker] = {"qty": -qty, "entry_price": price}
-
-                        trade["matched"] = True
-                        save_users(USERS_FILE, users)
-                        save_trades(TRADES_FILE, trades)
-
-                        st.success(f"🎯 You just {'sold' if reverse == 'Sell' else 'bought'} {qty} shares of {ticker} at ${price:.2f}!")
-                        st.balloons()
-                    else:
-                        st.error("You don't have enough cash to complete this trade.")
+    @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+    def offers_panel():
+        live_updates("View Trades")
+        f1, f2, f3, f4, f5 = st.columns(5)
+        ticker_filter = f1.selectbox("Ticker", ["All"] + open_tickers(TRADES_FILE))
+        side_filter = f2.selectbox("Side", ["All", "Buy", "Sell"])
+        min_price = f3.number_input("Min price", min_value=0.0, value=0.0)
+        max_price = f4.number_input("Max price", min_value=0.0, value=0.0, help="0 means no limit")
+        trader_filter = f5.text_input("Trader", placeholder="Anyone")
+        filters = {
+            "ticker": None if ticker_filter == "All" else ticker_filter,
+            "side": None if side_filter == "All" else side_filter,
+            "min_price": min_price or None,
+            "max_price": max_price or None,
+            "user": trader_filter.strip() or None,
+            "exclude_user": username,
+        }
+        with metrics.span("view.offers.compute"):
+            page = current_page("offers", filters)
+            open_trades, has_more = panel_data(
+                "View Trades", "offers", (page, tuple(filters.items())),
+                lambda: offers_page(TRADES_FILE, page=page, page_size=PAGE_SIZE, **filters),
+            )
+
+        if not open_trades and page == 0:
+            st.info("No open trades to match right now.")
+        else:
+            with metrics.span("view.offers.render"):
+                for trade_idx, trade in open_trades:
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        st.markdown(f"""
+                        <div style='background-color:#e0f7fa;padding:15px;border-radius:12px;box-shadow:2px 2px 5px rgba(0,0,0,0.1);font-size:16px;'>
+                            👤 <b>{trade['user']}</b><br>
+                            📈 Wants to <b>{trade['direction']} {remaining(trade)} shares of {trade['ticker']}</b><br>
+                            💵 At Price: <b>${trade['price']:.2f}</b>
+                            <hr style='margin:10px 0;'>
+                            You would be <b>{"selling" if trade["direction"]=="Buy" else "buying"}</b> these shares.
+                        </div>
+                        """, unsafe_allow_html=True)
+                    with col2:
+                        button_label = f"✅ {'Sell' if trade['direction']=='Buy' else 'Buy'} to {trade['user']}"
+                        if st.button(button_label, key=f"match_{trade_idx}"):
+                            ok, message, matched, qty = engine.take(username, trade_idx, expected=trade)
+                            if ok:
+                                # The list catches up on the panel's next run
+                                forget_panel("View Trades")
+                                st.success(f"🎯 You just {'sold' if matched['direction'] == 'Buy' else 'bought'} {qty} shares of {matched['ticker']} at ${matched['price']:.2f}!")
+                                st.balloons()
+                            else:
+                                st.error(message)
+            page_controls("offers", page, has_more)
+
+    offers_panel()
 
 
 
@@ -245,97 +387,130 @@ elif view == "My Portfolio":
     }
     news = random.choice(news_by_view.get(view, []))
     st.info(news)
-    net_worth = user_data["cash"] + sum(
-        pos["qty"] * round(pos["entry_price"] * random.uniform(0.95, 1.05), 2)
-        for pos in user_data.get("positions", {}).values()
-    )
-
-    col1, col2 = st.columns(2)
-    col1.metric("Cash", f"${user_data['cash']:,.2f}",help="This is how much fake money you have available to trade.")
-    col2.metric("Est. Net Worth", f"${net_worth:,.2f}",help="This is your cash + the estimated value of your open positions.")
-    
-    #Educational Text
-    st.markdown("""
-    <div style='background-color:#e6f2ff; padding:14px; border-radius:10px; font-size:15px;'>
-    <b>Why close a position?</b><br>
-    Closing a trade means you're locking in your profit or loss. 💰 Whether you made a good call or not, this is how traders <b>realize their gains</b> and get their cash back.
-    <br><br>
-    Once closed, your PnL is recorded in your trade history and your net worth updates instantly. <i>Smart traders know when to take profit — or cut losses.</i> ✂️
-    </div>
-    """, unsafe_allow_html=True)
-
-    st.subheader("\U0001F4E6 Open Positions with Estimated PnL")
-    positions = user_data.get("positions", {})
-    if not positions or all(pos["qty"] == 0 for pos in positions.values()):
-        st.info("You don't have any active positions.")
-    else:
-        cols = st.columns([2, 2, 2, 2, 2])
-        cols[0].markdown("**Ticker**")
-        cols[1].markdown("**Quantity**")
-        cols[2].markdown("**Market Price**")
-        cols[3].markdown("**PnL ($)**")
-        cols[4].markdown("**Action**")
-
-        for ticker, pos in positions.items():
-            qty = pos["qty"]
-            if qty == 0:
-                continue
-            entry_price = pos["entry_price"]
-            market_price = round(entry_price * random.uniform(0.95, 1.05), 2)
-            pnl = qty * (market_price - entry_price)
-
-            cols[0].write(ticker)
-            cols[1].write(qty)
-            cols[2].write(f"${market_price}")
-            cols[3].markdown(f"<span style='color: {'green' if pnl >= 0 else 'red'};'>${pnl:+,.2f}</span>", unsafe_allow_html=True)
-
-            if cols[4].button(f"Close {ticker}", key=f"close_{ticker}"):
-                entry_price = pos["entry_price"]
-                qty = pos["qty"]
-                market_price = round(entry_price * random.uniform(0.95, 1.05), 2)
-                pnl = qty * (market_price - entry_price)
-                direction = "Long" if qty > 0 else "Short"
-
-                # Adjust cash correctly
-                if qty > 0:
-                    user_data["cash"] += qty * market_price
-                else:
-                    user_data["cash"] -= abs(qty) * market_price
-
-                # Remove the position
-                user_data["positions"][ticker]["qty"] = 0
-
-                closed_trades.append({
-                    "user": username,
-                    "ticker": ticker,
-                    "qty": qty,
-                    "entry_price": entry_price,
-                    "exit_price": market_price,
-                    "pnl": pnl,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "direction": direction
-                })
-
-                save_users(USERS_FILE, users)
-                save_closed_trades(closed_trades)
-
-                st.success(f"Closed {direction.lower()} position in {ticker} at ${market_price:.2f}. PnL: ${pnl:+.2f}")
-
-
-    st.subheader("\U0001F4DC Closed Trades History")
-    my_closed_trades = [t for t in closed_trades if t["user"] == username]
-    if not my_closed_trades:
-        st.info("You haven't closed any trades yet.")
-    else:
-        st.table({
-            "Ticker": [t["ticker"] for t in my_closed_trades],
-            "Qty": [t["qty"] for t in my_closed_trades],
-            "Side": [t.get("direction", "Long") for t in my_closed_trades],
-            "Entry": [f"${t['entry_price']}" for t in my_closed_trades],
-            "Exit": [f"${t['exit_price']}" for t in my_closed_trades],
-            "PnL": [f"${t['pnl']:+.2f}" for t in my_closed_trades],
-            "Time": [t["timestamp"] for t in my_closed_trades],
-        })
+    @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+    def portfolio_panel():
+        live_updates("My Portfolio")
+        tick = engine.market().current_tick()
+
+        def load_account():
+            # Everyone sees (and closes at) the same simulated prices
+            record = read_users(USERS_FILE)[username]
+            positions = {t: p for t, p in record.get("positions", {}).items() if p["qty"]}
+            market = engine.market(positions)
+            return {
+                "cash": record["cash"],
+                "positions": positions,
+                "prices": {t: market.price(t, p["entry_price"]) for t, p in positions.items()},
+                "net_worth": record["cash"] + market.value(positions),
+                "risk": account_risk(USERS_FILE, TRADES_FILE, username),
+            }
+        with metrics.span("view.portfolio.account"):
+            account = panel_data("My Portfolio", "account", tick, load_account)
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Cash", f"${account['cash']:,.2f}",help="This is how much fake money you have available to trade.")
+        col2.metric("Buying Power", f"${account['risk']['buying_power']:,.2f}",help="Your cash minus what is held for your open Buy offers. Cancel an offer to free it.")
+        col3.metric("Est. Net Worth", f"${account['net_worth']:,.2f}",help="This is your cash + the estimated value of your open positions.")
+
+        #Educational Text
+        st.markdown("""
+        <div style='background-color:#e6f2ff; padding:14px; border-radius:10px; font-size:15px;'>
+        <b>Why close a position?</b><br>
+        Closing a trade means you're locking in your profit or loss. 💰 Whether you made a good call or not, this is how traders <b>realize their gains</b> and get their cash back.
+        <br><br>
+        Once closed, your PnL is recorded in your trade history and your net worth updates instantly. <i>Smart traders know when to take profit — or cut losses.</i> ✂️
+        </div>
+        """, unsafe_allow_html=True)
+
+        st.subheader("\U0001F4E6 Open Positions with Estimated PnL")
+        if not account["positions"]:
+            st.info("You don't have any active positions.")
+        else:
+            cols = st.columns([2, 2, 2, 2, 2])
+            cols[0].markdown("**Ticker**")
+            cols[1].markdown("**Quantity**")
+            cols[2].markdown("**Market Price**")
+            cols[3].markdown("**PnL ($)**")
+            cols[4].markdown("**Action**")
+
+            with metrics.span("view.portfolio.render"):
+                for ticker, pos in account["positions"].items():
+                    qty = pos["qty"]
+                    entry_price = pos["entry_price"]
+                    market_price = account["prices"][ticker]
+                    pnl = qty * (market_price - entry_price)
+
+                    cols[0].write(ticker)
+                    cols[1].write(qty)
+                    cols[2].write(f"${market_price}")
+                    cols[3].markdown(f"<span style='color: {'green' if pnl >= 0 else 'red'};'>${pnl:+,.2f}</span>", unsafe_allow_html=True)
+
+                    if cols[4].button(f"Close {ticker}", key=f"close_{ticker}"):
+                        # At the price when the close goes through, not the one on screen
+                        closed_trade = engine.close(username, ticker)
+                        if closed_trade:
+                            forget_panel("My Portfolio")
+                            st.success(f"Closed {closed_trade['direction'].lower()} position in {ticker} at ${closed_trade['exit_price']:.2f}. PnL: ${closed_trade['pnl']:+.2f}")
+
+
+        st.subheader("\U0001F4CB My Open Offers")
+        page = current_page("my_offers", {})
+        with metrics.span("view.portfolio.offers"):
+            my_offers, has_more = panel_data(
+                "My Portfolio", "offers", page,
+                lambda: offers_page(TRADES_FILE, page=page, page_size=PAGE_SIZE, user=username),
+            )
+        if not my_offers and page == 0:
+            st.info("You don't have any open offers.")
+        else:
+            for offer_idx, offer in my_offers:
+                o1, o2 = st.columns([4, 1])
+                o1.write(f"{offer['direction']} {remaining(offer)} of {offer['quantity']} {offer['ticker']} at ${offer['price']:.2f}")
+                if o2.button("Cancel", key=f"cancel_{offer_idx}"):
+                    ok, message, _ = engine.cancel(username, offer_idx, expected=offer)
+                    if ok:
+                        st.toast(f"Cancelled your {offer['ticker']} {offer['direction']} offer.")
+                        refresh_panel("My Portfolio")
+                    st.error(message)
+            page_controls("my_offers", page, has_more)
+
+        st.subheader("\U0001F4D0 My Trading Stats")
+        with metrics.span("view.portfolio.stats"):
+            stats = panel_data(
+                "My Portfolio", "stats", tick,
+                lambda: performance(USERS_FILE, CLOSED_TRADES_FILE, MARKET_FILE, name=username)["student"],
+            )
+        s1, s2, s3, s4, s5, s6 = st.columns(6)
+        s1.metric("Win Rate", f"{stats['win_rate']:.0%}" if stats["trades"] else "–")
+        s2.metric("Avg PnL / Trade", f"${stats['avg_pnl']:+,.2f}" if stats["trades"] else "–")
+        s3.metric("Realized PnL", f"${stats['realized']:+,.2f}")
+        s4.metric("Unrealized PnL", f"${stats['unrealized']:+,.2f}")
+        s5.metric("Max Drawdown", f"${stats['max_drawdown']:,.2f}")
+        s6.metric("Turnover", f"${stats['turnover']:,.0f}")
+        if stats["by_ticker"]:
+            st.caption("Realized PnL by ticker")
+            st.table({
+                "Ticker": list(stats["by_ticker"]),
+                "PnL": [f"${v:+,.2f}" for v in stats["by_ticker"].values()],
+            })
+
+        st.subheader("\U0001F4DC Closed Trades History")
+        history_ticker = st.selectbox("Ticker", ["All"] + closed_tickers(CLOSED_TRADES_FILE, username), key="history_ticker")
+        history_filter = {"ticker": None if history_ticker == "All" else history_ticker}
+        page = current_page("history", history_filter)
+        with metrics.span("view.portfolio.history"):
+            table, total = panel_data(
+                "My Portfolio", "history", (page, history_filter["ticker"]),
+                lambda: closed_trades_page(CLOSED_TRADES_FILE, username, page=page, page_size=PAGE_SIZE, **history_filter),
+            )
+        if not total:
+            st.info("You haven't closed any trades yet.")
+        else:
+            st.caption(f"{total} closed trades, newest first")
+            st.table(table)
+            page_controls("history", page, (page + 1) * PAGE_SIZE < total)
+
+    portfolio_panel()
 
 
 # Tips and Strategy --------------
@@ -382,48 +557,257 @@ elif view == "💡 Tips & Strategy":
 elif view == "Leaderboard":
     st.header("🏆 Leaderboard")
 
-    random.seed(42)
-    all_tickers = set()
-    for u in users.values():
-        all_tickers.update(u.get("positions", {}).keys())
-    prices = {t: round(pos["entry_price"] * random.uniform(0.95, 1.05), 2) for u in users.values() for t, pos in u.get("positions", {}).items()}
-
-    leaderboard = []
-    for name, data in users.items():
-        equity = data["cash"]
-        for ticker, pos in data.get("positions", {}).items():
-            equity += pos["qty"] * prices.get(ticker, 100)
-        leaderboard.append((name, equity))
-
-    leaderboard.sort(key=lambda x: x[1], reverse=True)
-
-    badges = {}
-    if leaderboard:
-        badges[leaderboard[0][0]] = "👑 Top Trader of the Day 🥇"
-        if len(leaderboard) > 1:
-            badges[leaderboard[1][0]] = "🥈"
-        if len(leaderboard) > 2:
-            badges[leaderboard[2][0]] = "🥉"
-
-    st.subheader("\U0001F4CA Total Net Worth (Cash + Unrealized PnL)")
-    st.table({
-        "Name": [f"{badges.get(x[0], '')} {x[0]}" for x in leaderboard],
-        "Net Worth ($)": [f"${x[1]:,.2f}" for x in leaderboard]
-    })
+    @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+    def leaderboard_panel():
+        live_updates("Leaderboard")
+        tick = engine.market().current_tick()
+        my_team = user_data.get("team") or "No Team"
+        with metrics.span("view.leaderboard.standings"):
+            board = panel_data("Leaderboard", "standings", tick,
+                               lambda: standings(USERS_FILE, MARKET_FILE, n=50, name=username, team=my_team))
+        leaderboard = board["top"]
+
+        badges = {}
+        if leaderboard:
+            badges[leaderboard[0][0]] = "👑 Top Trader of the Day 🥇"
+            if len(leaderboard) > 1:
+                badges[leaderboard[1][0]] = "🥈"
+            if len(leaderboard) > 2:
+                badges[leaderboard[2][0]] = "🥉"
+
+        if board["rank"]:
+            st.info(f"You're ranked #{board['rank']} of {board['players']} with ${board['net_worth']:,.2f}.")
+        with metrics.span("view.leaderboard.performance"):
+            perf = panel_data("Leaderboard", "performance", tick,
+                              lambda: performance(USERS_FILE, CLOSED_TRADES_FILE, MARKET_FILE, name=username, team=my_team))
+        if perf["student"]["trades"]:
+            st.caption(
+                f"Your closed trades: {perf['student']['trades']} · win rate {perf['student']['win_rate']:.0%} · "
+                f"realized ${perf['student']['realized']:+,.2f}"
+            )
+
+        with metrics.span("view.leaderboard.render"):
+            st.subheader("\U0001F4CA Total Net Worth (Cash + Unrealized PnL)")
+            st.table({
+                "Name": [f"{badges.get(x[0], '')} {x[0]}" for x in leaderboard],
+                "Net Worth ($)": [f"${x[1]:,.2f}" for x in leaderboard]
+            })
+
+            st.subheader("\U0001F465 Teams")
+            if board["team_rank"]:
+                st.caption(f"Your team is ranked #{board['team_rank']} of {board['team_count']}.")
+            st.table({
+                "Team": [x[0] for x in board["teams"]],
+                "Members": [x[2] for x in board["teams"]],
+                "Net Worth ($)": [f"${x[1]:,.2f}" for x in board["teams"]],
+                "Avg per Member ($)": [f"${x[1] / x[2]:,.2f}" for x in board["teams"]],
+            })
+        if perf["team"]["trades"]:
+            st.caption(
+                f"Your team's closed trades: {perf['team']['trades']} · win rate {perf['team']['win_rate']:.0%} · "
+                f"realized ${perf['team']['realized']:+,.2f} · max drawdown ${perf['team']['max_drawdown']:,.2f}"
+            )
+
+    leaderboard_panel()
 
 if username.lower() and username== "teacher":
 
+    st.subheader("\U0001F9D1\u200D\U0001F3EB Class Analytics")
+    with metrics.span("view.teacher.analytics"):
+        students, teams_perf = class_performance(USERS_FILE, CLOSED_TRADES_FILE, MARKET_FILE)
+
+    def analytics_table(label, rows):
+        return {
+            label: list(rows),
+            "Trades": [r["trades"] for r in rows.values()],
+            "Win Rate": [f"{r['win_rate']:.0%}" if r["trades"] else "–" for r in rows.values()],
+            "Avg PnL": [f"${r['avg_pnl']:+,.2f}" if r["trades"] else "–" for r in rows.values()],
+            "Realized": [f"${r['realized']:+,.2f}" for r in rows.values()],
+            "Unrealized": [f"${r['unrealized']:+,.2f}" for r in rows.values()],
+            "Max Drawdown": [f"${r['max_drawdown']:,.2f}" for r in rows.values()],
+            "Turnover": [f"${r['turnover']:,.0f}" for r in rows.values()],
+            "Top Contributor": [next(iter(r["by_ticker"]), "–") for r in rows.values()],
+        }
+    with metrics.span("view.teacher.render"):
+        with st.expander("Students", expanded=False):
+            st.dataframe(analytics_table("Student", students), use_container_width=True)
+        with st.expander("Teams", expanded=True):
+            st.dataframe(analytics_table("Team", teams_perf), use_container_width=True)
+
+    # Any past moment of the session, rebuilt from the nearest checkpoint plus
+    # the account changes since
+    st.subheader("\u23EA Time Travel")
+    recorded = time_range(room.data_dir)
+    if recorded is None:
+        st.info("Nothing has happened in this class yet.")
+    else:
+        first, last = (datetime.fromtimestamp(t).replace(microsecond=0) for t in recorded)
+        last = max(last + timedelta(seconds=1), first + timedelta(seconds=1))
+        moment = st.slider("Show the class as it was at", min_value=first, max_value=last, value=last,
+                           step=timedelta(seconds=15), format="MMM D, HH:mm:ss", key="travel_moment")
+        with metrics.span("view.teacher.timeline"):
+            past = state_at(room.data_dir, moment.timestamp())
+            past_market = market_at(past) if past["game"] else None
+            past_board = standings_at(past, past_market) if past_market else []
+        if not past_board:
+            st.info("No students had joined yet at that moment.")
+        else:
+            past_teams = {}
+            for _, team_name, _, worth in past_board:
+                members, total = past_teams.get(team_name, (0, 0.0))
+                past_teams[team_name] = (members + 1, total + worth)
+            ranked_teams = sorted(past_teams.items(), key=lambda kv: -kv[1][1])
+            tt1, tt2 = st.columns(2)
+            tt1.caption(f"Leaderboard at {moment:%H:%M:%S}")
+            tt1.table({
+                "Name": [r[0] for r in past_board[:20]],
+                "Team": [r[1] for r in past_board[:20]],
+                "Net Worth ($)": [f"${r[3]:,.2f}" for r in past_board[:20]],
+            })
+            tt2.caption("Teams")
+            tt2.table({
+                "Team": [team_name for team_name, _ in ranked_teams],
+                "Members": [members for _, (members, _) in ranked_teams],
+                "Net Worth ($)": [f"${total:,.2f}" for _, (_, total) in ranked_teams],
+            })
+            past_student = st.selectbox("Portfolio of", [r[0] for r in past_board], key="travel_student")
+            past_record = past["users"][past_student]
+            held = {t: p for t, p in past_record.get("positions", {}).items() if p["qty"]}
+            st.caption(f"{past_student} had ${past_record['cash']:,.2f} in cash" + ("" if held else " and no open positions"))
+            if held:
+                st.table({
+                    "Ticker": list(held),
+                    "Quantity": [p["qty"] for p in held.values()],
+                    "Entry ($)": [f"${p['entry_price']:,.2f}" for p in held.values()],
+                    "Price then ($)": [f"${past_market.price(t, p['entry_price']):,.2f}" for t, p in held.items()],
+                    "PnL then ($)": [f"${p['qty'] * (past_market.price(t, p['entry_price']) - p['entry_price']):+,.2f}" for t, p in held.items()],
+                })
+            if past["events"]:
+                with st.expander("What had just happened"):
+                    for event in reversed(past["events"]):
+                        st.markdown(f"`{datetime.fromtimestamp(event['t']):%H:%M:%S}` {describe(event)}")
+
+    # One editor for a page of the roster instead of a widget per student; all
+    # edits on the page (or a whole CSV) go in as one batch
+    st.subheader("\U0001F5C2\uFE0F Roster")
+    r1, r2 = st.columns([2, 1])
+    roster_search = r1.text_input("Search students", key="roster_search")
+    roster_team = r2.selectbox("Team", ["All"] + roster_teams(USERS_FILE), key="roster_team")
+    roster_filter = {"search": roster_search, "team": None if roster_team == "All" else roster_team}
+    page = current_page("roster", roster_filter)
+    rows, total = roster_page(USERS_FILE, page=page, page_size=PAGE_SIZE, **roster_filter)
+    st.caption(f"{total} students")
+    edited = st.data_editor(
+        rows, key=f"roster_editor_{page}", disabled=["name"], use_container_width=True,
+        column_config={
+            "name": st.column_config.TextColumn("Student"),
+            "team": st.column_config.TextColumn("Team"),
+            "cash": st.column_config.NumberColumn("Cash ($)", min_value=0, step=100),
+        },
+    )
+    pending = edited_rows(rows, edited)
+    if st.button(f"\U0001F4BE Save {len(pending)} change(s)", disabled=not pending):
+        engine.apply_roster(pending, create=False)
+        st.toast(f"Updated {len(pending)} students.")
+        st.rerun()
+    page_controls("roster", page, (page + 1) * PAGE_SIZE < total)
+
+    c1, c2 = st.columns(2)
+    c1.download_button("⬇️ Export roster (CSV)", export_roster(USERS_FILE), file_name="roster.csv", mime="text/csv")
+    uploaded = c2.file_uploader("Import roster (CSV with name, team, cash)", type="csv")
+    if uploaded is not None:
+        changes, errors = parse_roster(uploaded.getvalue().decode("utf-8", errors="replace"))
+        for error in errors[:10]:
+            st.warning(error)
+        new_students = sum(1 for name in changes if name not in users)
+        st.caption(f"{len(changes)} rows ready: {new_students} new students, {len(changes) - new_students} updates.")
+        if st.button("\U0001F4E5 Import Roster", disabled=not changes):
+            counts = engine.apply_roster(changes)
+            st.success(f"Imported: {counts['created']} created, {counts['updated']} updated, {counts['unchanged']} unchanged.")
+
+    # Where reruns spend their time, for this server process
+    st.subheader("\U0001FA7A Diagnostics")
+    if not metrics.enabled():
+        st.info("Instrumentation is off (MONEYHUB_METRICS=0).")
+    else:
+        reruns = metrics.recent_reruns()
+        if reruns:
+            slowest = sorted(reruns, key=lambda t: -t.seconds)[:10]
+            st.caption(f"Slowest of the last {len(reruns)} reruns")
+            st.dataframe({
+                "Session": [t.label for t in slowest],
+                "At": [datetime.fromtimestamp(t.started).strftime("%H:%M:%S") for t in slowest],
+                "Rerun (ms)": [round(t.seconds * 1e3, 1) for t in slowest],
+                "Slowest step": [max(t.spans, key=lambda sp: sp[3])[0] if t.spans else "–" for t in slowest],
+            }, use_container_width=True)
+            picked = st.selectbox(
+                "Breakdown of", range(len(slowest)),
+                format_func=lambda i: f"{slowest[i].label} · {slowest[i].seconds * 1e3:.1f} ms",
+            )
+            trace = slowest[picked]
+            st.table({
+                "Step": ["\u2003" * depth + name for name, depth, _, _ in trace.spans],
+                "Start (ms)": [f"{start * 1e3:.1f}" for _, _, start, _ in trace.spans],
+                "Time (ms)": [f"{elapsed * 1e3:.2f}" for _, _, _, elapsed in trace.spans],
+            })
+
+        snap = metrics.snapshot()
+        with st.expander("All spans and counters since start"):
+            spans = sorted(snap["spans"].items(), key=lambda kv: -kv[1]["total"])
+            st.dataframe({
+                "Span": [name for name, _ in spans],
+                "Count": [h["count"] for _, h in spans],
+                "Total (s)": [round(h["total"], 3) for _, h in spans],
+                "Mean (ms)": [round(h["mean"] * 1e3, 3) for _, h in spans],
+                "p99 \u2264 (ms)": [h["p99"] * 1e3 for _, h in spans],
+                "Max (ms)": [round(h["max"] * 1e3, 3) for _, h in spans],
+            }, use_container_width=True)
+            st.table({"Counter": list(snap["counters"]), "Value": [f"{v:,}" for v in snap["counters"].values()]})
+            st.download_button("\u2B07\uFE0F Metrics (Prometheus text)", metrics.prometheus(), file_name="metrics.prom", mime="text/plain")
+            st.caption(f"Also written to {metrics.METRICS_FILE} every {metrics.DUMP_INTERVAL:.0f} s.")
+
+        # Profiling only applies to this (the teacher's) session
+        modes = {"Off": None, "Sampling (low overhead)": "sample", "cProfile (every call)": "cprofile"}
+        chosen = st.radio("Profile my reruns", list(modes), horizontal=True,
+                          index=list(modes.values()).index(st.session_state.get("profile_mode")))
+        st.session_state.profile_mode = modes[chosen]
+        profiled = next((t for t in metrics.recent_reruns(session_label) if t.profile), None)
+        if profiled is not None:
+            st.caption(f"Last profiled rerun: {profiled.seconds * 1e3:.1f} ms at {datetime.fromtimestamp(profiled.started):%H:%M:%S}")
+            st.code(profiled.profile, language=None)
+
     st.sidebar.markdown("---")
     st.sidebar.markdown("🧑‍🏫 **Manage Teams & Student Cash**")
-    for user, data in users.items():
-        col1, col2 = st.sidebar.columns([2, 1])
-        col1.write(f"👤 {user} ({data.get('team', 'No Team')})")
-        new_cash = col2.number_input(f"${user}", min_value=0, value=int(data["cash"]), step=100, key=f"cash_{user}")
-        if new_cash != data["cash"]:
-            users[user]["cash"] = new_cash
-    if st.sidebar.button("💾 Save Updates"):
-        save_users(USERS_FILE, users)
-        st.success("User balances updated.")
+    st.sidebar.caption("Edit students in the Roster section of the page.")
+
+    st.sidebar.markdown("🏫 **Classrooms**")
+    if st.sidebar.button("➕ New Classroom"):
+        new_room = create_classroom()
+        st.sidebar.success(f"Class code: **{new_room.code}** — students enter it at login.")
+
+    st.sidebar.markdown("🛡️ **Risk Limits**")
+    current_limits = risk_limits(USERS_FILE)
+    short_limit = st.sidebar.number_input("Max short per student ($)", min_value=0.0, value=current_limits["short_limit"], step=500.0, help="0 turns short selling off")
+    concentration = st.sidebar.slider("Max share of equity in one ticker", 10, 100, int(round(current_limits["concentration"] * 100)), step=5, format="%d%%")
+    if st.sidebar.button("💾 Save Limits"):
+        engine.set_limits(short_limit=short_limit, concentration=concentration / 100)
+        st.sidebar.success("Risk limits saved; they apply to new offers and trades.")
+
+    # Counterparties for a small or quiet class; they trade like students, on the bots team
+    st.sidebar.markdown("🤖 **Liquidity Bots**")
+    if bots_running(room.data_dir):
+        st.sidebar.caption("Bots are trading in this class.")
+        if st.sidebar.button("⏹️ Stop Bots"):
+            stats = stop_bots(room.data_dir)
+            st.sidebar.success(f"Bots stopped after {stats['orders']:,} offers and {stats['takes']:,} accepted offers.")
+    else:
+        b1, b2 = st.sidebar.columns(2)
+        bot_makers = b1.number_input("Market makers", min_value=0, max_value=20, value=2)
+        bot_noise = b2.number_input("Noise traders", min_value=0, max_value=50, value=4)
+        bot_rate = st.sidebar.slider("Max bot actions per second", 1, 200, 20)
+        if st.sidebar.button("▶️ Start Bots", disabled=not bot_makers + bot_noise):
+            start_bots(room.data_dir, makers=bot_makers, noise=bot_noise, max_rate=bot_rate)
+            st.rerun()
 
     st.sidebar.markdown("🏷️ **Assign Cash by Team**")
 
@@ -433,18 +817,35 @@ if username.lower() and username== "teacher":
     team_cash = st.sidebar.number_input("Cash for Selected Team", min_value=0, value=10000, step=100)
 
     if st.sidebar.button("💰 Set Cash for Team"):
-        for user, data in users.items():
-            if data.get("team") == selected_team:
-                users[user]["cash"] = team_cash
-        save_users(USERS_FILE, users)
+        engine.apply_roster({
+            user: {"cash": team_cash} for user, data in users.items()
+            if (data.get("team") or "No Team") == selected_team
+        }, create=False)
         st.success(f"Updated cash for all members of '{selected_team}' to ${team_cash:,}")
 
 
+    st.sidebar.markdown("📊 **Class Overview**")
+    overview = class_overview(USERS_FILE, MARKET_FILE)
+    totals = overview["totals"]
+    st.sidebar.metric("Class Net Worth", f"${totals['net_worth']:,.2f}")
+    st.sidebar.caption(
+        f"{totals['students']} students · ${totals['cash']:,.0f} cash · "
+        f"${totals['long']:,.0f} long · ${-totals['short']:,.0f} short"
+    )
+    if overview["exposure"]:
+        st.sidebar.table({
+            "Ticker": [t for t, _ in overview["exposure"]],
+            "Net ($)": [f"${net:,.0f}" for _, (net, _) in overview["exposure"]],
+            "Gross ($)": [f"${gross:,.0f}" for _, (_, gross) in overview["exposure"]],
+        })
+    volume = sorted(ticker_volume(TRADES_FILE).items(), key=lambda kv: -kv[1])[:5]
+    if volume:
+        st.sidebar.caption("Most traded (shares, all game)")
+        st.sidebar.table({"Ticker": [t for t, _ in volume], "Shares": [v for _, v in volume]})
+
     if st.sidebar.button("\U0001F9F9 Reset All Data"):
-        users = {}
-        trades = []
-        closed_trades = []
-        save_users(USERS_FILE, users)
-        save_trades(TRADES_FILE, trades)
-        save_closed_trades(closed_trades)
-        st.warning("All user data and trades have been reset.")
+        engine.reset()
+        st.warning(f"All user data and trades in {room.name} have been reset.")
+
+metrics.end_rerun()
+metrics.maybe_dump()
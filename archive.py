@@ -0,0 +1,290 @@
+import glob
+import os
+
+import numpy as np
+
+from storage import get_store, collection_name
+from utils import remaining, filled
+from orderbook import get_book
+from metrics import timed
+
+# Cold tier for finished history.
+#
+# Fully matched offers and closed positions are moved out of trades.json and
+# closed_trades.json into append-only column files under data/archive/, one
+# fixed-width binary file per column, read back through np.memmap without
+# copying. What stays hot (and gets parsed, logged and snapshotted) is only the
+# open offers and the closed trades since the last archive run.
+#
+# The store keeps the archive's bookkeeping in archive.json: the committed row
+# count of each table, the interned user/ticker strings and a generation number
+# that names the current set of files. Column bytes are appended first; the
+# rows only count once the same log record that empties the hot lists says so,
+# so a crash in between just leaves bytes the next run overwrites. A column
+# added after a table was first written reads -1 (unknown) for the older rows.
+
+ARCHIVE_NAME = "archive"
+ARCHIVE_MIN_ROWS = 500  # finished records in the hot files before they are archived
+
+TABLES = {
+    "trades": {
+        "user": "<i4",
+        "ticker": "<i4",
+        "direction": "i1",   # 0 Buy, 1 Sell
+        "price": "<f8",
+        "quantity": "<i8",
+        "filled": "<i8",
+        "crossed": "<i8",    # filled on arrival against resting offers
+    },
+    "closed_trades": {
+        "user": "<i4",
+        "team": "<i4",       # the team at close time, -1 if not recorded
+        "ticker": "<i4",
+        "qty": "<i8",
+        "entry_price": "<f8",
+        "exit_price": "<f8",
+        "pnl": "<f8",
+        "timestamp": "<M8[s]",
+        "direction": "i1",   # 0 Long, 1 Short
+    },
+}
+SIDES = ("Buy", "Sell")
+DIRECTIONS = ("Long", "Short")
+
+
+class ArchiveTable:
+    def __init__(self, directory, name, columns):
+        self.directory = directory
+        self.name = name
+        self.columns = {c: np.dtype(t) for c, t in columns.items()}
+        self.generation = None
+        self.rows = 0
+        self.maps = {}
+        self.by_user = None
+
+    def path(self, column, generation=None):
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"{self.name}.{generation}.{column}.bin")
+
+    def attach(self, generation, rows):
+        if (generation, rows) != (self.generation, self.rows):
+            self.generation = generation
+            self.rows = rows
+            self.maps = {}
+            self.by_user = None
+
+    def column(self, name):
+        arr = self.maps.get(name)
+        if arr is None:
+            if self.rows == 0:
+                arr = np.zeros(0, dtype=self.columns[name])
+            elif not os.path.exists(self.path(name)):
+                arr = np.full(self.rows, -1, dtype=self.columns[name])
+            else:
+                arr = np.memmap(self.path(name), dtype=self.columns[name], mode="r", shape=(self.rows,))
+            self.maps[name] = arr
+        return arr
+
+    def append(self, data):
+        # Write rows after the committed ones and return the new row count; the
+        # caller commits it. Anything past the committed rows is a leftover.
+        os.makedirs(self.directory, exist_ok=True)
+        n = None
+        for name, dtype in self.columns.items():
+            arr = np.asarray(data[name], dtype=dtype)
+            n = len(arr)
+            with open(self.path(name), "a+b") as f:
+                missing = self.rows - os.fstat(f.fileno()).st_size // dtype.itemsize
+                if missing > 0:
+                    f.write(np.full(missing, -1, dtype=dtype).tobytes())
+                f.truncate(self.rows * dtype.itemsize)
+                f.write(arr.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        return self.rows + (n or 0)
+
+    def user_rows(self, user_id, ticker_id=None):
+        # Row numbers for one user (optionally one ticker), oldest first
+        if self.by_user is None:
+            users = self.column("user")
+            order = np.argsort(users, kind="stable")
+            self.by_user = (order, users[order])
+        order, keys = self.by_user
+        rows = order[np.searchsorted(keys, user_id, "left"):np.searchsorted(keys, user_id, "right")]
+        if ticker_id is not None:
+            rows = rows[self.column("ticker")[rows] == ticker_id]
+        return rows
+
+
+class Archive:
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {name: ArchiveTable(directory, name, cols) for name, cols in TABLES.items()}
+        self.generation = 0
+        self.strings = []
+        self.ids = {}
+
+    def load(self, state):
+        generation = state.get("generation", 0)
+        strings = state.get("strings", [])
+        if generation != self.generation or len(strings) != len(self.strings):
+            self.strings = list(strings)
+            self.ids = {s: i for i, s in enumerate(self.strings)}
+        self.generation = generation
+        for name, table in self.tables.items():
+            table.attach(generation, state.get(name, {}).get("rows", 0))
+
+    def closed_trades(self, rows):
+        # Archived closed trades as the same dicts close_position writes
+        table = self.tables["closed_trades"]
+        cols = {c: table.column(c)[rows] for c in table.columns}
+        stamps = np.datetime_as_string(cols["timestamp"], unit="s")
+        return [
+            {
+                "user": self.strings[cols["user"][i]],
+                "team": self.strings[cols["team"][i]] if cols["team"][i] >= 0 else None,
+                "ticker": self.strings[cols["ticker"][i]],
+                "qty": int(cols["qty"][i]),
+                "entry_price": float(cols["entry_price"][i]),
+                "exit_price": float(cols["exit_price"][i]),
+                "pnl": float(cols["pnl"][i]),
+                "timestamp": str(stamps[i]).replace("T", " "),
+                "direction": DIRECTIONS[cols["direction"][i]],
+            }
+            for i in range(len(rows))
+        ]
+
+
+def get_archive(filepath):
+    store = get_store(filepath)
+    path = os.path.join(store.data_dir, ARCHIVE_NAME + ".json")
+    store.collection(path, {})
+
+    def build(store):
+        archive = Archive(os.path.join(store.data_dir, ARCHIVE_NAME))
+        archive.load(store.collections[ARCHIVE_NAME])
+
+        def on_op(op):
+            if op is None or op[0] == ARCHIVE_NAME:
+                archive.load(store.collections.get(ARCHIVE_NAME) or {})
+        store.listeners.append(on_op)
+        return archive
+    return store.index((ARCHIVE_NAME,), build)
+
+
+@timed("archive.archive_history")
+def archive_history(trades_file, closed_trades_file):
+    # Move fully matched offers and all closed trades into the archive; open
+    # offers are renumbered. Returns (offers, closed trades) archived.
+    store = get_store(trades_file)
+    if store is not get_store(closed_trades_file):
+        raise ValueError("trades and closed trades must live in the same data directory")
+    trades_name, closed_name = collection_name(trades_file), collection_name(closed_trades_file)
+    store.collection(trades_file, [])
+    store.collection(closed_trades_file, [])
+    archive = get_archive(trades_file)
+    with store.lock():
+        store.refresh()
+        trades = [t for t in store.collections[trades_name] if t is not None]
+        done = [t for t in trades if remaining(t) <= 0]
+        closed = [t for t in store.collections[closed_name] if t is not None]
+        if not done and not closed:
+            return 0, 0
+        strings = list(archive.strings)
+        ids = dict(archive.ids)
+
+        def intern(values):
+            out = []
+            for s in values:
+                if s not in ids:
+                    ids[s] = len(strings)
+                    strings.append(s)
+                out.append(ids[s])
+            return out
+
+        trade_rows = archive.tables["trades"].append({
+            "user": intern(t["user"] for t in done),
+            "ticker": intern(t["ticker"] for t in done),
+            "direction": [SIDES.index(t["direction"]) for t in done],
+            "price": [t["price"] for t in done],
+            "quantity": [t["quantity"] for t in done],
+            "filled": [filled(t) for t in done],
+            "crossed": [t.get("crossed", 0) for t in done],
+        })
+        closed_rows = archive.tables["closed_trades"].append({
+            "user": intern(t["user"] for t in closed),
+            "team": [intern([t["team"]])[0] if t.get("team") else -1 for t in closed],
+            "ticker": intern(t["ticker"] for t in closed),
+            "qty": [t["qty"] for t in closed],
+            "entry_price": [t["entry_price"] for t in closed],
+            "exit_price": [t["exit_price"] for t in closed],
+            "pnl": [t["pnl"] for t in closed],
+            "timestamp": np.array([t["timestamp"] for t in closed], dtype="datetime64[s]"),
+            "direction": [DIRECTIONS.index(t.get("direction", "Long")) for t in closed],
+        })
+        store.write([
+            [trades_name, "replace", [t for t in trades if remaining(t) > 0]],
+            [closed_name, "replace", []],
+            [ARCHIVE_NAME, "put", "strings", strings],
+            [ARCHIVE_NAME, "put", "trades", {"rows": trade_rows}],
+            [ARCHIVE_NAME, "put", "closed_trades", {"rows": closed_rows}],
+        ])
+        # Rewrite the snapshots now so they shrink to the open interest
+        store.compact()
+        return len(done), len(closed)
+
+
+def archive_due(trades_file, closed_trades_file, min_rows=ARCHIVE_MIN_ROWS):
+    # Cheap enough for every rerun: has enough finished history piled up?
+    store = get_store(trades_file)
+    book = get_book(trades_file)
+    store.collection(closed_trades_file, [])
+    store.refresh()
+    with store.lock():
+        finished = len(store.collections[collection_name(trades_file)]) - len(book.orders)
+        finished += len(store.collections[collection_name(closed_trades_file)])
+    return finished >= min_rows
+
+
+@timed("archive.maybe_archive")
+def maybe_archive(trades_file, closed_trades_file, min_rows=ARCHIVE_MIN_ROWS):
+    if archive_due(trades_file, closed_trades_file, min_rows):
+        return archive_history(trades_file, closed_trades_file)
+    return 0, 0
+
+
+def reset_archive(trades_file):
+    # Start an empty archive under a new generation; processes that still have
+    # the old files mapped keep reading them until they catch up
+    store = get_store(trades_file)
+    archive = get_archive(trades_file)
+    with store.lock():
+        store.refresh()
+        old = archive.generation
+        store.write([[ARCHIVE_NAME, "replace", {"generation": old + 1}]])
+        for path in glob.glob(os.path.join(archive.directory, f"*.{old}.*.bin")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+@timed("archive.ticker_volume")
+def ticker_volume(trades_file):
+    # {ticker: shares traded}, archive plus hot offers. Each trade is counted
+    # once: on the resting offer, not again as "crossed" on the incoming one.
+    store = get_store(trades_file)
+    store.collection(trades_file, [])
+    archive = get_archive(trades_file)
+    store.refresh()
+    with store.lock():
+        table = archive.tables["trades"]
+        traded = table.column("filled") - table.column("crossed")
+        volume = np.bincount(table.column("ticker"), weights=traded, minlength=len(archive.strings))
+        out = {archive.strings[i]: int(volume[i]) for i in np.flatnonzero(volume)}
+        for t in store.collections[collection_name(trades_file)]:
+            if t is not None:
+                shares = filled(t) - t.get("crossed", 0)
+                if shares:
+                    out[t["ticker"]] = out.get(t["ticker"], 0) + shares
+        return out
@@ -0,0 +1,103 @@
+# Teacher admin at 1,000 students: what one rerun of the roster panel has to
+# build, and what applying a batch of cash/team edits costs, before and after.
+#
+# Before: one columns row + number_input per student on every rerun, and team
+# cash written by rewriting users.json. After: one paged editor, and any batch
+# (a page of edits, a whole team, a CSV) committed as one log record.
+#
+#   python benchmarks/bench_admin.py [students]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from utils import save_users, read_users, put_user
+from admin import export_roster, parse_roster, apply_roster, roster_page, roster_teams
+
+PAGE_SIZE = 20
+
+
+def timed(fn, reps=1):
+    start = time.perf_counter()
+    for _ in range(reps):
+        out = fn()
+    return (time.perf_counter() - start) / reps, out
+
+
+def main(students=1000):
+    rng = random.Random(13)
+    with tempfile.TemporaryDirectory() as data_dir:
+        users_file = os.path.join(data_dir, "users.json")
+        users = {f"student{i}": {"cash": 10000, "positions": {"NVDA": {"qty": 5, "entry_price": 100.0}},
+                                 "pnl": 0, "team": f"team{i % 50}"} for i in range(students)}
+        save_users(users_file, users)
+        store = storage.get_store(users_file)
+        store.compact()
+
+        def old_panel():
+            # The data side of the old sidebar: a widget spec per student
+            widgets = []
+            for user, data in read_users(users_file).items():
+                widgets.append(("columns", [2, 1]))
+                widgets.append(("write", f"👤 {user} ({data.get('team', 'No Team')})"))
+                widgets.append(("number_input", f"${user}", int(data["cash"]), f"cash_{user}"))
+            return widgets
+
+        def new_panel():
+            roster_teams(users_file)
+            rows, total = roster_page(users_file, search="", page=3, page_size=PAGE_SIZE)
+            return rows
+
+        old_render, old_widgets = timed(old_panel, 20)
+        new_render, rows = timed(new_panel, 200)
+
+        team = [n for n, u in users.items() if u["team"] == "team7"]
+
+        def old_team_cash():
+            # "Set Cash for Team" as it was: mutate and rewrite the whole file
+            data = json.load(open(users_file, encoding="utf-8"))
+            for n in team:
+                data[n]["cash"] = 5000
+            with open(users_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+
+        old_apply, _ = timed(old_team_cash, 5)
+        store.compact()
+        storage._stores.clear()
+        store = storage.get_store(users_file)
+
+        per_user = time.perf_counter()
+        for n in team:
+            put_user(users_file, n, dict(users[n], cash=6000))
+        per_user = time.perf_counter() - per_user
+        seq = store.seq
+        batch_team, _ = timed(lambda: apply_roster(users_file, {n: {"cash": 7000} for n in team}, create=False))
+        assert store.seq == seq + 1
+        all_students = {n: {"cash": rng.randrange(5000, 15000, 100), "team": f"team{rng.randrange(60)}"} for n in users}
+        seq = store.seq
+        batch_all, counts = timed(lambda: apply_roster(users_file, all_students, create=False))
+        assert store.seq == seq + 1
+
+        csv_text = export_roster(users_file) + "".join(f"newkid{i},team{i % 10},10000\n" for i in range(200))
+        export_time, _ = timed(lambda: export_roster(users_file), 20)
+        import_time, result = timed(lambda: apply_roster(users_file, parse_roster(csv_text)[0]))
+
+        print(f"{students:,} students")
+        print(f"  panel per rerun, widget per student: {old_render * 1e3:7.2f} ms to build {len(old_widgets):,} elements")
+        print(f"  panel per rerun, paged editor:       {new_render * 1e3:7.2f} ms to build 1 editor with {len(rows)} rows")
+        print(f"  team cash ({len(team)} students), rewrite users.json: {old_apply * 1e3:7.2f} ms")
+        print(f"  team cash, one write per student:              {per_user * 1e3:7.2f} ms ({len(team)} log records)")
+        print(f"  team cash, one batch:                          {batch_team * 1e3:7.2f} ms (1 log record)")
+        print(f"  cash + team for all {students:,} students, one batch: {batch_all * 1e3:7.2f} ms ({counts['updated']} updated)")
+        print(f"  CSV export:                                    {export_time * 1e3:7.2f} ms")
+        print(f"  CSV import ({students + 200:,} rows, 200 new):        {import_time * 1e3:7.2f} ms ({result['created']} created)")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
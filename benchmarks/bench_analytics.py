@@ -0,0 +1,138 @@
+# Per-student and per-team trading statistics over 100k closed trades: cost of
+# folding in one new close (what every close_position does) vs. recomputing
+# everything, either with the vectorized rebuild or the plain-Python way.
+# Also checks that the running totals match a rebuild after students move team.
+#
+#   python benchmarks/bench_analytics.py [closed trades]
+
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from utils import save_users, save_closed_trades, close_position, put_user
+from archive import archive_history
+from analytics import get_analytics, performance, _current
+
+STUDENTS = 1000
+TEAMS = 100
+TICKERS = ["NVDA", "AAPL", "TSLA", "MSFT", "AMZN", "META", "GOOG", "AMD"]
+
+
+def python_recompute(closed, team_of):
+    # What a teacher table would cost computed from scratch on each rerun
+    out = {}
+    for key in (lambda c: c["user"], lambda c: team_of[c["user"]]):
+        for c in closed:
+            s = out.setdefault(key(c), {"n": 0, "wins": 0, "pnl": 0.0, "peak": 0.0, "dd": 0.0, "by": {}})
+            s["n"] += 1
+            s["wins"] += c["pnl"] > 0
+            s["pnl"] += c["pnl"]
+            s["peak"] = max(s["peak"], s["pnl"])
+            s["dd"] = max(s["dd"], s["peak"] - s["pnl"])
+            s["by"][c["ticker"]] = s["by"].get(c["ticker"], 0.0) + c["pnl"]
+    return out
+
+
+def main(n=100_000):
+    rng = random.Random(12)
+    with tempfile.TemporaryDirectory() as data_dir:
+        users_file = os.path.join(data_dir, "users.json")
+        trades_file = os.path.join(data_dir, "trades.json")
+        closed_file = os.path.join(data_dir, "closed_trades.json")
+        market_file = os.path.join(data_dir, "market.json")
+        users = {f"student{i}": {"cash": 10000, "positions": {}, "pnl": 0, "team": f"team{i % TEAMS}"}
+                 for i in range(STUDENTS)}
+        team_of = {name: u["team"] for name, u in users.items()}
+        closed = []
+        for _ in range(n):
+            qty = rng.choice([-10, -5, 5, 10, 20])
+            entry = round(rng.uniform(50, 150), 2)
+            exit_ = round(entry * rng.uniform(0.9, 1.1), 2)
+            name = f"student{rng.randrange(STUDENTS)}"
+            closed.append({"user": name, "team": team_of[name], "ticker": rng.choice(TICKERS), "qty": qty,
+                           "entry_price": entry, "exit_price": exit_, "pnl": qty * (exit_ - entry),
+                           "timestamp": "2025-06-12 13:30:10", "direction": "Long" if qty > 0 else "Short"})
+        save_users(users_file, users)
+        save_closed_trades(closed[: n // 2], closed_file)
+        archive_history(trades_file, closed_file)  # half archived, half hot
+        save_closed_trades(closed[n // 2:], closed_file)
+        store = storage.get_store(users_file)
+        analytics = get_analytics(users_file, closed_file)
+
+        start = time.perf_counter()
+        python_recompute(closed, team_of)
+        naive = time.perf_counter() - start
+
+        reps = 5
+        start = time.perf_counter()
+        for _ in range(reps):
+            analytics.dirty = True
+            analytics.generation = None
+            with store.lock():
+                _current(users_file, closed_file)
+        rebuild = (time.perf_counter() - start) / reps
+
+        # One close at a time, the way the app produces them
+        closes = 300
+        total = 0.0
+        for i in range(closes):
+            name = f"student{rng.randrange(STUDENTS)}"
+            put_user(users_file, name, dict(users[name], positions={"NVDA": {"qty": 5, "entry_price": 100.0}}))
+            start = time.perf_counter()
+            close_position(users_file, closed_file, name, "NVDA", 101.0, "2025-06-12 13:31:00")
+            total += time.perf_counter() - start
+        assert not analytics.dirty and analytics.closes == n + closes
+        with_analytics = total / closes
+
+        # Students who change team keep their earlier closes with the old one
+        for i in range(100):
+            name = f"student{i}"
+            users[name]["team"] = f"team{(i + 1) % TEAMS}"
+            put_user(users_file, name, dict(users[name], positions={"NVDA": {"qty": 5, "entry_price": 100.0}}))
+            close_position(users_file, closed_file, name, "NVDA", 99.0, "2025-06-12 13:32:00")
+        assert not analytics.dirty
+        incremental = {t: s.summary() for t, s in analytics.teams.items()}
+        analytics.dirty = True
+        analytics.generation = None
+        with store.lock():
+            _current(users_file, closed_file)
+        rebuilt = {t: s.summary() for t, s in analytics.teams.items()}
+        assert incremental.keys() == rebuilt.keys()
+        for t, a in incremental.items():
+            b = rebuilt[t]
+            assert (a["trades"], a["win_rate"], a["by_ticker"].keys()) == (b["trades"], b["win_rate"], b["by_ticker"].keys()), t
+            for k in ("realized", "max_drawdown", "turnover"):
+                assert math.isclose(a[k], b[k], rel_tol=1e-9, abs_tol=1e-6), (t, k)
+            for k, v in a["by_ticker"].items():
+                assert math.isclose(v, b["by_ticker"][k], rel_tol=1e-9, abs_tol=1e-6), (t, k)
+
+        fold = 0.0
+        for i in range(closes):
+            start = time.perf_counter()
+            analytics.add(closed[i], team_of[closed[i]["user"]])
+            fold += time.perf_counter() - start
+        fold /= closes
+
+        reps = 2000
+        start = time.perf_counter()
+        for i in range(reps):
+            performance(users_file, closed_file, market_file, name=f"student{i % STUDENTS}", team=f"team{i % TEAMS}")
+        lookup = (time.perf_counter() - start) / reps
+
+        print(f"{n:,} closed trades ({n // 2:,} archived), {STUDENTS} students in {TEAMS} teams")
+        print(f"  full recompute, plain Python:   {naive * 1e3:9.1f} ms")
+        print(f"  full rebuild, vectorized:       {rebuild * 1e3:9.1f} ms")
+        print(f"  fold in one close:              {fold * 1e6:9.2f} us ({naive / fold:,.0f}x cheaper than recompute)")
+        print(f"  close_position incl. analytics: {with_analytics * 1e3:9.3f} ms")
+        print(f"  student + team lookup:          {lookup * 1e3:9.3f} ms")
+        print("  incremental == rebuild after 100 team moves: ok")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,86 @@
+# Startup and save cost with and without the archive: the same game history
+# kept entirely in trades.json / closed_trades.json vs. moved to the column
+# archive, with a fixed open interest. Also times history queries that now
+# read the archive (a student's closed-trade page, per-ticker volume).
+#
+#   python benchmarks/bench_archive.py [open offers]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from utils import save_trades, save_closed_trades
+from archive import archive_history, ticker_volume
+from history import closed_trades_page
+
+TICKERS = ["NVDA", "AAPL", "TSLA", "MSFT", "AMZN", "META", "GOOG", "AMD"]
+
+
+def history(rng, n, open_offers):
+    trades = [
+        {"user": f"student{rng.randrange(500)}", "ticker": rng.choice(TICKERS),
+         "direction": rng.choice(["Buy", "Sell"]), "price": round(rng.uniform(50, 150), 2),
+         "quantity": 10, "matched": i >= open_offers, "filled": 10 if i >= open_offers else 0}
+        for i in range(n + open_offers)
+    ]
+    rng.shuffle(trades)
+    closed = [
+        {"user": f"student{rng.randrange(500)}", "ticker": rng.choice(TICKERS), "qty": 5,
+         "entry_price": 100.0, "exit_price": 101.0, "pnl": 5.0,
+         "timestamp": "2025-06-12 13:30:10", "direction": "Long"}
+        for _ in range(n)
+    ]
+    return trades, closed
+
+
+def measure(data_dir, trades_file, closed_file):
+    storage._stores.clear()
+    start = time.perf_counter()
+    store = storage.get_store(trades_file)
+    store.collection(trades_file, [])
+    store.collection(closed_file, [])
+    ticker_volume(trades_file)
+    startup = time.perf_counter() - start
+    start = time.perf_counter()
+    store.compact()
+    save = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(100):
+        closed_trades_page(closed_file, f"student{i}", page=0)
+    page = (time.perf_counter() - start) / 100
+    start = time.perf_counter()
+    for _ in range(20):
+        ticker_volume(trades_file)
+    volume = (time.perf_counter() - start) / 20
+    hot = os.path.getsize(trades_file) + os.path.getsize(closed_file)
+    store.close()
+    return startup, save, page, volume, hot
+
+
+def main(open_offers=1000):
+    rng = random.Random(11)
+    print(f"{open_offers:,} open offers; history rows = finished offers = closed trades")
+    print(f"{'history':>9} {'tier':>8} {'startup':>10} {'save':>10} {'history page':>13} {'volume':>10} {'hot JSON':>10}")
+    for n in (10_000, 100_000, 500_000):
+        trades, closed = history(rng, n, open_offers)
+        for tiered in (False, True):
+            with tempfile.TemporaryDirectory() as data_dir:
+                trades_file = os.path.join(data_dir, "trades.json")
+                closed_file = os.path.join(data_dir, "closed_trades.json")
+                save_trades(trades_file, trades)
+                save_closed_trades(closed, closed_file)
+                if tiered:
+                    archive_history(trades_file, closed_file)
+                startup, save, page, volume, hot = measure(data_dir, trades_file, closed_file)
+                print(f"{n:>9,} {'archive' if tiered else 'JSON':>8} {startup * 1e3:>7.1f} ms {save * 1e3:>7.1f} ms"
+                      f" {page * 1e3:>10.3f} ms {volume * 1e3:>7.2f} ms {hot / 1e6:>7.2f} MB")
+            storage._stores.clear()
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,94 @@
+# Liquidity bots (bots.py): how many bot actions and orders a pool gets
+# through, and what that does to the students. A class of students clicks on a
+# fixed schedule (classroom.py's actions, no think time beyond the pacing)
+# while the bots run in worker processes, or threads, at several rate caps. We
+# report bot throughput and the students' p50/p99 latency per action.
+#
+#   python benchmarks/bench_bots.py [seconds] [workers]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), HERE]
+
+from classroom import Classroom, MIX, pct
+from bots import BotPool, make_bots
+
+STUDENTS = 30
+STUDENT_RATE = 100  # student actions per second across the class
+UNLIMITED = 1e9     # bot rates: as fast as the workers go
+# (label, rate cap for the whole pool, threads instead of processes)
+CONFIGS = [
+    ("no bots", None, False),
+    ("processes, 200/s", 200, False),
+    ("processes, 1000/s", 1000, False),
+    ("processes, no cap", UNLIMITED, False),
+    ("threads, no cap", UNLIMITED, True),
+]
+SHOWN = ("rerun", "offers", "submit", "match")
+
+
+def students(room, rng, seconds):
+    # Paced student clicks; {action: [seconds]}
+    kinds, weights = list(MIX), list(MIX.values())
+    times = {}
+    interval = 1.0 / STUDENT_RATE
+    start = time.perf_counter()
+    due = start
+    while due - start < seconds:
+        now = time.perf_counter()
+        if now < due:
+            time.sleep(due - now)
+        due += interval
+        name = rng.choice(room.names)
+        for kind in ("rerun", rng.choices(kinds, weights)[0]):
+            t0 = time.perf_counter()
+            getattr(room, kind)(name)
+            times.setdefault(kind, []).append(time.perf_counter() - t0)
+    return times
+
+
+def run(label, rate, threads, seconds, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = random.Random(11)
+        room = Classroom(tmp, STUDENTS, 5, rng)
+        for name in room.names:
+            room.join(name)
+        for _ in range(200):  # some open interest and listed tickers to start from
+            room.submit(rng.choice(room.names))
+        pool = None
+        if rate is not None:
+            bots = make_bots(makers=4, noise=12, maker_rate=UNLIMITED, noise_rate=UNLIMITED)
+            pool = BotPool(tmp, bots, workers=workers, max_rate=rate, threads=threads).start()
+            time.sleep(1.0)  # let spawned workers import and warm up
+        times = students(room, rng, seconds)
+        stats = pool.stop() if pool is not None else None
+    row = f"{label:<20}"
+    if stats:
+        row += f" {stats['actions'] / stats['seconds']:>9,.0f} {stats['orders'] / stats['seconds']:>9,.0f}"
+    else:
+        row += f" {'-':>9} {'-':>9}"
+    for kind in SHOWN:
+        values = times.get(kind, [])
+        row += f"   {pct(values, 0.5) * 1e3:8.2f} {pct(values, 0.99) * 1e3:8.2f}"
+    print(row)
+    return stats, times
+
+
+def main(seconds=5, workers=2):
+    print(f"{STUDENTS} students at {STUDENT_RATE} actions/s for {seconds} s; 16 bots in {workers} workers; "
+          f"{os.cpu_count()} CPU(s)\n")
+    header = f"{'':<20} {'bot act/s':>9} {'orders/s':>9}"
+    for kind in SHOWN:
+        header += f"   {kind + ' p50/p99 ms':>17}"
+    print(header)
+    for label, rate, threads in CONFIGS:
+        run(label, rate, threads, seconds, workers)
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,100 @@
+# Live-update fan-out with many connected sessions, on a local stand-in for
+# Streamlit: each simulated session is a thread blocked on its own queue
+# (events.Subscription.wait), a publisher thread plays a stream of offers and
+# fills. Reports publish-to-delivery latency and CPU per connected session,
+# plus the cost of the timer-driven drain the app's fragment does.
+#
+#   python benchmarks/bench_events.py [sessions] [events]
+
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events
+from events import get_bus, subscribe, user_topic, OFFERS
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main(n_sessions=500, n_events=2000, rate=200):
+    bus = get_bus()
+    rng = random.Random(9)
+    names = [f"student{i}" for i in range(n_sessions)]
+    subs = [subscribe(name) for name in names]
+    latencies = []
+    received = [0]
+    lat_lock = threading.Lock()
+    done = threading.Event()
+
+    def session(sub):
+        while not done.is_set():
+            batch = sub.wait(0.5)
+            now = time.time()
+            with lat_lock:
+                received[0] += len(batch)
+                latencies.extend(now - e["time"] for e in batch)
+
+    threads = [threading.Thread(target=session, args=(sub,), daemon=True) for sub in subs]
+    for t in threads:
+        t.start()
+
+    # Idle: sessions connected, nothing happening
+    time.sleep(0.2)
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    time.sleep(2.0)
+    idle_cpu = (time.process_time() - cpu0) / (time.perf_counter() - wall0)
+
+    # Busy: a mix of personal fills and broadcast offers at `rate` events/s
+    expected = 0
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    for i in range(n_events):
+        if rng.random() < 0.8:
+            owner, taker = rng.sample(names, 2)
+            bus.publish(user_topic(owner), "fill", f"{taker} bought 5 NVDA from your offer", actor=taker)
+            expected += 1
+        else:
+            actor = rng.choice(names)
+            bus.publish(OFFERS, "offer", f"New NVDA Sell offer from {actor}", actor=actor)
+            expected += n_sessions - 1
+        time.sleep(max(0.0, wall0 + (i + 1) / rate - time.perf_counter()))
+    while received[0] < expected and time.perf_counter() - wall0 < n_events / rate + 10:
+        time.sleep(0.01)
+    busy_wall = time.perf_counter() - wall0
+    busy_cpu = (time.process_time() - cpu0) / busy_wall
+    done.set()
+    for t in threads:
+        t.join()
+
+    # The app's fragment: every session drains its queue on a timer
+    for sub in subs:
+        for _ in range(5):
+            sub.push({"message": "x"})
+    start = time.perf_counter()
+    for sub in subs:
+        sub.drain()
+    drain_full = (time.perf_counter() - start) / n_sessions
+    start = time.perf_counter()
+    for sub in subs:
+        sub.drain()
+    drain_empty = (time.perf_counter() - start) / n_sessions
+
+    print(f"{n_sessions} sessions, {n_events:,} events at {rate}/s ({expected:,} deliveries, {received[0]:,} received)")
+    print(f"  delivery latency: p50 {pct(latencies, 0.5) * 1e3:.2f} ms  p99 {pct(latencies, 0.99) * 1e3:.2f} ms"
+          f"  max {max(latencies) * 1e3:.2f} ms")
+    print(f"  CPU per session, idle: {idle_cpu / n_sessions * 1e6:8.2f} us/s")
+    print(f"  CPU per session, busy: {busy_cpu / n_sessions * 1e6:8.2f} us/s")
+    print(f"  fragment drain: {drain_empty * 1e6:.2f} us empty, {drain_full * 1e6:.2f} us with 5 events")
+    for sub in subs:
+        sub.close()
+    assert len(events.get_bus()) == 0
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,89 @@
+# Leaderboard cost per page view: the old full recompute (walk every position
+# of every student, then sort) vs. reading the incrementally maintained board,
+# plus what the board pays per fill and per price tick to stay current.
+#
+#   python benchmarks/bench_leaderboard.py [students] [tickers per student]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard import Leaderboard
+
+TICKERS = [f"TCK{i}" for i in range(200)]
+
+
+def full_recompute(users, prices):
+    # What the Leaderboard page used to do on every rerun
+    leaderboard = []
+    for name, data in users.items():
+        equity = data["cash"]
+        for ticker, pos in data.get("positions", {}).items():
+            equity += pos["qty"] * prices.get(ticker, 100)
+        leaderboard.append((name, equity))
+    leaderboard.sort(key=lambda x: x[1], reverse=True)
+    return leaderboard
+
+
+def make_users(students, per_student, rng):
+    return {
+        f"student{i}": {
+            "cash": rng.uniform(0, 20000),
+            "positions": {
+                t: {"qty": rng.randint(-50, 50) or 1, "entry_price": rng.uniform(10, 500)}
+                for t in rng.sample(TICKERS, per_student)
+            },
+            "pnl": 0,
+            "team": f"Team {i % 25}",
+        }
+        for i in range(students)
+    }
+
+
+def timed(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps
+
+
+def main(students=500, per_student=30):
+    rng = random.Random(3)
+    users = make_users(students, per_student, rng)
+    prices = {t: rng.uniform(10, 500) for t in TICKERS}
+    board = Leaderboard(users, prices)
+
+    expected = full_recompute(users, prices)
+    got = board.top(len(users))
+    assert [n for n, _ in got] == [n for n, _ in expected]
+    assert all(abs(a[1] - b[1]) < 1e-6 for a, b in zip(got, expected))
+
+    me = "student42"
+    full = timed(lambda: full_recompute(users, prices), 20)
+    view = timed(lambda: (board.top(50), board.rank(me), board.top_teams(25)), 2000)
+    print(f"{students} students x {per_student} tickers")
+    print(f"  page view, full recompute:   {full * 1e3:8.3f} ms")
+    print(f"  page view, incremental read: {view * 1e3:8.3f} ms ({full / view:,.0f}x)")
+
+    names = list(users)
+
+    def fill():
+        name = rng.choice(names)
+        record = users[name]
+        record["cash"] -= 10
+        pos = record["positions"][next(iter(record["positions"]))]
+        pos["qty"] += 1
+        board.update_user(name, record)
+    print(f"  update per fill:             {timed(fill, 2000) * 1e3:8.3f} ms")
+    print(f"  update per price tick:       {timed(lambda: board.set_price(rng.choice(TICKERS), rng.uniform(10, 500)), 500) * 1e3:8.3f} ms")
+
+    # Still agrees with a from-scratch computation after all the updates
+    expected = full_recompute(users, board.prices)
+    assert [n for n, _ in board.top(len(users))] == [n for n, _ in expected]
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
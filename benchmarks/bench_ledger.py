@@ -0,0 +1,111 @@
+# Memory and latency of the columnar ledger vs. the nested users dict at
+# classroom scale (default 1,000 students x 50 tickers each).
+#
+#   python benchmarks/bench_ledger.py [students] [tickers per student]
+
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import Ledger
+from leaderboard import Leaderboard
+
+TICKERS = [f"TCK{i}" for i in range(300)]
+
+
+def make_users(students, per_student, rng):
+    return {
+        f"student{i}": {
+            "cash": rng.choice([10000, rng.uniform(0, 20000)]),
+            "positions": {
+                t: {"qty": rng.randint(-50, 50), "entry_price": round(rng.uniform(10, 500), 2)}
+                for t in rng.sample(TICKERS, per_student)
+            },
+            "pnl": 0,
+            "team": f"Team {i % 25}",
+        }
+        for i in range(students)
+    }
+
+
+def measure(build):
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+
+def timed(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps
+
+
+def dict_net_worth(users, prices):
+    return {
+        name: data["cash"] + sum(pos["qty"] * prices.get(t, pos["entry_price"]) for t, pos in data["positions"].items())
+        for name, data in users.items()
+    }
+
+
+def dict_exposure(users, prices):
+    out = {}
+    for data in users.values():
+        for t, pos in data["positions"].items():
+            value = pos["qty"] * prices.get(t, pos["entry_price"])
+            net, gross = out.get(t, (0.0, 0.0))
+            out[t] = (net + value, gross + abs(value))
+    return out
+
+
+def main(students=1000, per_student=50):
+    rng = random.Random(5)
+    text = json.dumps(make_users(students, per_student, rng))
+    prices = {t: rng.uniform(10, 500) for t in TICKERS}
+
+    users, dict_bytes = measure(lambda: json.loads(text))
+    ledger, ledger_bytes = measure(lambda: Ledger.from_users(json.loads(text)))
+    assert json.dumps(ledger.to_users()) == text, "round trip changed the JSON"
+
+    print(f"{students:,} students x {per_student} tickers ({students * per_student:,} positions)")
+    print(f"  memory: nested dicts {dict_bytes / 1e6:.1f} MB, ledger {ledger_bytes / 1e6:.1f} MB "
+          f"(of which columns {ledger.nbytes() / 1e6:.1f} MB)")
+
+    worth = ledger.net_worth(prices)
+    expected = dict_net_worth(users, prices)
+    assert all(abs(worth[ledger.user_ids[n]] - w) < 1e-6 for n, w in expected.items())
+
+    rows = [
+        ("net worth, every student", lambda: dict_net_worth(users, prices), lambda: ledger.net_worth(prices)),
+        ("exposure per ticker", lambda: dict_exposure(users, prices), lambda: ledger.exposure(prices)),
+        ("class totals", lambda: sum(dict_net_worth(users, prices).values()), lambda: ledger.totals(prices)),
+    ]
+    for label, slow, fast in rows:
+        a, b = timed(slow, 5), timed(fast, 50)
+        print(f"  {label:<26} dicts {a * 1e3:8.2f} ms   ledger {b * 1e3:7.3f} ms ({a / b:,.0f}x)")
+
+    # A clock tick moves every ticker: per-holder leaderboard updates vs. one bulk reprice
+    board = Leaderboard(users, prices)
+    moved = {t: p * 1.01 for t, p in prices.items()}
+    start = time.perf_counter()
+    for t, p in moved.items():
+        board.set_price(t, p)
+    per_ticker = time.perf_counter() - start
+    board2 = Leaderboard(users, prices)
+    start = time.perf_counter()
+    worth = ledger.net_worth(moved)
+    board2.reprice(moved, {n: float(worth[uid]) for n, uid in ledger.user_ids.items()})
+    bulk = time.perf_counter() - start
+    assert [n for n, _ in board.top(20)] == [n for n, _ in board2.top(20)]
+    print(f"  leaderboard tick, all tickers move: per-ticker {per_ticker * 1e3:.1f} ms, bulk {bulk * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,84 @@
+# Cost of the instrumentation (metrics.py): one span with metrics off and on,
+# then the same classroom session (classroom.py's "grade" scenario) played with
+# metrics off and on (alternating, medians), then with each profiler running
+# the whole time. Ends with the busiest spans and a peek at the Prometheus dump.
+#
+#   python benchmarks/bench_metrics.py [scenario]
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), HERE]
+
+import metrics
+from classroom import run_scenario
+
+SPANS = 200_000
+
+
+def span_cost():
+    start = time.perf_counter()
+    for _ in range(SPANS):
+        with metrics.span("bench"):
+            pass
+    return (time.perf_counter() - start) / SPANS
+
+
+def session(name, profile=None):
+    # When profiling, the session is one long "rerun" so the profiler is on throughout
+    if profile:
+        metrics.start_rerun("bench", profile=profile)
+    result = run_scenario(name)
+    if profile:
+        metrics.end_rerun()
+    return result
+
+
+def main(name="grade", rounds=5):
+    metrics.set_enabled(False)
+    off = span_cost()
+    metrics.set_enabled(True)
+    on = span_cost()
+    print(f"one span: {off * 1e9:.0f} ns off, {on * 1e9:.0f} ns on")
+
+    # Runs vary a lot from one to the next, so alternate off and on and compare medians
+    session(name)  # warm up imports and caches
+    runs = {"metrics off": [], "metrics on": []}
+    for _ in range(rounds):
+        metrics.set_enabled(False)
+        runs["metrics off"].append(session(name)["ops_per_second"])
+        metrics.set_enabled(True)
+        metrics.reset()
+        result = session(name)
+        runs["metrics on"].append(result["ops_per_second"])
+    snap = metrics.snapshot()
+    spans = sum(h["count"] for h in snap["spans"].values()) / result["operations"]
+    runs["+ sampling"] = [session(name, "sample")["ops_per_second"] for _ in range(2)]
+    runs["+ cProfile"] = [session(name, "cprofile")["ops_per_second"] for _ in range(2)]
+
+    base = statistics.median(runs["metrics off"])
+    print(f"\n{name} session, median ops/s")
+    for label, values in runs.items():
+        ops = statistics.median(values)
+        print(f"  {label:<12} {ops:>8,.0f} ops/s   {ops / base - 1:+6.1%}")
+    print(f"  {spans:.2f} spans per operation: about {spans * (on - off) * base:.1%} expected from the spans alone")
+
+    print("\nbusiest spans (metrics on)")
+    for span, h in sorted(snap["spans"].items(), key=lambda kv: -kv[1]["total"])[:8]:
+        print(f"  {span:<30} {h['count']:>7,} x {h['mean'] * 1e6:8.1f} us   p99 <= {h['p99'] * 1e3:g} ms")
+    for counter, value in sorted(snap["counters"].items()):
+        print(f"  {counter:<40} {value:>12,}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = metrics.dump(os.path.join(tmp, "metrics.prom"))
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    print(f"\nPrometheus dump: {len(text.splitlines())} lines, {len(text) / 1e3:.1f} kB")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
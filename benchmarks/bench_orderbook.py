@@ -0,0 +1,80 @@
+# Matching-engine throughput on synthetic order flow, plus the cost of finding
+# open interest in the book vs. scanning the whole trade history.
+#
+#   python benchmarks/bench_orderbook.py [orders]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from orderbook import OrderBook, submit_order, get_book
+from utils import save_users, save_trades, load_trades
+
+STUDENTS = 300
+TICKERS = ["NVDA", "AAPL", "WHALE", "CHARIZARD", "SODACO", "OCTOPUS"]
+
+
+def synthetic_order(rng):
+    ticker = rng.choice(TICKERS)
+    mid = 100 + 10 * TICKERS.index(ticker)
+    direction = rng.choice(["Buy", "Sell"])
+    # Buyers bid a little under mid, sellers ask a little over; the tails cross
+    offset = rng.gauss(-1.0 if direction == "Buy" else 1.0, 1.5)
+    return {
+        "user": f"student{rng.randrange(STUDENTS)}",
+        "ticker": ticker,
+        "direction": direction,
+        "price": round(mid + offset, 1),
+        "quantity": rng.randint(1, 10),
+        "matched": False,
+    }
+
+
+def main(orders=20_000):
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as data_dir:
+        users_file = os.path.join(data_dir, "users.json")
+        trades_file = os.path.join(data_dir, "trades.json")
+        save_users(users_file, {
+            f"student{i}": {"cash": 10_000_000, "positions": {}, "pnl": 0, "team": ""}
+            for i in range(STUDENTS)
+        })
+        save_trades(trades_file, [])
+
+        fills = 0
+        start = time.perf_counter()
+        for _ in range(orders):
+            _, f = submit_order(users_file, trades_file, synthetic_order(rng))
+            fills += len(f)
+        elapsed = time.perf_counter() - start
+        print(f"submit_order: {orders:,} orders, {fills:,} fills in {elapsed:.2f}s "
+              f"({orders / elapsed:,.0f} orders/s, {fills / elapsed:,.0f} fills/s, persisted)")
+
+        trades = load_trades(trades_file)
+        book = get_book(trades_file)
+        print(f"history {len(trades):,} offers, {len(book.orders):,} still open")
+
+        reps = 200
+        start = time.perf_counter()
+        for _ in range(reps):
+            best = max((t["price"] for t in trades if not t["matched"] and t["ticker"] == "NVDA"
+                        and t["direction"] == "Buy"), default=None)
+        scan = (time.perf_counter() - start) / reps
+        start = time.perf_counter()
+        for _ in range(reps):
+            assert book.best("NVDA", "Buy") == best
+        indexed = (time.perf_counter() - start) / reps
+        print(f"best NVDA bid: full scan {scan * 1e6:,.0f} us, book {indexed * 1e6:,.1f} us")
+
+        # Book rebuild from history (what a fresh process pays once)
+        start = time.perf_counter()
+        OrderBook(trades)
+        print(f"book rebuild from {len(trades):,} offers: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,83 @@
+# Cost of building one page of the "View Trades" offers and the closed-trade
+# history as the data grows: the old full scan (filter everything, render
+# everything) vs. the paged queries (orderbook.offers_page, history.closed_trades_page).
+#
+#   python benchmarks/bench_pagination.py
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from utils import save_trades, save_closed_trades, read_trades, read_closed_trades, remaining
+from orderbook import offers_page
+from history import closed_trades_page
+
+TICKERS = ["NVDA", "AAPL", "TSLA", "MSFT", "AMZN", "META", "GOOG", "AMD"]
+
+
+def timed(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps
+
+
+def run(n, rng):
+    with tempfile.TemporaryDirectory() as data_dir:
+        trades_file = os.path.join(data_dir, "trades.json")
+        closed_file = os.path.join(data_dir, "closed_trades.json")
+        save_trades(trades_file, [
+            {"user": f"student{rng.randrange(500)}", "ticker": rng.choice(TICKERS),
+             "direction": rng.choice(["Buy", "Sell"]), "price": round(rng.uniform(50, 150), 2),
+             "quantity": rng.randint(1, 20), "matched": rng.random() < 0.5}
+            for _ in range(n)
+        ])
+        save_closed_trades([
+            {"user": f"student{rng.randrange(500)}", "ticker": rng.choice(TICKERS), "qty": 5,
+             "entry_price": 100.0, "exit_price": 101.0, "pnl": 5.0,
+             "timestamp": "2025-06-12 13:30:10", "direction": "Long"}
+            for _ in range(n)
+        ], closed_file)
+
+        def full_offers():
+            # render every open offer, as the page used to
+            return [str(t) for t in read_trades(trades_file) if remaining(t) > 0 and t["user"] != "student0"]
+
+        def full_history():
+            mine = [t for t in read_closed_trades(closed_file) if t["user"] == "student1"]
+            return {"Ticker": [t["ticker"] for t in mine], "PnL": [f"${t['pnl']:+.2f}" for t in mine]}
+
+        def paged_offers():
+            rows, _ = offers_page(trades_file, page=2, page_size=20, side="Sell",
+                                  min_price=80.0, max_price=120.0, exclude_user="student0")
+            return [str(t) for _, t in rows]
+
+        def paged_history():
+            return closed_trades_page(closed_file, "student1", page=0, page_size=20)
+
+        for fn in (full_offers, full_history, paged_offers, paged_history):
+            fn()
+        read_trades(trades_file)
+        results = [timed(fn, reps) for fn, reps in
+                   ((full_offers, 5), (full_history, 20), (paged_offers, 500), (paged_history, 500))]
+        storage.get_store(trades_file).close()
+        storage._stores.clear()
+        return results
+
+
+def main():
+    rng = random.Random(8)
+    print(f"{'rows':>9} {'offers, all':>13} {'offers, page':>13} {'history, all':>13} {'history, page':>14}")
+    for n in (1_000, 10_000, 100_000):
+        full_offers, full_history, paged_offers, paged_history = run(n, rng)
+        print(f"{n:>9,} {full_offers * 1e3:>10.2f} ms {paged_offers * 1e3:>10.3f} ms"
+              f" {full_history * 1e3:>10.2f} ms {paged_history * 1e3:>11.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
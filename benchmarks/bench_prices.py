@@ -0,0 +1,62 @@
+# Marking positions to market: the old per-position random.uniform draw vs. one
+# vectorized multiply against the shared price snapshot, plus the cost of
+# stepping every ticker's path forward.
+#
+#   python benchmarks/bench_prices.py [positions] [tickers]
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prices import PriceEngine, new_game
+
+
+def main(positions=10_000, tickers=200):
+    rng = random.Random(11)
+    clock = [0.0]
+    engine = PriceEngine(new_game(seed=42, start=0.0), clock=lambda: clock[0])
+    names = [f"TCK{i}" for i in range(tickers)]
+    for name in names:
+        engine.list(name, rng.uniform(10, 500), 0)
+
+    entry = np.array([rng.uniform(10, 500) for _ in range(positions)])
+    qty = np.array([rng.randint(-50, 50) for _ in range(positions)], dtype=np.float64)
+    slots = np.array([rng.randrange(tickers) for _ in range(positions)])
+
+    reps = 20
+    start = time.perf_counter()
+    for _ in range(reps):
+        sum(q * round(e * random.uniform(0.95, 1.05), 2) for q, e in zip(qty.tolist(), entry.tolist()))
+    legacy = (time.perf_counter() - start) / reps
+
+    start = time.perf_counter()
+    for _ in range(reps * 50):
+        (qty * engine.prices[slots]).sum()
+    vectorized = (time.perf_counter() - start) / (reps * 50)
+    print(f"mark {positions:,} positions: python RNG {legacy * 1e3:.2f} ms, vectorized {vectorized * 1e3:.3f} ms "
+          f"({legacy / vectorized:,.0f}x)")
+
+    start = time.perf_counter()
+    for tick in range(1, 1441):
+        clock[0] = tick * 60.0
+        engine.advance()
+    step = (time.perf_counter() - start) / 1440
+    print(f"advance {tickers} tickers by one tick: {step * 1e3:.3f} ms")
+
+    clock[0] = 0.0
+    fresh = PriceEngine(engine.game, {n: {"anchor": float(engine.anchor[i]), "tick": 0} for i, n in enumerate(names)},
+                        clock=lambda: clock[0])
+    clock[0] = 1440 * 60.0
+    start = time.perf_counter()
+    fresh.advance()
+    print(f"catch up a fresh process over 1,440 ticks: {(time.perf_counter() - start) * 1e3:.2f} ms")
+    assert np.allclose(fresh.prices, engine.prices)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,74 @@
+# Regrading speed: record a class session through the engine (classroom.py's
+# students and action mix, journal on, with liquidity bots trading alongside),
+# then replay its journal into a fresh data directory with replay.py and check
+# that it lands on the same state.
+#
+#   python benchmarks/bench_replay.py [students] [actions] [bots]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), HERE]
+
+from classroom import Classroom, MIX
+from engine import read_journal
+from bots import make_bots, new_stats, BOT_CASH
+from utils import BOT_TEAM
+from replay import replay, results, differences
+
+
+def record(data_dir, students, actions, bots, seed=3):
+    rng = random.Random(seed)
+    room = Classroom(data_dir, students, max(1, students // 10), rng)
+    kinds, weights = list(MIX), list(MIX.values())
+    pool, stats = make_bots(makers=bots // 3, noise=bots - bots // 3), new_stats()
+    start = time.perf_counter()
+    for name in room.names:
+        room.join(name)
+    if pool:
+        room.engine.apply_roster({bot.name: {"team": BOT_TEAM, "cash": BOT_CASH} for bot in pool})
+    for _ in range(actions):
+        if pool and rng.random() < 0.2:
+            market = room.engine.market()
+            rng.choice(pool).act(room.engine, market, sorted(market.snapshot()), rng, stats)
+            continue
+        name = rng.choice(room.names)
+        room.rerun(name)
+        getattr(room, rng.choices(kinds, weights)[0])(name)
+    return time.perf_counter() - start
+
+
+def main(students=300, actions=20000, bots=6):
+    with tempfile.TemporaryDirectory() as tmp:
+        live, copy = os.path.join(tmp, "live"), os.path.join(tmp, "replay")
+        os.makedirs(live)
+        os.makedirs(copy)
+        recorded = record(live, students, actions, bots)
+        journal = os.path.join(live, "journal.jsonl")
+        entries = read_journal(journal)
+        kinds = {}
+        for entry in entries:
+            kinds[entry["op"]] = kinds.get(entry["op"], 0) + 1
+        print(f"live session: {students} students and {bots} bots, {actions:,} actions in {recorded:.2f} s; "
+              f"journal {len(entries):,} entries, {os.path.getsize(journal) / 1e3:,.0f} kB")
+        print("  " + ", ".join(f"{k} {n:,}" for k, n in sorted(kinds.items(), key=lambda kv: -kv[1])))
+
+        start = time.perf_counter()
+        engine, entries, skipped = replay(journal, copy)
+        elapsed = time.perf_counter() - start
+        t0 = time.perf_counter()
+        final = results(engine)
+        report = time.perf_counter() - t0
+        diffs = differences(engine, live)
+        print(f"replay: {elapsed * 1e3:,.0f} ms ({len(entries) / elapsed:,.0f} entries/s, "
+              f"{elapsed / len(entries) * 1e6:.0f} us each), {len(skipped)} skipped; "
+              f"final report {report * 1e3:.0f} ms for {len(final['students'])} students")
+        print("  same state as the live session" if not diffs else "  DIFFERS:\n  " + "\n  ".join(diffs))
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:4]))
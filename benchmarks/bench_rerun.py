@@ -0,0 +1,79 @@
+# Cost of the state loading at the top of app.py on every Streamlit rerun:
+# re-parsing the three JSON files (the old load_*) vs. the shared read views.
+#
+#   python benchmarks/bench_rerun.py [trades on disk]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from utils import save_users, save_trades, save_closed_trades, read_users, read_trades, read_closed_trades, put_user
+
+
+def legacy_load(filepath, empty):
+    if not os.path.exists(filepath) or os.path.getsize(filepath) == 0:
+        return empty
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def timed(fn, reps):
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps
+
+
+def main(n_trades=50_000):
+    rng = random.Random(2)
+    with tempfile.TemporaryDirectory() as data_dir:
+        users_file = os.path.join(data_dir, "users.json")
+        trades_file = os.path.join(data_dir, "trades.json")
+        closed_file = os.path.join(data_dir, "closed_trades.json")
+        users = {f"student{i}": {"cash": 10000, "positions": {}, "pnl": 0, "team": ""} for i in range(500)}
+        save_users(users_file, users)
+        save_trades(trades_file, [
+            {"user": f"student{rng.randrange(500)}", "ticker": "NVDA", "direction": "Buy",
+             "price": 100.0, "quantity": 5, "matched": True}
+            for _ in range(n_trades)
+        ])
+        save_closed_trades([
+            {"user": f"student{rng.randrange(500)}", "ticker": "NVDA", "qty": 5, "entry_price": 100.0,
+             "exit_price": 101.0, "pnl": 5.0, "timestamp": "2025-06-12 13:30:10", "direction": "Long"}
+            for _ in range(n_trades // 5)
+        ], closed_file)
+        storage.get_store(users_file).compact()
+
+        def before():
+            legacy_load(users_file, {})
+            legacy_load(trades_file, [])
+            legacy_load(closed_file, [])
+
+        def after():
+            read_users(users_file)
+            read_trades(trades_file)
+            read_closed_trades(closed_file)
+
+        after()
+        cold = timed(before, 5)
+        warm = timed(after, 1000)
+
+        def after_write():
+            put_user(users_file, "student1", users["student1"])
+            after()
+        written = timed(after_write, 50)
+
+        print(f"{n_trades:,} trades + {n_trades // 5:,} closed trades on disk")
+        print(f"  rerun, re-parse JSON:        {cold * 1e3:8.2f} ms")
+        print(f"  rerun, shared views:         {warm * 1e3:8.3f} ms ({cold / warm:,.0f}x)")
+        print(f"  rerun right after a write:   {written * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
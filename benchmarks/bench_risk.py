@@ -0,0 +1,150 @@
+# Pre-trade risk checks (risk.py): the cost of one check from the exposure
+# cache against rebuilding the same answer from the student's record and a
+# scan of the open offers, as the book grows. Then a class session recorded
+# with and without the checks, counting what failed and why, and a final
+# comparison of the incrementally kept cache with one rebuilt from scratch.
+#
+#   python benchmarks/bench_risk.py [students] [actions]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), HERE]
+
+from classroom import Classroom, MIX, TICKERS
+from risk import Exposure, RiskError, get_exposure, limits
+from storage import get_store, collection_name
+
+CHECKS = 2000
+REASONS = {
+    "Not enough buying power": "refused: buying power",
+    "That would leave you": "refused: short limit",
+    "That would put": "refused: concentration limit",
+}
+
+
+def reason(message, owner=None):
+    for prefix, label in REASONS.items():
+        if message.startswith(prefix):
+            return label
+    return message.replace(owner, "<owner>") if owner else message
+
+
+def scan_check(store, users_file, trades_file, name, *order):
+    # The same answer without the cache: one student's record plus every open offer
+    users = store.collections[collection_name(users_file)]
+    trades = store.collections[collection_name(trades_file)]
+    return Exposure({name: users[name]}, [t if t and t["user"] == name else None for t in trades]).check(
+        name, *order, limits(users_file))
+
+
+def check_cost(offers_wanted):
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = random.Random(5)
+        room = Classroom(tmp, 200, 20, rng)
+        for name in room.names:
+            room.join(name)
+        # Resting offers that never cross: bids far below, asks far above the market
+        for _ in range(offers_wanted):
+            name = rng.choice(room.names)
+            ticker = rng.choice(list(TICKERS))
+            side = rng.choice(["Buy", "Sell"])
+            price = round(TICKERS[ticker] * (0.5 if side == "Buy" else 1.5), 2)
+            try:
+                room.engine.submit(name, ticker, side, price, 1)
+            except RiskError:
+                pass
+        store = get_store(room.users_file)
+        exposure = get_exposure(room.users_file, room.trades_file)
+        orders = [(rng.choice(room.names), rng.choice(list(TICKERS)), rng.choice(["Buy", "Sell"]), 100.0, 5)
+                  for _ in range(CHECKS)]
+        current = limits(room.users_file)
+        with store.lock():
+            start = time.perf_counter()
+            cached = [exposure.check(name, *order, current) for name, *order in orders]
+            cache_s = (time.perf_counter() - start) / CHECKS
+            start = time.perf_counter()
+            scanned = [scan_check(store, room.users_file, room.trades_file, name, *order) for name, *order in orders]
+            scan_s = (time.perf_counter() - start) / CHECKS
+            offers = len(exposure.offers)
+        return offers, cache_s, scan_s, cached == scanned
+
+
+def session(data_dir, students, actions, checks, seed=3):
+    rng = random.Random(seed)
+    room = Classroom(data_dir, students, max(1, students // 10), rng)
+    room.engine.checks = checks
+    kinds, weights = list(MIX), list(MIX.values())
+    outcomes = {}
+
+    def note(kind, message):
+        outcomes.setdefault(kind, {}).setdefault(message, 0)
+        outcomes[kind][message] += 1
+
+    for name in room.names:
+        room.join(name)
+    start = time.perf_counter()
+    for _ in range(actions):
+        name = rng.choice(room.names)
+        room.rerun(name)
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "submit":
+            ticker = rng.choice(list(TICKERS))
+            direction = rng.choice(["Buy", "Sell"])
+            price = max(1.0, round(TICKERS[ticker] * (1 + rng.gauss(-0.01 if direction == "Buy" else 0.01, 0.015)), 2))
+            try:
+                room.engine.submit(name, ticker, direction, price, rng.randint(1, 20))
+                note("submit", "ok")
+            except RiskError as e:
+                note("submit", reason(str(e)))
+        elif kind == "match":
+            rows, _ = room.offers(name)
+            if rows:
+                oid, trade = rng.choice(rows)
+                ok, message = room.engine.take(name, oid, expected=trade)[:2]
+                note("take", "ok" if ok else reason(message, trade["user"]))
+        else:
+            getattr(room, kind)(name)
+    elapsed = time.perf_counter() - start
+    return room, outcomes, elapsed
+
+
+def main(students=300, actions=20000):
+    print(f"one check, {CHECKS:,} random orders")
+    for wanted in (100, 1000, 10000):
+        offers, cache_s, scan_s, same = check_cost(wanted)
+        print(f"  {offers:>6,} open offers: cache {cache_s * 1e6:6.1f} us, scan {scan_s * 1e6:8.1f} us"
+              f"  ({scan_s / cache_s:,.0f}x){'' if same else '   ANSWERS DIFFER'}")
+
+    for checks in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            room, outcomes, elapsed = session(tmp, students, actions, checks)
+            print(f"\nsession with risk checks {'on' if checks else 'off'}: {students} students, "
+                  f"{actions:,} actions in {elapsed:.2f} s")
+            for kind, messages in outcomes.items():
+                total = sum(messages.values())
+                for message, n in sorted(messages.items(), key=lambda kv: -kv[1]):
+                    print(f"  {kind:<7} {n:>6,} {n / total:6.1%}  {message}")
+            if checks:
+                store = get_store(room.users_file)
+                kept = get_exposure(room.users_file, room.trades_file)
+                with store.lock():
+                    fresh = Exposure(store.collections[collection_name(room.users_file)],
+                                     store.collections[collection_name(room.trades_file)])
+                    worst = max(
+                        max(abs(kept.accounts[n].reserved - fresh.accounts[n].reserved),
+                            abs(kept.accounts[n].short - fresh.accounts[n].short),
+                            abs(kept.accounts[n].cost - fresh.accounts[n].cost))
+                        for n in room.names
+                    )
+                    offers_same = kept.offers == fresh.offers
+                print(f"  cache vs rebuilt: offers {'identical' if offers_same else 'DIFFER'}, "
+                      f"largest $ difference {worst:.2e}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,109 @@
+# Several classrooms on one app process versus one process (shard) each.
+#
+# Every classroom is its own data directory driven by the classroom.py load
+# harness. "shared" plays all of them turn by turn in one process, like one
+# Streamlit server hosting every class; "sharded" gives each classroom its own
+# process, like router.py in front of K app processes. Then the noisy-neighbour
+# check: the latency a small class sees while a big class trades next to it, in
+# the same process and on separate shards.
+#
+# Shards only add throughput with spare cores; the CPU count is printed first.
+#
+#   python benchmarks/bench_shards.py [max classrooms]
+
+import heapq
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from classroom import Classroom, MIX, THINK_SECONDS, pct
+
+STUDENTS, TEAMS, ACTIONS = 30, 5, 40
+BIG = (600, 60, 20)
+
+
+def drive(rooms, seed):
+    # Play every room's turns in one simulated-time order; latencies per room
+    rng = random.Random(seed)
+    kinds, weights = list(MIX), list(MIX.values())
+    timings = [[] for _ in rooms]
+    turns = []
+    for i, (room, actions) in enumerate(rooms):
+        for student in room.names:
+            room.join(student)
+            turns.append((rng.uniform(*THINK_SECONDS), i, student, actions))
+    heapq.heapify(turns)
+    start = time.perf_counter()
+    while turns:
+        at, i, student, left = heapq.heappop(turns)
+        room = rooms[i][0]
+        t0 = time.perf_counter()
+        room.rerun(student)
+        getattr(room, rng.choices(kinds, weights)[0])(student)
+        timings[i].append(time.perf_counter() - t0)
+        if left > 1:
+            heapq.heappush(turns, (at + rng.uniform(*THINK_SECONDS), i, student, left - 1))
+    return timings, time.perf_counter() - start
+
+
+def play(specs, seed):
+    # specs: [(students, teams, actions)], one classroom each, in this process
+    with tempfile.TemporaryDirectory() as tmp:
+        rooms = []
+        for i, (students, teams, actions) in enumerate(specs):
+            data_dir = os.path.join(tmp, f"class{i}")
+            os.makedirs(data_dir)
+            rooms.append((Classroom(data_dir, students, teams, random.Random(seed + i)), actions))
+        return drive(rooms, seed)
+
+
+def _child(specs, seed, queue):
+    queue.put(play(specs, seed))
+
+
+def play_sharded(specs, seed):
+    # One process per classroom, all started together; elapsed is the slowest
+    # shard's trading time (start-up and joins are not counted, as for shared)
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_child, args=([spec], seed + i, queue)) for i, spec in enumerate(specs)]
+    for proc in procs:
+        proc.start()
+    results = [queue.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return [timings[0] for timings, _ in results], max(elapsed for _, elapsed in results)
+
+
+def summary(timings, elapsed):
+    ops = sum(len(t) for t in timings)
+    every = [x for t in timings for x in t]
+    return f"{ops / elapsed:>8,.0f} ops/s   p50 {pct(every, 0.5) * 1e3:6.2f} ms   p99 {pct(every, 0.99) * 1e3:6.2f} ms"
+
+
+def main(max_rooms=4):
+    print(f"{os.cpu_count()} CPUs; classrooms of {STUDENTS} students, {ACTIONS} actions each")
+    k = 1
+    while k <= max_rooms:
+        specs = [(STUDENTS, TEAMS, ACTIONS)] * k
+        print(f"\n{k} classroom{'s' if k > 1 else ''}")
+        print(f"  shared   {summary(*play(specs, 10))}")
+        print(f"  sharded  {summary(*play_sharded(specs, 10))}")
+        k *= 2
+
+    small = (STUDENTS, TEAMS, ACTIONS)
+    print(f"\nNoisy neighbour: a {small[0]}-student class next to a {BIG[0]}-student one")
+    alone, _ = play([small], 20)
+    shared, _ = play([small, BIG], 20)
+    sharded, _ = play_sharded([small, BIG], 20)
+    for label, t in (("alone", alone[0]), ("same process", shared[0]), ("own shard", sharded[0])):
+        print(f"  {label:<13} p50 {pct(t, 0.5) * 1e3:6.2f} ms   p99 {pct(t, 0.99) * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
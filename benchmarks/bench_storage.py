@@ -0,0 +1,69 @@
+# Per-trade write latency: appending to the write-ahead log vs. rewriting the
+# whole trades.json like the old save_trades did.
+#
+#   python benchmarks/bench_storage.py [history sizes...]
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+from utils import load_trades, save_trades, append_trade
+
+WRITES = 200
+LEGACY_WRITES = 20  # full rewrites are slow enough that a few are plenty
+
+
+def make_trade(i):
+    return {
+        "user": f"student{i % 500}",
+        "ticker": ["NVDA", "AAPL", "WHALE", "CHARIZARD"][i % 4],
+        "direction": "Buy" if i % 2 else "Sell",
+        "price": 100.0 + i % 50,
+        "quantity": 1 + i % 10,
+        "matched": True,
+    }
+
+
+def legacy_save(filepath, data):
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def bench(history):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trades.json")
+        trades = [make_trade(i) for i in range(history)]
+
+        start = time.perf_counter()
+        for i in range(LEGACY_WRITES):
+            trades.append(make_trade(history + i))
+            legacy_save(path, trades)
+        legacy = (time.perf_counter() - start) / LEGACY_WRITES
+
+        os.remove(path)
+        save_trades(path, [make_trade(i) for i in range(history)])
+        storage.get_store(path).compact()
+        start = time.perf_counter()
+        for i in range(WRITES):
+            append_trade(path, make_trade(history + i))
+        wal = (time.perf_counter() - start) / WRITES
+        storage.get_store(path).close()
+
+        # Replay from disk in a fresh store to make sure nothing was lost
+        storage._stores.clear()
+        assert len(load_trades(path)) == history + WRITES
+        storage._stores.clear()
+    return legacy, wal
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    print(f"{'history':>10} {'rewrite (ms)':>14} {'append (ms)':>12} {'speedup':>8}")
+    for n in sizes:
+        legacy, wal = bench(n)
+        print(f"{n:>10,} {legacy * 1e3:>14.3f} {wal * 1e3:>12.3f} {legacy / wal:>7.0f}x")
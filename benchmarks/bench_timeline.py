@@ -0,0 +1,140 @@
+# Time travel (timeline.py): record a long trading session through the engine
+# until the timeline holds `events` account changes, then seek to random past
+# moments. Each seek loads the nearest checkpoint and applies the tail. We
+# compare that with applying the timeline from its first line, and check a few
+# points against a replay of the journal cut off at the same time.
+#
+#   python benchmarks/bench_timeline.py [events] [students]
+
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), HERE]
+
+from classroom import Classroom, TICKERS, pct
+from engine import Engine, read_journal
+from prices import get_price_engine
+from risk import RiskError
+from timeline import TIMELINE_NAME, apply_event, checkpoints, state_at, market_at, standings_at, _loaded
+from utils import read_users
+
+SEEKS = 200
+
+
+def record(data_dir, events, students, seed=9):
+    # Trading only (no page views), with prices set to cross often, until the
+    # timeline has `events` lines
+    rng = random.Random(seed)
+    room = Classroom(data_dir, students, max(1, students // 10), rng)
+    engine = room.engine
+    tick = [engine.clock()]
+    engine.clock = get_price_engine(engine.market_file).clock = lambda: tick[0]  # hours of trading, not seconds
+    for name in room.names:
+        room.join(name)
+    written = students + 1
+    start = time.perf_counter()
+    while written < events:
+        tick[0] += rng.uniform(0.05, 0.5)
+        name = rng.choice(room.names)
+        roll = rng.random()
+        if roll < 0.6:
+            ticker = rng.choice(list(TICKERS))
+            direction = rng.choice(["Buy", "Sell"])
+            mid = engine.market().price(ticker, TICKERS[ticker])
+            price = max(1.0, round(mid * (1 + rng.gauss(0.005 if direction == "Buy" else -0.005, 0.01)), 2))
+            try:
+                _, fills = engine.submit(name, ticker, direction, price, rng.randint(1, 10))
+            except RiskError:
+                continue
+            written += bool(fills)
+        elif roll < 0.9:
+            written += bool(room.match(name))
+        elif roll < 0.98:
+            written += bool(room.close(name))
+        else:
+            engine.apply_roster({name: {"cash": read_users(engine.users_file)[name]["cash"] + 100}}, create=False)
+            written += 1
+        if rng.random() < 0.01:
+            engine.maintain()
+    engine.close_journal()
+    return time.perf_counter() - start
+
+
+def scan_from_start(data_dir, when):
+    state = {"t": None, "game": None, "listings": {}, "users": {}}
+    with open(os.path.join(data_dir, TIMELINE_NAME), "rb") as f:
+        for line in f:
+            event = json.loads(line)
+            if event["t"] > when:
+                break
+            apply_event(state, event)
+    return state
+
+
+def journal_replay(live_dir, scratch, when):
+    # The slow way: rerun every journaled action up to `when`
+    entries = [e for e in read_journal(os.path.join(live_dir, "journal.jsonl")) if e["t"] <= when]
+    now = [entries[0]["t"]]
+    engine = Engine(scratch, journal=False, clock=lambda: now[0], publish=False, timeline=False)
+    for entry in entries:
+        now[0] = entry["t"]
+        engine.apply(entry)
+    return read_users(engine.users_file), len(entries)
+
+
+def main(events=200_000, students=300):
+    with tempfile.TemporaryDirectory() as tmp:
+        live = os.path.join(tmp, "live")
+        os.makedirs(live)
+        seconds = record(live, events, students)
+        size = os.path.getsize(os.path.join(live, TIMELINE_NAME))
+        with open(os.path.join(live, TIMELINE_NAME), "rb") as f:
+            times = [json.loads(line)["t"] for line in f]
+        known = checkpoints(live)
+        print(f"recorded {len(times):,} timeline events in {seconds:.0f} s ({len(times) / seconds:,.0f}/s), "
+              f"{size / 1e6:.1f} MB; {len(known)} checkpoints, "
+              f"{sum(os.path.getsize(c[2]) for c in known) / 1e6:.1f} MB")
+
+        rng = random.Random(1)
+        points = [rng.uniform(times[0], times[-1]) for _ in range(SEEKS)]
+        cold, warm = [], []
+        for when in points:
+            _loaded.clear()
+            t0 = time.perf_counter()
+            state_at(live, when)
+            cold.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            state = state_at(live, when)
+            market = market_at(state)
+            standings_at(state, market)
+            warm.append(time.perf_counter() - t0)
+        print(f"\nseek to a random moment ({SEEKS} points)")
+        print(f"  checkpoint + tail, cold    p50 {pct(cold, 0.5) * 1e3:7.1f} ms   p99 {pct(cold, 0.99) * 1e3:7.1f} ms")
+        print(f"  + prices and leaderboard   p50 {pct(warm, 0.5) * 1e3:7.1f} ms   p99 {pct(warm, 0.99) * 1e3:7.1f} ms"
+              f"   (checkpoint already parsed)")
+        scans = []
+        for when in points[:5]:
+            t0 = time.perf_counter()
+            full = scan_from_start(live, when)
+            scans.append(time.perf_counter() - t0)
+            assert full["users"] == state_at(live, when)["users"], "checkpointed state differs from a full scan"
+        print(f"  whole timeline from start  mean {statistics.mean(scans) * 1e3:7.1f} ms   (same states)")
+
+        for when in points[:1]:  # minutes at full size: one point is enough
+            scratch = tempfile.mkdtemp(dir=tmp)
+            t0 = time.perf_counter()
+            users, n = journal_replay(live, scratch, when)
+            elapsed = time.perf_counter() - t0
+            same = users == state_at(live, when)["users"]
+            print(f"  journal replay of {n:,} actions: {elapsed:6.1f} s, "
+                  f"{'same students' if same else 'STUDENTS DIFFER'}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
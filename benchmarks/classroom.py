@@ -0,0 +1,273 @@
+# Load test: a whole classroom trading session, driven through the same code
+# paths as app.py (the engine for every change, the portfolio, offers, history
+# and leaderboard views for reads), headless.
+#
+# Each simulated student takes turns on a think-time schedule, picking an
+# action from a mix weighted like a real class (mostly looking, some trading).
+# Every scenario runs in its own process so peak memory is per scenario.
+#
+#   python benchmarks/classroom.py                      # all scenarios
+#   python benchmarks/classroom.py class school         # some of them
+#   python benchmarks/classroom.py --compare benchmarks/results/classroom-....json
+#
+# Results are written to benchmarks/results/ as JSON for comparing runs.
+
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import Engine
+from risk import RiskError
+from utils import read_users
+from orderbook import offers_page
+from history import closed_trades_page
+from leaderboard import standings
+from prices import current_market, start_game
+from analytics import performance
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# name: (students, teams, actions per student)
+SCENARIOS = {
+    "class": (30, 5, 60),
+    "grade": (300, 30, 30),
+    "school": (1000, 100, 15),
+    "district": (5000, 500, 6),
+}
+
+# Relative weight of each action per turn
+MIX = {
+    "portfolio": 25,
+    "offers": 20,
+    "leaderboard": 15,
+    "submit": 20,
+    "match": 10,
+    "close": 5,
+    "history": 5,
+}
+
+TICKERS = {"NVDA": 120.0, "AAPL": 190.0, "TSLA": 250.0, "WHALE": 2000.0, "SODACO": 12.0, "CHARIZARD": 45.0}
+THINK_SECONDS = (5, 40)  # simulated time between a student's actions
+
+
+class Classroom:
+    def __init__(self, data_dir, students, teams, rng):
+        start_game(os.path.join(data_dir, "market.json"), seed=1)
+        self.engine = Engine(data_dir)
+        self.users_file = self.engine.users_file
+        self.trades_file = self.engine.trades_file
+        self.closed_file = self.engine.closed_trades_file
+        self.market_file = self.engine.market_file
+        self.rng = rng
+        self.names = [f"student{i}" for i in range(students)]
+        self.team = {name: f"team{i % teams}" for i, name in enumerate(self.names)}
+
+    def join(self, name):
+        self.engine.join(name, self.team[name])
+
+    def rerun(self, name):
+        # What the top of app.py does on every click, before the view itself
+        self.engine.maintain()
+        return read_users(self.users_file)[name]
+
+    def portfolio(self, name):
+        user = read_users(self.users_file)[name]
+        market = current_market(self.market_file)
+        net_worth = user["cash"] + market.value(user["positions"])
+        stats = performance(self.users_file, self.closed_file, self.market_file, name=name)
+        return [(t, market.price(t, p["entry_price"])) for t, p in user["positions"].items()], net_worth, stats
+
+    def offers(self, name):
+        ticker = self.rng.choice([None, *TICKERS])
+        return offers_page(self.trades_file, page=self.rng.choice([0, 0, 0, 1]), ticker=ticker, exclude_user=name)
+
+    def leaderboard(self, name):
+        board = standings(self.users_file, self.market_file, n=50, name=name, team=self.team[name])
+        return board, performance(self.users_file, self.closed_file, self.market_file, name=name, team=self.team[name])
+
+    def history(self, name):
+        return closed_trades_page(self.closed_file, name)
+
+    def submit(self, name):
+        ticker = self.rng.choice(list(TICKERS))
+        direction = self.rng.choice(["Buy", "Sell"])
+        mid = current_market(self.market_file).price(ticker, TICKERS[ticker])
+        offset = self.rng.gauss(-0.01 if direction == "Buy" else 0.01, 0.015)
+        price = max(1.0, round(mid * (1 + offset), 2))
+        try:
+            trade, fills = self.engine.submit(name, ticker, direction, price, self.rng.randint(1, 20))
+        except RiskError:
+            return None  # the student sees why and tries something else
+        return fills
+
+    def match(self, name):
+        rows, _ = offers_page(self.trades_file, page=0, exclude_user=name)
+        if not rows:
+            return None
+        oid, trade = self.rng.choice(rows)
+        return self.engine.take(name, oid, expected=trade)[0]
+
+    def close(self, name):
+        positions = read_users(self.users_file)[name]["positions"]
+        held = [t for t, p in positions.items() if p["qty"]]
+        if not held:
+            return None
+        ticker = self.rng.choice(held)
+        price = current_market(self.market_file).price(ticker, positions[ticker]["entry_price"])
+        return self.engine.close(name, ticker, price)
+
+
+def io_bytes():
+    # Bytes this process passed to write() (all files), from /proc on Linux
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run_scenario(name, data_dir=None, seed=10):
+    students, teams, actions = SCENARIOS[name]
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(dir=data_dir) as tmp:
+        room = Classroom(tmp, students, teams, rng)
+        timings = {action: [] for action in ["join", "rerun", *MIX]}
+        kinds, weights = list(MIX), list(MIX.values())
+        written = io_bytes()
+
+        start = time.perf_counter()
+        for student in room.names:
+            t0 = time.perf_counter()
+            room.join(student)
+            timings["join"].append(time.perf_counter() - t0)
+
+        # Turns in simulated-time order: each student acts, thinks, acts again
+        turns = [(rng.uniform(*THINK_SECONDS), student, actions) for student in room.names]
+        heapq.heapify(turns)
+        while turns:
+            at, student, left = heapq.heappop(turns)
+            action = rng.choices(kinds, weights)[0]
+            t0 = time.perf_counter()
+            room.rerun(student)
+            timings["rerun"].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            getattr(room, action)(student)
+            timings[action].append(time.perf_counter() - t0)
+            if left > 1:
+                heapq.heappush(turns, (at + rng.uniform(*THINK_SECONDS), student, left - 1))
+        elapsed = time.perf_counter() - start
+
+        if written is not None:
+            written = io_bytes() - written
+        on_disk = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        ops = sum(len(v) for v in timings.values())
+        return {
+            "students": students,
+            "teams": teams,
+            "operations": ops,
+            "seconds": elapsed,
+            "ops_per_second": ops / elapsed,
+            "bytes_written": written,
+            "bytes_on_disk": on_disk,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "latency_ms": {
+                action: {
+                    "count": len(values),
+                    "p50": pct(values, 0.50) * 1e3,
+                    "p99": pct(values, 0.99) * 1e3,
+                    "mean": sum(values) / len(values) * 1e3 if values else 0.0,
+                }
+                for action, values in timings.items()
+            },
+        }
+
+
+def _child(name, data_dir, queue):
+    queue.put(run_scenario(name, data_dir))
+
+
+def run_isolated(name, data_dir=None):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(name, data_dir, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def report(name, result, previous=None):
+    print(f"\n{name}: {result['students']} students in {result['teams']} teams, "
+          f"{result['operations']:,} operations in {result['seconds']:.1f} s "
+          f"({result['ops_per_second']:,.0f} ops/s)")
+    written = result["bytes_written"]
+    print(f"  written {written / 1e6:.1f} MB, on disk {result['bytes_on_disk'] / 1e6:.1f} MB, "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB" if written is not None else
+          f"  on disk {result['bytes_on_disk'] / 1e6:.1f} MB, peak RSS {result['peak_rss_mb']:.0f} MB")
+    print(f"  {'action':<12} {'count':>7} {'p50 ms':>9} {'p99 ms':>9}" + ("   p99 vs before" if previous else ""))
+    for action, lat in result["latency_ms"].items():
+        line = f"  {action:<12} {lat['count']:>7,} {lat['p50']:>9.3f} {lat['p99']:>9.3f}"
+        old = previous and previous["latency_ms"].get(action)
+        if old and old["p99"]:
+            line += f"   {lat['p99'] / old['p99']:>6.2f}x"
+        print(line)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated classroom load test")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--data-dir", help="where to put the scratch data directory (default: system temp)")
+    parser.add_argument("--compare", help="a previous results file to compare against")
+    parser.add_argument("--label", default="", help="tag for the results file name")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    previous = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)["scenarios"]
+
+    results = {}
+    for name in args.scenarios or SCENARIOS:
+        results[name] = run_isolated(name, args.data_dir)
+        report(name, results[name], previous.get(name))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    out = os.path.join(RESULTS_DIR, f"classroom-{stamp}{'-' + args.label if args.label else ''}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"revision": git_revision(), "created": stamp, "mix": MIX, "scenarios": results}, f, indent=2)
+    print(f"\nSaved {out}")
+
+
+if __name__ == "__main__":
+    main()
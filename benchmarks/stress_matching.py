@@ -0,0 +1,94 @@
+# Multi-process stress test for the match path: several worker processes race
+# to accept the same open offers and post new ones, then we check that every
+# offer was filled at most once and that cash and shares were conserved.
+#
+#   python benchmarks/stress_matching.py [workers] [matches per worker]
+
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import load_users, save_users, load_trades, save_trades, append_trade, match_trade
+
+STUDENTS = 40
+TICKERS = ["NVDA", "AAPL", "WHALE", "CHARIZARD"]
+START_CASH = 10000
+
+
+def worker(data_dir, seed, attempts, results):
+    users_file = os.path.join(data_dir, "users.json")
+    trades_file = os.path.join(data_dir, "trades.json")
+    rng = random.Random(seed)
+    filled = failed = 0
+    for _ in range(attempts):
+        me = f"student{rng.randrange(STUDENTS)}"
+        if rng.random() < 0.3:
+            append_trade(trades_file, {
+                "user": me,
+                "ticker": rng.choice(TICKERS),
+                "direction": rng.choice(["Buy", "Sell"]),
+                "price": float(rng.randint(1, 20)),
+                "quantity": rng.randint(1, 5),
+                "matched": False,
+            })
+            continue
+        # Aim at the few most recent offers so workers really collide
+        trades = load_trades(trades_file)
+        open_idx = [i for i in range(max(0, len(trades) - 20), len(trades)) if not trades[i]["matched"]]
+        if not open_idx:
+            continue
+        ok, _, _ = match_trade(users_file, trades_file, rng.choice(open_idx), me)
+        filled += ok
+        failed += not ok
+    results.put((filled, failed))
+
+
+def main(workers=4, attempts=1000):
+    with tempfile.TemporaryDirectory() as data_dir:
+        users_file = os.path.join(data_dir, "users.json")
+        trades_file = os.path.join(data_dir, "trades.json")
+        save_users(users_file, {
+            f"student{i}": {"cash": START_CASH, "positions": {}, "pnl": 0, "team": f"Team {i % 5}"}
+            for i in range(STUDENTS)
+        })
+        save_trades(trades_file, [])
+
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(data_dir, seed, attempts, results))
+            for seed in range(workers)
+        ]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        counts = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        filled = sum(c[0] for c in counts)
+        failed = sum(c[1] for c in counts)
+        users = load_users(users_file)
+        trades = load_trades(trades_file)
+
+        total_cash = sum(u["cash"] for u in users.values())
+        net_shares = {t: sum(u["positions"].get(t, {}).get("qty", 0) for u in users.values()) for t in TICKERS}
+        matched = sum(t["matched"] for t in trades)
+
+        print(f"{workers} workers, {filled} fills, {failed} rejected, {len(trades)} offers in {elapsed:.2f}s "
+              f"({filled / elapsed:,.0f} fills/s)")
+        assert matched == filled, f"{matched} offers marked matched but {filled} fills reported"
+        assert abs(total_cash - STUDENTS * START_CASH) < 1e-6, f"cash not conserved: {total_cash}"
+        assert all(q == 0 for q in net_shares.values()), f"shares not conserved: {net_shares}"
+        assert all(u["cash"] >= 0 for u in users.values()), "a buyer went below zero cash"
+        print("ok: every offer filled at most once, cash and shares conserved")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
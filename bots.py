@@ -0,0 +1,304 @@
+import argparse
+import heapq
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+import events
+from engine import get_engine
+from risk import RiskError
+from storage import ConflictError
+from orderbook import offers_page
+from utils import read_users, is_bot, BOT_PREFIX, BOT_TEAM
+
+# Liquidity bots: simulated traders that give a small or quiet class someone
+# to trade with. Market makers keep a Buy and a Sell quote around the simulated
+# price of every listed ticker and requote when the price moves away; noise
+# traders take offers priced near the market (students' included) and now and
+# then send a small order that crosses. Bots are ordinary players on the bots
+# team: they go through the classroom's engine, so they match, pass the risk
+# checks and are journaled exactly like students.
+#
+# A BotPool runs the bots in worker processes (or threads) split round-robin.
+# Each bot acts at its own rate, and each worker also caps its share of the
+# pool's max_rate with a token bucket. Worker processes run at a lower CPU
+# priority, and every action holds the store lock only as long as a student's
+# click does, so interactive sessions keep their latency. Process workers send
+# their live events back to the process that started the pool, which
+# publishes them to its sessions (events.relay_to), so students get toasts
+# for bot trades either way.
+#
+# Bots are named with the reserved "bot-" prefix and sit on the bots team;
+# rankings, class statistics and the class overview leave them out.
+#
+#   python bots.py data/classes/ABC123 --makers 2 --noise 6 --workers 2 --max-rate 200
+
+BOT_CASH = 100000
+BOT_NICE = 10              # worker processes yield the CPU to the app
+MAKER_RATE = 2.0           # actions per second per bot
+NOISE_RATE = 1.0
+MAX_RATE = 1000.0          # actions per second for the whole pool
+
+
+class MarketMaker:
+    def __init__(self, name, rate=MAKER_RATE, spread=0.02, size=(5, 20), max_inventory=200):
+        self.name = name
+        self.rate = rate
+        self.spread = spread
+        self.size = size
+        self.max_inventory = max_inventory
+        self.turn = 0
+
+    def act(self, engine, market, tickers, rng, stats):
+        # One ticker per turn: drop quotes that drifted from the target, post the missing sides
+        ticker = tickers[self.turn % len(tickers)]
+        self.turn += 1
+        mid = market.price(ticker)
+        pos = (read_users(engine.users_file).get(self.name) or {}).get("positions", {}).get(ticker)
+        inventory = pos["qty"] if pos else 0
+        skew = -inventory / self.max_inventory * self.spread / 2  # lean against what we hold
+        targets = {
+            "Buy": round(mid * (1 - self.spread / 2 + skew), 2),
+            "Sell": round(mid * (1 + self.spread / 2 + skew), 2),
+        }
+        quoted = set()
+        quotes, _ = offers_page(engine.trades_file, page_size=10, user=self.name, ticker=ticker)
+        for oid, quote in quotes:
+            if abs(quote["price"] - targets[quote["direction"]]) > mid * self.spread / 4 or quote["direction"] in quoted:
+                if engine.cancel(self.name, oid, expected=quote)[0]:
+                    stats["cancels"] += 1
+            else:
+                quoted.add(quote["direction"])
+        for side, price in targets.items():
+            if side in quoted or price < 1.0:
+                continue
+            if side == "Buy" and inventory >= self.max_inventory or side == "Sell" and inventory <= -self.max_inventory:
+                continue
+            _submit(engine, self.name, ticker, side, price, rng.randint(*self.size), stats)
+
+
+class NoiseTrader:
+    def __init__(self, name, rate=NOISE_RATE, band=0.03, size=(1, 10), take_share=0.7):
+        self.name = name
+        self.rate = rate
+        self.band = band
+        self.size = size
+        self.take_share = take_share
+
+    def act(self, engine, market, tickers, rng, stats):
+        ticker = rng.choice(tickers)
+        mid = market.price(ticker)
+        if rng.random() < self.take_share:
+            rows, _ = offers_page(engine.trades_file, page_size=10, ticker=ticker, exclude_user=self.name,
+                                  min_price=mid * (1 - self.band), max_price=mid * (1 + self.band))
+            if rows:
+                oid, offer = rng.choice(rows)
+                ok, _, _, qty = engine.take(self.name, oid, expected=offer)
+                stats["takes" if ok else "refused"] += 1
+                stats["filled"] += qty if ok else 0
+                return
+        side = rng.choice(["Buy", "Sell"])
+        price = round(mid * (1 + self.band if side == "Buy" else 1 - self.band), 2)
+        if price >= 1.0:
+            _submit(engine, self.name, ticker, side, price, rng.randint(*self.size), stats)
+
+
+def _submit(engine, name, ticker, side, price, quantity, stats):
+    try:
+        _, fills = engine.submit(name, ticker, side, price, quantity)
+    except RiskError:
+        stats["refused"] += 1
+        return
+    stats["orders"] += 1
+    stats["filled"] += sum(f["qty"] for f in fills)
+
+
+def make_bots(makers=2, noise=4, maker_rate=MAKER_RATE, noise_rate=NOISE_RATE):
+    return (
+        [MarketMaker(f"{BOT_PREFIX}maker-{i + 1}", rate=maker_rate) for i in range(makers)]
+        + [NoiseTrader(f"{BOT_PREFIX}noise-{i + 1}", rate=noise_rate) for i in range(noise)]
+    )
+
+
+def enroll(data_dir, bots, cash=BOT_CASH):
+    # New bots join on the bots team with enough cash to quote every ticker;
+    # returning ones keep what they have
+    named = [bot.name for bot in bots if not is_bot(bot.name)]
+    if named:
+        raise ValueError(f"bot names must start with {BOT_PREFIX!r}: {', '.join(named)}")
+    engine = get_engine(data_dir)
+    users = read_users(engine.users_file)
+    new = {bot.name: {"team": BOT_TEAM, "cash": cash} for bot in bots if bot.name not in users}
+    if new:
+        engine.apply_roster(new)
+
+
+def new_stats():
+    return {"actions": 0, "orders": 0, "takes": 0, "cancels": 0, "refused": 0, "filled": 0, "conflicts": 0}
+
+
+def run_worker(data_dir, bots, max_rate, stop, results, seed=0, threads=False, nice=0, relay=None):
+    # One worker: act for each bot when its turn comes (by its own rate, with
+    # jitter), never faster than max_rate in total. Puts its stats on `results`,
+    # also when a bug stops it. A thread shares the app's engine; a process has
+    # its own, and sends its live events over `relay` (or drops them without one).
+    if nice:
+        os.nice(nice)
+    rng = random.Random(seed)
+    engine = get_engine(data_dir)
+    if not threads:
+        if relay is not None:
+            events.relay_to(relay, scope=engine.data_dir)
+        else:
+            engine.publish = False
+    stats = new_stats()
+    start = now = time.monotonic()
+    turns = [(now + rng.random() / bot.rate, i) for i, bot in enumerate(bots)]
+    heapq.heapify(turns)
+    tokens, last = 1.0, now
+    try:
+        while turns and not stop.is_set():
+            due, i = turns[0]
+            now = time.monotonic()
+            tokens = min(max(max_rate, 1.0), tokens + (now - last) * max_rate)
+            last = now
+            wait = max(due - now, (1.0 - tokens) / max_rate if tokens < 1.0 else 0.0)
+            if wait > 0:
+                stop.wait(min(wait, 0.1))
+                continue
+            tokens -= 1.0
+            bot = bots[i]
+            market = engine.market()
+            tickers = sorted(market.snapshot())
+            if tickers:
+                try:
+                    bot.act(engine, market, tickers, rng, stats)
+                except ConflictError:
+                    stats["conflicts"] += 1  # lost every retry to busy students; try again next turn
+            stats["actions"] += 1
+            heapq.heapreplace(turns, (max(due, now - 1.0) + rng.expovariate(bot.rate), i))
+    finally:
+        stats["seconds"] = time.monotonic() - start
+        if not threads:
+            engine.close_journal()
+        results.put(stats)
+
+
+class BotPool:
+    def __init__(self, data_dir, bots, workers=2, max_rate=MAX_RATE, threads=False, nice=BOT_NICE, seed=0):
+        self.data_dir = data_dir
+        self.bots = bots
+        self.workers = max(1, min(workers, len(bots)))
+        self.max_rate = max_rate
+        self.threads = threads
+        self.nice = 0 if threads else nice
+        self.seed = seed
+        self._running = []
+        self._stop = None
+        self._results = None
+        self._relay = None
+        self._relay_done = None
+
+    def start(self):
+        enroll(self.data_dir, self.bots)
+        if self.threads:
+            self._stop, self._results, spawn = threading.Event(), queue.Queue(), threading.Thread
+        else:
+            # spawn, not fork: the app process has threads (and locks) of its own
+            ctx = multiprocessing.get_context("spawn")
+            self._stop, self._results, spawn = ctx.Event(), ctx.Queue(), ctx.Process
+            self._relay, self._relay_done = ctx.Queue(), threading.Event()
+            threading.Thread(target=events.republish, args=(self._relay, self._relay_done), daemon=True).start()
+        for w in range(self.workers):
+            args = (self.data_dir, self.bots[w::self.workers], self.max_rate / self.workers, self._stop,
+                    self._results, self.seed + w, self.threads, self.nice, self._relay)
+            worker = spawn(target=run_worker, args=args, daemon=True)
+            worker.start()
+            self._running.append(worker)
+        return self
+
+    def running(self):
+        return any(worker.is_alive() for worker in self._running)
+
+    def stop(self, timeout=10.0):
+        # Stops the workers and returns their stats summed up
+        if not self._running:
+            return None
+        self._stop.set()
+        total = new_stats()
+        total["seconds"] = 0.0
+        for _ in self._running:
+            try:
+                stats = self._results.get(timeout=timeout)
+            except queue.Empty:
+                break
+            for key, value in stats.items():
+                total[key] = max(total[key], value) if key == "seconds" else total[key] + value
+        for worker in self._running:
+            worker.join(timeout)
+        if self._relay_done is not None:
+            self._relay_done.set()
+        self._running = []
+        return total
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def start_bots(data_dir, makers=2, noise=4, workers=2, max_rate=MAX_RATE, threads=False):
+    # One pool per classroom per process; starting again replaces it
+    with _pools_lock:
+        old = _pools.pop(os.path.abspath(data_dir), None)
+        if old is not None:
+            old.stop()
+        pool = _pools[os.path.abspath(data_dir)] = BotPool(
+            data_dir, make_bots(makers, noise), workers=workers, max_rate=max_rate, threads=threads).start()
+        return pool
+
+
+def stop_bots(data_dir):
+    with _pools_lock:
+        pool = _pools.pop(os.path.abspath(data_dir), None)
+    return pool.stop() if pool is not None else None
+
+
+def bots_running(data_dir):
+    pool = _pools.get(os.path.abspath(data_dir))
+    return pool is not None and pool.running()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run liquidity bots against a classroom until interrupted")
+    parser.add_argument("data_dir", help="the classroom's data directory, e.g. data/classes/ABC123")
+    parser.add_argument("--makers", type=int, default=2, help="market makers (default 2)")
+    parser.add_argument("--noise", type=int, default=4, help="noise traders (default 4)")
+    parser.add_argument("--maker-rate", type=float, default=MAKER_RATE, help="actions/s per market maker")
+    parser.add_argument("--noise-rate", type=float, default=NOISE_RATE, help="actions/s per noise trader")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes (default 2)")
+    parser.add_argument("--max-rate", type=float, default=MAX_RATE, help="actions/s for all bots together")
+    parser.add_argument("--threads", action="store_true", help="run the workers as threads of this process")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_dir):
+        parser.error(f"{args.data_dir} is not a classroom data directory")
+    bots = make_bots(args.makers, args.noise, args.maker_rate, args.noise_rate)
+    pool = BotPool(args.data_dir, bots, workers=args.workers, max_rate=args.max_rate, threads=args.threads).start()
+    print(f"{len(bots)} bots in {pool.workers} {'threads' if args.threads else 'processes'}; Ctrl-C to stop",
+          file=sys.stderr)
+    try:
+        while pool.running():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    stats = pool.stop()
+    print(", ".join(f"{key} {value:,.0f}" for key, value in stats.items()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
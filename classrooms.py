@@ -0,0 +1,73 @@
+import hashlib
+import os
+import random
+import re
+
+from prices import start_game
+
+# Classrooms (game namespaces). Each classroom is its own data directory, so it
+# gets its own log, lock, order books, leaderboard, prices and archive; nothing
+# is shared between two classes but the code. Students pick a classroom with a
+# join code at login. No code means the demo class in data/ itself.
+#
+# For many classes at once, run several app processes (shards) and put
+# router.py in front: every join code hashes to one shard, so all sessions of a
+# class land on the same process and a busy class only loads its own shard.
+
+DATA_ROOT = "data"
+CLASSES_DIR = "classes"
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # no 0/O, 1/I
+CODE_LENGTH = 6
+CODE_PATTERN = re.compile(r"^[A-Z0-9]{4,12}$")
+
+
+class Classroom:
+    def __init__(self, code=None, root=DATA_ROOT):
+        self.code = normalize_code(code) if code else None
+        self.data_dir = os.path.join(root, CLASSES_DIR, self.code) if self.code else root
+        self.users_file = os.path.join(self.data_dir, "users.json")
+        self.trades_file = os.path.join(self.data_dir, "trades.json")
+        self.closed_trades_file = os.path.join(self.data_dir, "closed_trades.json")
+        self.market_file = os.path.join(self.data_dir, "market.json")
+
+    @property
+    def name(self):
+        return self.code or "Demo class"
+
+    def exists(self):
+        return self.code is None or os.path.isdir(self.data_dir)
+
+
+def normalize_code(code):
+    code = (code or "").strip().upper()
+    if not CODE_PATTERN.match(code):
+        raise ValueError("Class codes are 4-12 letters and digits.")
+    return code
+
+
+def create_classroom(root=DATA_ROOT, code=None, seed=None):
+    # A new, empty classroom with its own market; returns it
+    if code is None:
+        rng = random.SystemRandom()
+        while True:
+            code = "".join(rng.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+            if not Classroom(code, root).exists():
+                break
+    room = Classroom(code, root)
+    os.makedirs(room.data_dir, exist_ok=True)
+    start_game(room.market_file, seed=seed, only_if_missing=True)
+    return room
+
+
+def shard_for(code, shards):
+    # Rendezvous hashing: adding or removing a shard only moves the classes
+    # that were (or will be) on it
+    def weight(shard):
+        return hashlib.blake2b(f"{code or ''}|{shard}".encode("utf-8"), digest_size=8).digest()
+    return max(shards, key=weight)
+
+
+def configured_shards():
+    # MONEYHUB_SHARDS="http://host:8501,http://host:8502" and MONEYHUB_SHARD=<this one's URL>
+    shards = [s.strip() for s in os.environ.get("MONEYHUB_SHARDS", "").split(",") if s.strip()]
+    return shards, os.environ.get("MONEYHUB_SHARD", "").strip() or None
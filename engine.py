@@ -0,0 +1,318 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import events
+from storage import get_store, collection_name, copy_value
+from utils import read_users, save_users, save_trades, save_closed_trades, create_user, match_trade, close_position, remaining, is_bot
+from orderbook import submit_order, cancel_offer
+from prices import get_price_engine, current_market, list_tickers, start_game, GAME_KEY
+from archive import archive_history, archive_due, maybe_archive, reset_archive
+from admin import apply_roster
+from timeline import Timeline
+import risk
+from risk import RiskError
+
+# The trading core with no UI: every action that changes a classroom (join,
+# post, take or cancel an offer, close a position, roster edits, risk limits,
+# archiving, reset) in one place, for app.py, the load harness and replay.py
+# alike.
+#
+# Trading actions are the storage transactions (utils.py, orderbook.py): they
+# do their work on copies without the lock and retry on a conflict. The
+# engine only adds to their commit, which Store.write runs under the store
+# lock: the pre-trade risk checks (risk.py) just before the record is
+# appended, and the journal and timeline lines just after. So a check sees
+# exactly the state the trade commits on, and two students trading at once
+# only wait for each other's append. The rare admin actions made of several
+# writes (risk limits, archiving, reset) still hold the lock throughout.
+#
+# Each action that changed something is also written to the classroom's
+# journal (journal.jsonl), one JSON line per action with its wall-clock time.
+# Being written inside the commit, the journal is in commit order even with
+# several processes. It is a log of intent, not
+# of state: replay.py feeds it back through an engine on a clock that follows
+# the recorded times, which reproduces the same prices, offer numbers and
+# fills. The store's own log stays the durable record; the journal is only
+# flushed, not fsynced.
+#
+# Actions that change students' accounts (joins, fills, closes, roster edits,
+# resets) also go to the timeline (timeline.py) with the records they left
+# behind, stamped with the same time as their journal line, so any past
+# moment of the class can be looked at without replaying the session.
+
+JOURNAL_NAME = "journal.jsonl"
+OFFER_FIELDS = ("user", "ticker", "direction", "price", "quantity")
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+class Engine:
+    def __init__(self, data_dir, journal=True, clock=time.time, publish=True, checks=True, timeline=True):
+        self.data_dir = data_dir
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.trades_file = os.path.join(data_dir, "trades.json")
+        self.closed_trades_file = os.path.join(data_dir, "closed_trades.json")
+        self.market_file = os.path.join(data_dir, "market.json")
+        self.clock = clock
+        self.publish = publish
+        self.checks = checks
+        self.store = get_store(self.users_file)
+        self.store.collection(self.users_file, {})
+        self.store.collection(self.trades_file, [])
+        self.store.collection(self.closed_trades_file, [])
+        get_price_engine(self.market_file).clock = clock
+        self.journal_path = os.path.join(data_dir, JOURNAL_NAME) if journal else None
+        self._journal = None
+        if self.journal_path is not None and not os.path.exists(self.journal_path):
+            with self.store.lock():
+                self._record("game", game=self.game())
+        self.timeline = Timeline(data_dir) if timeline else None
+        if self.timeline is not None and not self.timeline.exists():
+            with self.store.lock():
+                self._history(self.clock(), "start")
+
+    def game(self):
+        market = self.store.collections.get(collection_name(self.market_file)) or {}
+        return copy_value(market.get(GAME_KEY))
+
+    def _record(self, op, **fields):
+        # Journal one action; returns its time for the timeline
+        t = self.clock()
+        if self.journal_path is None:
+            return t
+        if self._journal is None:
+            self._journal = open(self.journal_path, "ab")
+        line = json.dumps({"t": t, "op": op, **fields}, separators=(",", ":")) + "\n"
+        self._journal.write(line.encode("utf-8"))
+        self._journal.flush()
+        return t
+
+    def _history(self, t, kind, names=(), **fields):
+        if self.timeline is not None:
+            self.timeline.record(self.store, self.users_file, self.market_file, t, kind, names, **fields)
+
+    def _now(self):
+        return datetime.fromtimestamp(self.clock()).strftime("%Y-%m-%d %H:%M:%S")
+
+    def join(self, name, team):
+        # The student's record, created with the starting cash on first login.
+        # Bot names are reserved: bots are enrolled through the roster (bots.py).
+        if is_bot(name):
+            raise ValueError(f"{name!r} is reserved for a liquidity bot")
+        record = read_users(self.users_file).get(name)
+        if record is None:
+            def commit(record):
+                self._history(self._record("join", user=name, team=team), "join", [name])
+            record = create_user(self.users_file, name, team, after=commit)
+        return record
+
+    def submit(self, name, ticker, direction, price, quantity):
+        # Post an offer; returns (offer as stored, fills) like submit_order.
+        # Raises RiskError, and posts nothing, if the risk checks refuse it.
+        trade = {
+            "user": name,
+            "ticker": ticker.upper(),
+            "direction": direction,
+            "price": price,
+            "quantity": quantity,
+            "matched": False,
+        }
+
+        def check(result):
+            if self.checks:
+                problem = risk.check_order(self.users_file, self.trades_file, name, trade["ticker"], direction, price, quantity)
+                if problem:
+                    raise RiskError(problem)
+
+        def commit(result):
+            # A new ticker is listed in the same commit, so replay lists it at the same moment
+            posted, fills = result
+            list_tickers(self.market_file, {posted["ticker"]: price})
+            t = self._record("submit", user=name, ticker=posted["ticker"], direction=direction, price=price, quantity=quantity)
+            if fills:
+                names = {name} | {f["buyer"] for f in fills} | {f["seller"] for f in fills}
+                self._history(t, "fill", sorted(names), fills=[
+                    {k: f[k] for k in ("ticker", "buyer", "seller", "qty", "price")} for f in fills
+                ])
+        trade, fills = submit_order(self.users_file, self.trades_file, trade, check=check, after=commit)
+        if self.publish:
+            events.order_placed(trade, fills, scope=self.data_dir)
+        return trade, fills
+
+    def take(self, name, offer_id, expected=None):
+        # Accept what is left of an open offer: (ok, message, offer, shares)
+        offer, qty = None, 0
+
+        def check(result):
+            # The offer as the transaction read it: it commits only if nothing changed since
+            nonlocal offer, qty
+            offer = self.store.collections[collection_name(self.trades_file)][offer_id]
+            qty = remaining(offer)
+            if self.checks:
+                side = "Sell" if offer["direction"] == "Buy" else "Buy"
+                problem = risk.check_order(self.users_file, self.trades_file, name, offer["ticker"], side, offer["price"], qty)
+                if problem:
+                    raise RiskError(problem)
+
+        def commit(result):
+            t = self._record("take", user=name, offer=offer_id, expected={k: offer[k] for k in OFFER_FIELDS})
+            buyer, seller = (offer["user"], name) if offer["direction"] == "Buy" else (name, offer["user"])
+            self._history(t, "fill", [buyer, seller], fills=[
+                {"ticker": offer["ticker"], "buyer": buyer, "seller": seller, "qty": qty, "price": offer["price"]}
+            ])
+        try:
+            ok, message, matched = match_trade(self.users_file, self.trades_file, offer_id, name, expected=expected,
+                                               check=check, after=commit)
+        except RiskError as e:
+            return False, str(e), offer, 0
+        if ok and self.publish:
+            events.offer_taken(offer_id, matched, name, qty, scope=self.data_dir)
+        return ok, message, matched, qty
+
+    def cancel(self, name, offer_id, expected=None):
+        # Withdraw what is left of one of name's open offers; frees what it reserved
+        def commit(result):
+            self._record("cancel", user=name, offer=offer_id, expected={k: result[2][k] for k in OFFER_FIELDS})
+        ok, message, cancelled = cancel_offer(self.trades_file, offer_id, name, expected=expected, after=commit)
+        if ok and self.publish:
+            events.offer_cancelled(offer_id, cancelled, scope=self.data_dir)
+        return ok, message, cancelled
+
+    def close(self, name, ticker, price=None, timestamp=None):
+        # Close a position at the market price (or the given one); the closed
+        # trade, or None if there was nothing to close
+        if price is None:
+            pos = (read_users(self.users_file).get(name) or {}).get("positions", {}).get(ticker)
+            if not pos or not pos["qty"]:
+                return None
+            price = current_market(self.market_file).price(ticker, pos["entry_price"])
+        timestamp = timestamp or self._now()
+
+        def commit(closed):
+            t = self._record("close", user=name, ticker=ticker, price=price, timestamp=timestamp)
+            self._history(t, "close", [name], closed={k: closed[k] for k in ("ticker", "qty", "exit_price", "pnl")})
+        closed = close_position(self.users_file, self.closed_trades_file, name, ticker, price, timestamp, after=commit)
+        if closed and self.publish:
+            events.position_closed(closed, scope=self.data_dir)
+        return closed
+
+    def market(self, positions=None):
+        # The shared market, with any held tickers listed first
+        if positions:
+            list_tickers(self.market_file, {t: p["entry_price"] for t, p in positions.items() if p["qty"]})
+        return current_market(self.market_file)
+
+    def apply_roster(self, changes, create=True):
+        def commit(counts):
+            self._history(self._record("roster", changes=changes, create=create), "roster", list(changes))
+        return apply_roster(self.users_file, changes, create=create, after=commit)
+
+    def set_limits(self, **limits):
+        with self.store.lock():
+            current = risk.set_limits(self.users_file, **limits)
+            self._record("limits", limits=limits)
+            return current
+
+    def maintain(self):
+        # What every rerun does first: archive finished history once enough piled up.
+        # Only an archive run takes the lock.
+        if not archive_due(self.trades_file, self.closed_trades_file):
+            return 0, 0
+        with self.store.lock():
+            moved = maybe_archive(self.trades_file, self.closed_trades_file)
+            if any(moved):
+                self._record("archive")
+            return moved
+
+    def reset(self, seed=None, game=None):
+        # Empty the classroom and start a new game (or the given one)
+        with self.store.lock():
+            save_users(self.users_file, {})
+            save_trades(self.trades_file, [])
+            save_closed_trades([], self.closed_trades_file)
+            reset_archive(self.trades_file)
+            if game is None:
+                start_game(self.market_file, seed=seed)
+            else:
+                self._set_game(game)
+            self._history(self._record("reset", game=self.game()), "reset")
+
+    def _set_game(self, game):
+        self.store.write([[collection_name(self.market_file), "replace", {GAME_KEY: game}]])
+
+    def apply(self, entry):
+        # Re-run one journal entry; the engine's clock should read entry["t"].
+        # Returns False for an entry that no longer applies (e.g. an offer
+        # that is gone under changed rules).
+        op = entry["op"]
+        if op == "game":
+            with self.store.lock():
+                self._set_game(entry["game"])
+                self._history(self._record("game", game=self.game()), "reset")
+        elif op == "join":
+            self.join(entry["user"], entry["team"])
+        elif op == "submit":
+            try:
+                self.submit(entry["user"], entry["ticker"], entry["direction"], entry["price"], entry["quantity"])
+            except RiskError:
+                return False
+        elif op == "take":
+            return self.take(entry["user"], entry["offer"], expected=entry["expected"])[0]
+        elif op == "cancel":
+            return self.cancel(entry["user"], entry["offer"], expected=entry["expected"])[0]
+        elif op == "limits":
+            self.set_limits(**entry["limits"])
+        elif op == "close":
+            return self.close(entry["user"], entry["ticker"], entry["price"], entry["timestamp"]) is not None
+        elif op == "roster":
+            self.apply_roster(entry["changes"], entry["create"])
+        elif op == "archive":
+            with self.store.lock():
+                archive_history(self.trades_file, self.closed_trades_file)
+                self._record("archive")
+        elif op == "reset":
+            self.reset(game=entry["game"])
+        else:
+            raise ValueError(f"unknown journal entry {op!r}")
+        return True
+
+    def close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self.timeline is not None:
+            self.timeline.close()
+
+
+def get_engine(data_dir):
+    # One engine (and journal handle) per classroom per process
+    key = os.path.abspath(data_dir)
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = Engine(data_dir)
+    return engine
+
+
+def read_journal(path):
+    # Journal entries in order; a torn last line (crash mid-append) is dropped
+    entries = []
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+    return entries
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_engines.clear)
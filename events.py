@@ -0,0 +1,212 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+from utils import remaining
+
+# In-process pub/sub for live updates between sessions.
+#
+# Every Streamlit session subscribes once with its user name and gets its own
+# queue. Publishing hands an event to the subscribers of its topic only: a
+# student's own topic for fills against their offers, OFFERS for new resting
+# offers, MARKET for anything that moves the leaderboard. Sessions drain their
+# queue instead of re-reading everything to find out what changed. Each
+# classroom (scope) has its own bus, so names and topics never cross classes.
+#
+# A worker process (bots.py) has no sessions of its own: relay_to() swaps its
+# buses for a queue, and the process that started it republishes from there.
+
+OFFERS = "offers"
+MARKET = "market"
+QUEUE_SIZE = 100        # per session; the oldest events are dropped past this
+SESSION_TIMEOUT = 600   # seconds without a drain before a session is dropped
+
+
+def user_topic(name):
+    return f"user:{name}"
+
+
+class Subscription:
+    def __init__(self, bus, user, topics):
+        self.bus = bus
+        self.user = user
+        self.topics = frozenset(topics)
+        self.events = deque(maxlen=QUEUE_SIZE)
+        self.cond = threading.Condition(threading.Lock())
+        self.last_seen = time.monotonic()
+
+    def push(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify()
+
+    def drain(self):
+        with self.cond:
+            self.last_seen = time.monotonic()
+            out = list(self.events)
+            self.events.clear()
+            return out
+
+    def wait(self, timeout=None):
+        # Block until there is at least one event (or timeout), then drain
+        with self.cond:
+            if not self.events:
+                self.cond.wait(timeout)
+        return self.drain()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}  # topic -> set of subscriptions
+        self.seq = itertools.count(1)
+
+    def subscribe(self, user, topics):
+        sub = Subscription(self, user, topics)
+        with self.lock:
+            self._expire()
+            for topic in sub.topics:
+                self.subscribers.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            for topic in sub.topics:
+                subs = self.subscribers.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self.subscribers[topic]
+
+    def _expire(self):
+        # Sessions that closed their tab never unsubscribe; forget them lazily
+        cutoff = time.monotonic() - SESSION_TIMEOUT
+        for topic, subs in list(self.subscribers.items()):
+            subs.difference_update([s for s in subs if s.last_seen < cutoff])
+            if not subs:
+                del self.subscribers[topic]
+
+    def publish(self, topic, kind, message, actor=None, **data):
+        # The actor (whoever caused the event) is not told about it
+        event = dict(data, seq=next(self.seq), topic=topic, kind=kind, message=message,
+                     actor=actor, time=time.time())
+        with self.lock:
+            subs = list(self.subscribers.get(topic, ()))
+        for sub in subs:
+            if sub.user != actor:
+                sub.push(event)
+        return event
+
+    def __len__(self):
+        with self.lock:
+            return len(set().union(*self.subscribers.values())) if self.subscribers else 0
+
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def get_bus(scope=None):
+    bus = _buses.get(scope)
+    if bus is None:
+        with _buses_lock:
+            bus = _buses.get(scope)
+            if bus is None:
+                bus = _buses[scope] = EventBus()
+    return bus
+
+
+class Relay:
+    # Stands in for a bus in a worker process: events go onto a queue for the parent
+    def __init__(self, queue, scope):
+        self.queue = queue
+        self.scope = scope
+
+    def publish(self, topic, kind, message, actor=None, **data):
+        self.queue.put((self.scope, topic, kind, message, actor, data))
+
+
+def relay_to(queue, scope=None):
+    with _buses_lock:
+        _buses[scope] = Relay(queue, scope)
+
+
+def republish(queue, done, timeout=0.2):
+    # Parent side of relay_to(): publish what workers sent until done is set
+    # and the queue is empty
+    while True:
+        try:
+            scope, topic, kind, message, actor, data = queue.get(timeout=timeout)
+        except Empty:
+            if done.is_set():
+                return
+            continue
+        get_bus(scope).publish(topic, kind, message, actor=actor, **data)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_buses.clear)
+
+
+def subscribe(user, scope=None):
+    return get_bus(scope).subscribe(user, (user_topic(user), OFFERS, MARKET))
+
+
+def _verb(side):
+    return "bought" if side == "Buy" else "sold"
+
+
+def order_placed(incoming, fills, scope=None):
+    # After submit_order: tell each resting owner about their fill, and everyone
+    # else about what is left of the offer
+    bus = get_bus(scope)
+    user, ticker = incoming["user"], incoming["ticker"]
+    for fill in fills:
+        owner = fill["seller"] if incoming["direction"] == "Buy" else fill["buyer"]
+        bus.publish(
+            user_topic(owner), "fill",
+            f"💸 {user} {_verb(incoming['direction'])} {fill['qty']} {ticker} from your offer at ${fill['price']:.2f}",
+            actor=user, ticker=ticker, qty=fill["qty"], price=fill["price"], offer=fill["offer"],
+        )
+    if fills:
+        bus.publish(MARKET, "fill", f"{ticker} traded", actor=user, ticker=ticker)
+    left = remaining(incoming)
+    if left > 0:
+        bus.publish(
+            OFFERS, "offer",
+            f"📢 New {ticker} {incoming['direction']} offer: {left} at ${incoming['price']:.2f} from {user}",
+            actor=user, ticker=ticker, qty=left, price=incoming["price"],
+        )
+
+
+def offer_taken(offer_id, offer, taker, qty, scope=None):
+    # After match_trade: the taker traded qty against someone's resting offer
+    bus = get_bus(scope)
+    side = "Sell" if offer["direction"] == "Buy" else "Buy"
+    bus.publish(
+        user_topic(offer["user"]), "fill",
+        f"💸 {taker} {_verb(side)} {qty} {offer['ticker']} from your offer at ${offer['price']:.2f}",
+        actor=taker, ticker=offer["ticker"], qty=qty, price=offer["price"], offer=offer_id,
+    )
+    bus.publish(MARKET, "fill", f"{offer['ticker']} traded", actor=taker, ticker=offer["ticker"])
+
+
+def offer_cancelled(offer_id, offer, scope=None):
+    # After cancel_offer: the offer's unfilled shares left the book
+    get_bus(scope).publish(
+        OFFERS, "offer", f"{offer['user']} withdrew a {offer['ticker']} {offer['direction']} offer",
+        actor=offer["user"], ticker=offer["ticker"], qty=offer["quantity"] - offer.get("filled", 0), price=offer["price"], offer=offer_id,
+    )
+
+
+def position_closed(closed, scope=None):
+    get_bus(scope).publish(
+        MARKET, "close", f"{closed['user']} closed {closed['ticker']}",
+        actor=closed["user"], ticker=closed["ticker"], pnl=closed["pnl"],
+    )
@@ -0,0 +1,112 @@
+import numpy as np
+
+from storage import get_store, collection_name
+from archive import get_archive
+from metrics import timed, count
+
+# Per-student index over closed_trades.json for the "Closed Trades History"
+# table: closed-trade indexes by user and by (user, ticker), in the order they
+# were closed, so a page is a slice instead of a filter over everyone's history.
+# Older history lives in the archive (archive.py) and is paged from there.
+
+COLUMNS = ("Ticker", "Qty", "Side", "Entry", "Exit", "PnL", "Time")
+
+
+class ClosedTradeIndex:
+    def __init__(self, closed_trades):
+        self.load(closed_trades)
+
+    def load(self, closed_trades):
+        self.by_user = {}
+        self.by_user_ticker = {}
+        self.user_tickers = {}
+        self.size = 0
+        for i, trade in enumerate(closed_trades):
+            self.add(i, trade)
+
+    def add(self, i, trade):
+        if i < self.size or trade is None:
+            return
+        self.size = i + 1
+        self.by_user.setdefault(trade["user"], []).append(i)
+        self.by_user_ticker.setdefault((trade["user"], trade["ticker"]), []).append(i)
+        self.user_tickers.setdefault(trade["user"], set()).add(trade["ticker"])
+
+    def lookup(self, user, ticker=None):
+        if ticker:
+            return self.by_user_ticker.get((user, ticker), [])
+        return self.by_user.get(user, [])
+
+    def tickers(self, user):
+        return sorted(self.user_tickers.get(user, ()))
+
+
+def get_history(closed_trades_file):
+    store = get_store(closed_trades_file)
+    name = collection_name(closed_trades_file)
+    store.collection(closed_trades_file, [])
+
+    def build(store):
+        index = ClosedTradeIndex(store.collections[name])
+
+        def on_op(op):
+            if op is None or (op[0] == name and op[1] == "replace"):
+                index.load(store.collections.get(name) or [])
+            elif op[0] == name and op[1] == "put":
+                if op[2] < index.size:
+                    index.load(store.collections[name])
+                else:
+                    index.add(op[2], store.collections[name][op[2]])
+        store.listeners.append(on_op)
+        return index
+    return store.index(("history", name), build)
+
+
+def closed_tickers(closed_trades_file, user):
+    store = get_store(closed_trades_file)
+    index = get_history(closed_trades_file)
+    archive = get_archive(closed_trades_file)
+    store.refresh()
+    with store.lock():
+        tickers = set(index.tickers(user))
+        uid = archive.ids.get(user)
+        if uid is not None:
+            table = archive.tables["closed_trades"]
+            for tid in np.unique(table.column("ticker")[table.user_rows(uid)]):
+                tickers.add(archive.strings[tid])
+        return sorted(tickers)
+
+
+@timed("history.closed_trades_page")
+def closed_trades_page(closed_trades_file, user, ticker=None, page=0, page_size=20):
+    # Newest first: the hot closed trades, then the archived ones. Returns
+    # (columns, total): the table for one page, built from just that page's rows.
+    store = get_store(closed_trades_file)
+    index = get_history(closed_trades_file)
+    archive = get_archive(closed_trades_file)
+    store.refresh()
+    with store.lock():
+        hot = index.lookup(user, ticker)
+        uid, tid = archive.ids.get(user), archive.ids.get(ticker) if ticker else None
+        if uid is None or (ticker and tid is None):
+            cold = np.zeros(0, dtype=np.int64)
+        else:
+            cold = archive.tables["closed_trades"].user_rows(uid, tid)
+        total = len(hot) + len(cold)
+        count("history_records_scanned_total", total)
+        start, stop = page * page_size, min((page + 1) * page_size, total)
+        trades = store.collections[collection_name(closed_trades_file)]
+        chosen = [trades[hot[len(hot) - 1 - i]] for i in range(start, min(stop, len(hot)))]
+        first, last = max(start - len(hot), 0), stop - len(hot)
+        if last > first:
+            chosen += archive.closed_trades(cold[len(cold) - last:len(cold) - first][::-1])
+        columns = {c: [] for c in COLUMNS}
+        for t in chosen:
+            columns["Ticker"].append(t["ticker"])
+            columns["Qty"].append(t["qty"])
+            columns["Side"].append(t.get("direction", "Long"))
+            columns["Entry"].append(f"${t['entry_price']}")
+            columns["Exit"].append(f"${t['exit_price']}")
+            columns["PnL"].append(f"${t['pnl']:+.2f}")
+            columns["Time"].append(t["timestamp"])
+        return columns, total
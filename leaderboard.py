@@ -0,0 +1,189 @@
+from bisect import bisect_left, insort
+
+from storage import get_store, collection_name
+from prices import get_price_engine, current_market
+from ledger import get_ledger
+from metrics import timed, count
+from utils import is_bot
+
+REPRICE_BULK = 3  # more tickers than this moved: reprice everyone in one pass
+
+# Net worth per student and per team, kept up to date as positions and prices
+# change instead of being recomputed for every page view. Prices come from the
+# shared market simulator (prices.py).
+#
+# Students are ranked in a sorted list of (-net_worth, name): top-N is a slice,
+# a student's rank is one bisect. Holders of each ticker are indexed, so a price
+# tick only touches the students who actually hold that ticker. Liquidity bots
+# are not ranked.
+
+
+def _team(record):
+    return record.get("team") or "No Team"
+
+
+class Leaderboard:
+    def __init__(self, users, prices=None):
+        self.load(users, prices)
+
+    def load(self, users, prices=None):
+        self.prices = dict(prices or {})
+        self.cash = {}
+        self.holdings = {}
+        self.holders = {}
+        self.worth = {}
+        self.team_of = {}
+        self.team_worth = {}
+        self.team_size = {}
+        self.ranked = []
+        self.team_ranked = []
+        for name, record in users.items():
+            self.update_user(name, record)
+
+    def mark(self, ticker, entry_price):
+        # Tickers nobody has traded or priced yet are marked at entry
+        if ticker not in self.prices:
+            self.prices[ticker] = entry_price
+        return self.prices[ticker]
+
+    def _net_worth(self, name):
+        return self.cash[name] + sum(qty * self.prices[t] for t, qty in self.holdings[name].items())
+
+    def _set_worth(self, name, worth):
+        old = self.worth.get(name)
+        if old is not None:
+            del self.ranked[bisect_left(self.ranked, (-old, name))]
+        self.worth[name] = worth
+        insort(self.ranked, (-worth, name))
+        self._add_team(self.team_of[name], worth - (old or 0))
+
+    def _add_team(self, team, delta):
+        old = self.team_worth.get(team)
+        if old is not None:
+            del self.team_ranked[bisect_left(self.team_ranked, (-old, team))]
+        if self.team_size.get(team, 0) == 0:
+            self.team_worth.pop(team, None)
+            self.team_size.pop(team, None)
+            return
+        new = (old or 0) + delta
+        self.team_worth[team] = new
+        insort(self.team_ranked, (-new, team))
+
+    def update_user(self, name, record):
+        if record is None or is_bot(name):
+            return self.remove_user(name)
+        team = _team(record)
+        if self.team_of.get(name) != team:
+            self.remove_user(name)
+            self.team_of[name] = team
+            self.team_size[team] = self.team_size.get(team, 0) + 1
+        for ticker in self.holdings.get(name, {}):
+            self.holders[ticker].pop(name, None)
+        holdings = {}
+        for ticker, pos in record.get("positions", {}).items():
+            if pos["qty"]:
+                self.mark(ticker, pos["entry_price"])
+                holdings[ticker] = pos["qty"]
+                self.holders.setdefault(ticker, {})[name] = pos["qty"]
+        self.holdings[name] = holdings
+        self.cash[name] = record["cash"]
+        self._set_worth(name, self._net_worth(name))
+
+    def remove_user(self, name):
+        if name not in self.worth:
+            return
+        worth = self.worth.pop(name)
+        del self.ranked[bisect_left(self.ranked, (-worth, name))]
+        team = self.team_of.pop(name)
+        self.team_size[team] -= 1
+        self._add_team(team, -worth)
+        for ticker in self.holdings.pop(name):
+            self.holders[ticker].pop(name, None)
+        del self.cash[name]
+
+    def set_price(self, ticker, price):
+        if self.prices.get(ticker) == price:
+            return
+        self.prices[ticker] = price
+        for name in self.holders.get(ticker, {}):
+            self._set_worth(name, self._net_worth(name))
+
+    def reprice(self, prices, worth):
+        # Bulk path for a clock tick that moves many tickers: take everyone's net
+        # worth from one vectorized pass (ledger.py) and re-sort once
+        self.prices.update(prices)
+        self.worth = {name: worth[name] for name in self.team_of}
+        self.ranked = sorted((-w, name) for name, w in self.worth.items())
+        self.team_worth = {}
+        for name, w in self.worth.items():
+            team = self.team_of[name]
+            self.team_worth[team] = self.team_worth.get(team, 0) + w
+        self.team_ranked = sorted((-w, team) for team, w in self.team_worth.items())
+
+    def top(self, n=10):
+        return [(name, -neg) for neg, name in self.ranked[:n]]
+
+    def rank(self, name):
+        if name not in self.worth:
+            return None
+        return bisect_left(self.ranked, (-self.worth[name], name)) + 1
+
+    def top_teams(self, n=10):
+        return [(team, -neg, self.team_size[team]) for neg, team in self.team_ranked[:n]]
+
+    def team_rank(self, team):
+        if team not in self.team_worth:
+            return None
+        return bisect_left(self.team_ranked, (-self.team_worth[team], team)) + 1
+
+    def __len__(self):
+        return len(self.ranked)
+
+
+def get_leaderboard(users_file, market_file):
+    store = get_store(users_file)
+    users_name = collection_name(users_file)
+    store.collection(users_file, {})
+    engine = get_price_engine(market_file)
+
+    def build(store):
+        board = Leaderboard(store.collections.get(users_name) or {}, engine.snapshot())
+
+        def on_op(op):
+            if op is None or (op[0] == users_name and op[1] == "replace"):
+                board.load(store.collections.get(users_name) or {}, engine.snapshot())
+            elif op[0] == users_name and op[1] == "put":
+                board.update_user(op[2], store.collections[users_name][op[2]])
+            elif op[0] == users_name and op[1] == "delete":
+                board.remove_user(op[2])
+        store.listeners.append(on_op)
+        return board
+    return store.index(("leaderboard", users_name), build)
+
+
+@timed("leaderboard.standings")
+def standings(users_file, market_file, n=50, name=None, team=None):
+    # One consistent read of the board for a page view, marked at the shared prices
+    store = get_store(users_file)
+    board = get_leaderboard(users_file, market_file)
+    engine = current_market(market_file)
+    with store.lock():
+        changed = {t: p for t, p in engine.snapshot().items() if board.prices.get(t) != p}
+        if len(changed) > REPRICE_BULK:
+            prices = dict(board.prices, **changed)
+            ledger = get_ledger(users_file)
+            worth = ledger.net_worth(prices)
+            count("leaderboard_records_scanned_total", len(ledger.user_ids))
+            board.reprice(changed, {name: float(worth[uid]) for name, uid in ledger.user_ids.items()})
+        else:
+            for ticker, price in changed.items():
+                board.set_price(ticker, price)
+        return {
+            "top": board.top(n),
+            "players": len(board),
+            "rank": board.rank(name),
+            "net_worth": board.worth.get(name),
+            "teams": board.top_teams(n),
+            "team_count": len(board.team_worth),
+            "team_rank": board.team_rank(team),
+        }
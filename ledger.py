@@ -0,0 +1,265 @@
+import numpy as np
+
+from storage import get_store, collection_name
+from prices import current_market
+from metrics import timed
+from utils import is_bot
+
+# Columnar copy of users.json for whole-class math.
+#
+# Users and tickers are interned to small integer ids. Cash is one float column
+# indexed by user id; positions are rows in parallel columns (user id, ticker id,
+# qty, entry price), listed per user so one student's update is O(their positions). Class-wide
+# numbers (net worth of everyone, exposure per ticker, totals) are then a couple
+# of NumPy reductions instead of walking nested dicts.
+#
+# The JSON shape is kept exactly: key order, extra fields (pnl, team, ...) and
+# whether a number was an int or a float all round-trip through record().
+# Liquidity bots are kept too, but class totals and exposure leave them out.
+
+
+def _grow(arr, size):
+    if size <= len(arr):
+        return arr
+    out = np.zeros(max(size, 2 * len(arr), 16), dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _num(value, is_int):
+    return int(value) if is_int else float(value)
+
+
+class Ledger:
+    def __init__(self, users=None):
+        self.load(users or {})
+
+    def load(self, users):
+        self.user_ids = {}
+        self.user_names = []
+        self.ticker_ids = {}
+        self.ticker_names = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.student = np.zeros(0, dtype=bool)
+        self.cash = np.zeros(0)
+        self.cash_int = np.zeros(0, dtype=bool)
+        self.extra = []      # per user: the record's other fields and its key order
+        self.user_rows = []  # per user: position rows in the record's order
+
+        self.free = []
+        self.n_rows = 0
+        self.row_user = np.zeros(0, dtype=np.int32)
+        self.row_ticker = np.zeros(0, dtype=np.int32)
+        self.qty = np.zeros(0, dtype=np.int64)
+        self.entry = np.zeros(0)
+        self.entry_int = np.zeros(0, dtype=bool)
+        self.live = np.zeros(0, dtype=bool)
+        for name, record in users.items():
+            self.update_user(name, record)
+
+    @classmethod
+    def from_users(cls, users):
+        return cls(users)
+
+    def to_users(self):
+        return {name: self.record(name) for name in self.user_names if self.alive[self.user_ids[name]]}
+
+    def _user_id(self, name):
+        uid = self.user_ids.get(name)
+        if uid is None:
+            uid = self.user_ids[name] = len(self.user_names)
+            self.user_names.append(name)
+            self.extra.append(None)
+            self.user_rows.append([])
+            self.alive = _grow(self.alive, uid + 1)
+            self.student = _grow(self.student, uid + 1)
+            self.student[uid] = not is_bot(name)
+            self.cash = _grow(self.cash, uid + 1)
+            self.cash_int = _grow(self.cash_int, uid + 1)
+        return uid
+
+    def _ticker_id(self, ticker):
+        tid = self.ticker_ids.get(ticker)
+        if tid is None:
+            tid = self.ticker_ids[ticker] = len(self.ticker_names)
+            self.ticker_names.append(ticker)
+        return tid
+
+    def _new_row(self, uid, tid):
+        if self.free:
+            row = self.free.pop()
+        else:
+            row = self.n_rows
+            self.n_rows += 1
+            self.row_user = _grow(self.row_user, row + 1)
+            self.row_ticker = _grow(self.row_ticker, row + 1)
+            self.qty = _grow(self.qty, row + 1)
+            self.entry = _grow(self.entry, row + 1)
+            self.entry_int = _grow(self.entry_int, row + 1)
+            self.live = _grow(self.live, row + 1)
+        self.row_user[row] = uid
+        self.row_ticker[row] = tid
+        self.live[row] = True
+        return row
+
+    def _drop_row(self, row):
+        self.live[row] = False
+        self.qty[row] = 0
+        self.free.append(row)
+
+    def update_user(self, name, record):
+        if record is None:
+            return self.remove_user(name)
+        uid = self._user_id(name)
+        self.alive[uid] = True
+        self.cash[uid] = record["cash"]
+        self.cash_int[uid] = _is_int(record["cash"])
+        self.extra[uid] = (
+            tuple(record),
+            {k: v for k, v in record.items() if k not in ("cash", "positions")},
+            "positions" in record,
+        )
+        existing = {int(self.row_ticker[row]): row for row in self.user_rows[uid]}
+        keep = []
+        for ticker, pos in record.get("positions", {}).items():
+            tid = self._ticker_id(ticker)
+            row = existing.get(tid)
+            if row is None:
+                row = self._new_row(uid, tid)
+            self.qty[row] = pos["qty"]
+            self.entry[row] = pos["entry_price"]
+            self.entry_int[row] = _is_int(pos["entry_price"])
+            keep.append(row)
+        kept = set(keep)
+        for row in self.user_rows[uid]:
+            if row not in kept:
+                self._drop_row(row)
+        self.user_rows[uid] = keep
+
+    def remove_user(self, name):
+        uid = self.user_ids.get(name)
+        if uid is None or not self.alive[uid]:
+            return
+        for row in self.user_rows[uid]:
+            self._drop_row(row)
+        self.user_rows[uid] = []
+        self.alive[uid] = False
+        self.cash[uid] = 0
+
+    def record(self, name):
+        uid = self.user_ids.get(name)
+        if uid is None or not self.alive[uid]:
+            return None
+        keys, extra, has_positions = self.extra[uid]
+        positions = {}
+        for row in self.user_rows[uid]:
+            positions[self.ticker_names[self.row_ticker[row]]] = {
+                "qty": int(self.qty[row]),
+                "entry_price": _num(self.entry[row], self.entry_int[row]),
+            }
+        values = dict(extra, cash=_num(self.cash[uid], self.cash_int[uid]))
+        if has_positions:
+            values["positions"] = positions
+        return {k: values[k] for k in keys}
+
+    def price_column(self, prices):
+        # Mark price per position row from {ticker: price}; unpriced tickers at entry
+        by_ticker = np.array([prices.get(t, np.nan) for t in self.ticker_names], dtype=np.float64)
+        n = self.n_rows
+        px = by_ticker[self.row_ticker[:n]] if len(by_ticker) else np.zeros(n)
+        return np.where(np.isnan(px), self.entry[:n], px)
+
+    def market_values(self, prices):
+        n = self.n_rows
+        return self.qty[:n] * self.price_column(prices) * self.live[:n]
+
+    def net_worth(self, prices):
+        # Cash + market value for every user id at once
+        users = len(self.user_names)
+        held = np.bincount(self.row_user[:self.n_rows], weights=self.market_values(prices), minlength=users)
+        return np.where(self.alive[:users], self.cash[:users] + held, 0.0)
+
+    def unrealized(self, prices):
+        # Open PnL for every user id: qty * (mark - entry)
+        n = self.n_rows
+        pnl = self.qty[:n] * (self.price_column(prices) - self.entry[:n]) * self.live[:n]
+        return np.bincount(self.row_user[:n], weights=pnl, minlength=len(self.user_names))
+
+    def open_notional(self):
+        # Entry notional of every user's open positions
+        n = self.n_rows
+        return np.bincount(self.row_user[:n], weights=np.abs(self.qty[:n]) * self.entry[:n],
+                           minlength=len(self.user_names))
+
+    def open_pnl(self, name, prices):
+        # (unrealized PnL, open notional) for one user, O(their positions)
+        uid = self.user_ids.get(name)
+        if uid is None or not self.alive[uid]:
+            return 0.0, 0.0
+        pnl = notional = 0.0
+        for row in self.user_rows[uid]:
+            qty, entry = int(self.qty[row]), float(self.entry[row])
+            pnl += qty * (prices.get(self.ticker_names[self.row_ticker[row]], entry) - entry)
+            notional += abs(qty) * entry
+        return pnl, notional
+
+    def exposure(self, prices):
+        # {ticker: (net, gross)} market exposure across the whole class
+        values = self.market_values(prices) * self.student[self.row_user[:self.n_rows]]
+        tickers = self.row_ticker[:self.n_rows]
+        net = np.bincount(tickers, weights=values, minlength=len(self.ticker_names))
+        gross = np.bincount(tickers, weights=np.abs(values), minlength=len(self.ticker_names))
+        return {t: (float(net[i]), float(gross[i])) for i, t in enumerate(self.ticker_names) if gross[i]}
+
+    def totals(self, prices):
+        users = len(self.user_names)
+        counted = self.alive[:users] & self.student[:users]
+        values = self.market_values(prices) * self.student[self.row_user[:self.n_rows]]
+        return {
+            "students": int(counted.sum()),
+            "cash": float(self.cash[:users][counted].sum()),
+            "long": float(values[values > 0].sum()),
+            "short": float(values[values < 0].sum()),
+            "net_worth": float(self.net_worth(prices)[counted].sum()),
+        }
+
+    def nbytes(self):
+        arrays = (self.alive, self.student, self.cash, self.cash_int, self.row_user, self.row_ticker,
+                  self.qty, self.entry, self.entry_int, self.live)
+        return sum(a.nbytes for a in arrays)
+
+
+def get_ledger(users_file):
+    store = get_store(users_file)
+    name = collection_name(users_file)
+    store.collection(users_file, {})
+
+    def build(store):
+        ledger = Ledger(store.collections.get(name) or {})
+
+        def on_op(op):
+            if op is None or (op[0] == name and op[1] == "replace"):
+                ledger.load(store.collections.get(name) or {})
+            elif op[0] == name and op[1] == "put":
+                ledger.update_user(op[2], store.collections[name][op[2]])
+            elif op[0] == name and op[1] == "delete":
+                ledger.remove_user(op[2])
+        store.listeners.append(on_op)
+        return ledger
+    return store.index(("ledger", name), build)
+
+
+@timed("ledger.class_overview")
+def class_overview(users_file, market_file, top=5):
+    # Class-wide totals and the most traded exposures, marked at the shared prices
+    store = get_store(users_file)
+    ledger = get_ledger(users_file)
+    engine = current_market(market_file)
+    with store.lock():
+        prices = engine.snapshot()
+        exposure = sorted(ledger.exposure(prices).items(), key=lambda kv: -kv[1][1])
+        return {"totals": ledger.totals(prices), "exposure": exposure[:top]}
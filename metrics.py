@@ -0,0 +1,366 @@
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+
+# Process-wide instrumentation: timing spans, counters, per-rerun traces and
+# an opt-in profiler, for the teacher's diagnostics panel and a Prometheus
+# text-format dump (data/metrics.prom, for node_exporter's textfile collector
+# or anything else that scrapes files).
+#
+# span(name) times a block into a histogram; timed(name) does the same for a
+# whole function. Between start_rerun() and end_rerun() the spans of that
+# script run (one Streamlit session thread) are also kept as a trace, so the
+# panel can show where one slow rerun spent its time. With MONEYHUB_METRICS=0
+# every call returns right away: one global check per span or counter.
+#
+# Each process keeps its own numbers, so each writes its own file and labels
+# every series with shard="..." (MONEYHUB_SHARD, or the pid without one): a
+# textfile collector reading data/*.prom sees every shard side by side.
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+RECENT_RERUNS = 200
+TRACE_SPANS = 500      # spans kept per rerun trace; the histograms still see all of them
+SAMPLE_INTERVAL = 0.01  # each sample takes the GIL from the profiled thread
+DUMP_INTERVAL = 15.0
+SHARD = os.environ.get("MONEYHUB_SHARD", "").strip() or f"pid-{os.getpid()}"
+METRICS_FILE = os.environ.get("MONEYHUB_METRICS_FILE") or os.path.join(
+    "data", f"metrics-{re.sub(r'[^A-Za-z0-9.]+', '-', SHARD.split('://')[-1]).strip('-')}.prom")
+PREFIX = "moneyhub_"
+
+_enabled = os.environ.get("MONEYHUB_METRICS", "1").lower() not in ("0", "false", "off", "no")
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_recent = deque(maxlen=RECENT_RERUNS)
+
+
+class _Local(threading.local):
+    trace = None  # a class default: a missing attribute would cost an exception per span
+
+
+_local = _Local()
+_last_dump = 0.0
+_dumped = set()
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(flag):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _recent.clear()
+
+
+class Histogram:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+def observe(name, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.observe(seconds)
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+class _Span:
+    __slots__ = ("name", "start", "trace", "depth")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        trace = self.trace = _local.trace
+        if trace is not None:
+            self.depth = trace.depth
+            trace.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            hist = _histograms.get(self.name)
+            if hist is None:
+                hist = _histograms[self.name] = Histogram()
+            hist.observe(elapsed)
+        trace = self.trace
+        if trace is not None:
+            trace.depth -= 1
+            if len(trace.spans) < TRACE_SPANS:
+                trace.spans.append((self.name, self.depth, self.start - trace.start, elapsed))
+            else:
+                trace.dropped += 1
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    return _Span(name) if _enabled else _NO_SPAN
+
+
+def timed(name):
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+class Sampler:
+    # Statistical profiler for one thread: every few ms, note which functions
+    # are on its stack. Far cheaper than cProfile on call-heavy code, but the
+    # sampler only gets the GIL when the thread lets go of it, so I/O and lock
+    # waits show up more than pure Python compute does.
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.own = {}
+        self.inclusive = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            leaf = True
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if leaf:
+                    self.own[key] = self.own.get(key, 0) + 1
+                    leaf = False
+                if key not in seen:
+                    seen.add(key)
+                    self.inclusive[key] = self.inclusive.get(key, 0) + 1
+                frame = frame.f_back
+
+    def stop(self, limit=25):
+        self._stop.set()
+        self._thread.join()
+        lines = [f"{self.samples} samples, one every {self.interval * 1e3:.0f} ms", f"{'total':>7} {'own':>7}  function"]
+        for key, n in sorted(self.inclusive.items(), key=lambda kv: -kv[1])[:limit]:
+            filename, line, func = key
+            lines.append(f"{n:>7} {self.own.get(key, 0):>7}  {func} ({os.path.basename(filename)}:{line})")
+        return "\n".join(lines)
+
+
+class _Profile:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self, limit=25):
+        self.profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).strip_dirs().sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+class Trace:
+    __slots__ = ("label", "started", "start", "depth", "spans", "dropped", "profiler", "seconds", "profile")
+
+    def __init__(self, label, profiler):
+        self.label = label
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.depth = 0
+        self.spans = []
+        self.dropped = 0
+        self.profiler = profiler
+        self.seconds = None
+        self.profile = None
+
+
+def start_rerun(label, profile=None):
+    # Begin tracing this thread's script run; profile is None, "cprofile" or "sample".
+    # A run that never reached end_rerun (st.stop, st.rerun) is simply dropped.
+    old = _local.trace
+    if old is not None and old.profiler is not None:
+        old.profiler.stop()
+    _local.trace = None
+    if not _enabled:
+        return None
+    if profile == "cprofile":
+        profiler = _Profile()
+    elif profile == "sample":
+        profiler = Sampler(threading.get_ident()).start()
+    else:
+        profiler = None
+    trace = _local.trace = Trace(label, profiler)
+    return trace
+
+
+def end_rerun():
+    trace = _local.trace
+    _local.trace = None
+    if trace is None:
+        return None
+    trace.seconds = time.perf_counter() - trace.start
+    if trace.profiler is not None:
+        trace.profile = trace.profiler.stop()
+        trace.profiler = None
+    trace.spans.sort(key=lambda s: s[2])
+    observe("rerun", trace.seconds)
+    with _lock:
+        _recent.append(trace)
+    return trace
+
+
+def recent_reruns(label=None):
+    # Finished traces, newest first
+    with _lock:
+        traces = list(_recent)
+    return [t for t in reversed(traces) if label is None or t.label == label]
+
+
+def snapshot():
+    # {"spans": {name: {count, total, mean, p50, p99, max}}, "counters": {name: n}}
+    with _lock:
+        spans = {
+            name: {
+                "count": h.count,
+                "total": h.total,
+                "mean": h.total / h.count if h.count else 0.0,
+                "p50": h.quantile(0.5),
+                "p99": h.quantile(0.99),
+                "max": h.max,
+            }
+            for name, h in _histograms.items()
+        }
+        return {"spans": spans, "counters": dict(_counters)}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus():
+    with _lock:
+        histograms = {name: (h.count, h.total, list(h.buckets)) for name, h in _histograms.items()}
+        counters = dict(_counters)
+    shard = f'shard="{_label(SHARD)}"'
+    lines = [
+        f"# HELP {PREFIX}span_seconds Time spent in instrumented code",
+        f"# TYPE {PREFIX}span_seconds histogram",
+    ]
+    for name in sorted(histograms):
+        n, total, buckets = histograms[name]
+        label = f'{shard},span="{_label(name)}"'
+        seen = 0
+        for bound, k in zip(BUCKETS, buckets):
+            seen += k
+            lines.append(f'{PREFIX}span_seconds_bucket{{{label},le="{bound}"}} {seen}')
+        lines.append(f'{PREFIX}span_seconds_bucket{{{label},le="+Inf"}} {n}')
+        lines.append(f"{PREFIX}span_seconds_sum{{{label}}} {total!r}")
+        lines.append(f"{PREFIX}span_seconds_count{{{label}}} {n}")
+    for name in sorted(counters):
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{name}{{{shard}}} {counters[name]}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path=METRICS_FILE):
+    # Written whole and renamed into place, so a scraper never sees half a file
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus())
+    os.replace(tmp, path)
+    _dumped.add(path)
+    return path
+
+
+def maybe_dump(path=METRICS_FILE, interval=DUMP_INTERVAL):
+    # Cheap enough for every rerun: rewrites the file at most every interval seconds
+    global _last_dump
+    now = time.monotonic()
+    if not _enabled or now - _last_dump < interval:
+        return None
+    _last_dump = now
+    return dump(path)
+
+
+@atexit.register
+def _remove_dumps():
+    # A process that is gone should not keep reporting its last numbers
+    for path in _dumped:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
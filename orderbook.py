@@ -0,0 +1,282 @@
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime
+
+from storage import get_store, collection_name, transact, ConflictError
+from metrics import timed, count
+from utils import apply_fill, remaining
+
+# Price-time-priority limit order book over the open offers in trades.json.
+#
+# Each ticker keeps, per side, a sorted list of price keys (bids negated so the
+# best price is always first on both sides) and a FIFO deque of offer indexes
+# per price level. Fully filled offers are dropped lazily: they stay in their
+# deque until a walk reaches them. The book follows the store through its
+# listeners, so every process sees offers posted by the others.
+
+SIDES = ("Buy", "Sell")
+
+
+def _key(side, price):
+    return -price if side == "Buy" else price
+
+
+class TickerBook:
+    def __init__(self):
+        self.keys = {"Buy": [], "Sell": []}
+        self.levels = {"Buy": {}, "Sell": {}}
+
+    def add(self, side, price, oid):
+        key = _key(side, price)
+        level = self.levels[side].get(key)
+        if level is None:
+            level = self.levels[side][key] = deque()
+            insort(self.keys[side], key)
+        level.append(oid)
+
+    def drop_level(self, side, key):
+        del self.levels[side][key]
+        keys = self.keys[side]
+        del keys[bisect_left(keys, key)]
+
+
+class OrderBook:
+    def __init__(self, trades):
+        self.books = {}
+        self.orders = {}
+        self.load(trades)
+
+    def load(self, trades):
+        self.books = {}
+        self.orders = {}
+        self.by_user = {}
+        for oid, trade in enumerate(trades):
+            self.update(oid, trade)
+
+    def update(self, oid, trade):
+        if trade is None or remaining(trade) <= 0:
+            old = self.orders.pop(oid, None)
+            if old is not None:
+                self.by_user[old["user"]].discard(oid)
+            return
+        if oid not in self.orders:
+            book = self.books.get(trade["ticker"])
+            if book is None:
+                book = self.books[trade["ticker"]] = TickerBook()
+            book.add(trade["direction"], trade["price"], oid)
+            self.by_user.setdefault(trade["user"], set()).add(oid)
+        self.orders[oid] = trade
+
+    def walk(self, ticker, side, min_price=None, max_price=None):
+        # Live offers on one side in priority order: best price first, then oldest.
+        # A price range is turned into a key range and bisected into.
+        book = self.books.get(ticker)
+        if book is None:
+            return
+        lo, hi = (max_price, min_price) if side == "Buy" else (min_price, max_price)
+        lo = None if lo is None else _key(side, lo)
+        hi = None if hi is None else _key(side, hi)
+        keys = book.keys[side]
+        for key in keys[bisect_left(keys, lo) if lo is not None else 0:]:
+            if hi is not None and key > hi:
+                break
+            level = book.levels[side].get(key)
+            if level is None:
+                continue
+            while level and level[0] not in self.orders:
+                level.popleft()
+            if not level:
+                book.drop_level(side, key)
+                continue
+            for oid in list(level):
+                if oid in self.orders:
+                    yield oid, self.orders[oid]
+
+    def best(self, ticker, side):
+        for _, trade in self.walk(ticker, side):
+            return trade["price"]
+        return None
+
+    def crossing(self, ticker, side, price, user, quantity):
+        # Resting offers an incoming order would trade against, enough to cover quantity
+        other = "Sell" if side == "Buy" else "Buy"
+        out = []
+        covered = 0
+        for oid, trade in self.walk(ticker, other):
+            if (trade["price"] > price) if side == "Buy" else (trade["price"] < price):
+                break
+            if trade["user"] == user:
+                continue
+            out.append(oid)
+            covered += remaining(trade)
+            if covered >= quantity:
+                break
+        return out
+
+    def query(self, ticker=None, side=None, min_price=None, max_price=None, user=None,
+              exclude_user=None, offset=0, limit=20):
+        # One page of open offers in book order (ticker, side, price, time). Only
+        # offers up to the end of the page are visited; a user filter starts from
+        # that user's own offers. Returns (rows, has_more).
+        if user is not None:
+            def order(oid):
+                t = self.orders[oid]
+                return t["ticker"], SIDES.index(t["direction"]), _key(t["direction"], t["price"]), oid
+            source = ((oid, self.orders[oid]) for oid in sorted(self.by_user.get(user, ()), key=order))
+        else:
+            tickers = [ticker] if ticker else sorted(self.books)
+            sides = [side] if side else SIDES
+            source = (row for t in tickers for s in sides for row in self.walk(t, s, min_price, max_price))
+        rows = []
+        skipped = 0
+        scanned = 0
+        for scanned, (oid, trade) in enumerate(source, 1):
+            if ticker and trade["ticker"] != ticker or side and trade["direction"] != side:
+                continue
+            if min_price is not None and trade["price"] < min_price:
+                continue
+            if max_price is not None and trade["price"] > max_price:
+                continue
+            if exclude_user is not None and trade["user"] == exclude_user:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            rows.append((oid, trade))
+            if len(rows) > limit:
+                break
+        count("orderbook_offers_scanned_total", scanned)
+        return rows[:limit], len(rows) > limit
+
+
+def get_book(trades_file):
+    store = get_store(trades_file)
+    name = collection_name(trades_file)
+    store.collection(trades_file, [])
+
+    def build(store):
+        book = OrderBook(store.collections[name])
+
+        def on_op(op):
+            if op is None or (op[0] == name and op[1] == "replace"):
+                book.load(store.collections.get(name) or [])
+            elif op[0] == name and op[1] == "put":
+                book.update(op[2], store.collections[name][op[2]])
+        store.listeners.append(on_op)
+        return book
+    return store.index(("orderbook", name), build)
+
+
+def open_tickers(trades_file):
+    store = get_store(trades_file)
+    book = get_book(trades_file)
+    store.refresh()
+    with store.lock():
+        return sorted(t for t, b in book.books.items() if b.keys["Buy"] or b.keys["Sell"])
+
+
+@timed("orderbook.offers_page")
+def offers_page(trades_file, page=0, page_size=20, **filters):
+    # (rows, has_more) for one page of the "View Trades" list
+    store = get_store(trades_file)
+    book = get_book(trades_file)
+    store.refresh()
+    with store.lock():
+        rows, has_more = book.query(offset=page * page_size, limit=page_size, **filters)
+        return [(oid, dict(trade)) for oid, trade in rows], has_more
+
+
+@timed("orderbook.submit_order")
+def submit_order(users_file, trades_file, order, check=None, after=None):
+    # Post a Buy/Sell offer; whatever part of it is marketable fills right away
+    # against the best resting offers (at their price), the rest stays in the book.
+    # Returns (offer as stored, [fills]); check/after are transact()'s commit hooks.
+    store = get_store(users_file)
+    if store is not get_store(trades_file):
+        raise ValueError("users and trades must live in the same data directory")
+    store.collection(users_file, {})
+    book = get_book(trades_file)
+    side, ticker, price = order["direction"], order["ticker"], order["price"]
+    scanned = []
+
+    def run(tx):
+        incoming = dict(order, filled=0, matched=False)
+        with store.lock():
+            candidates = book.crossing(ticker, side, price, order["user"], order["quantity"])
+        scanned[:] = candidates
+        accounts = {}
+        fills = []
+
+        def account(name):
+            if name not in accounts:
+                accounts[name] = tx.get(users_file, name)
+            return accounts[name]
+
+        for oid in candidates:
+            need = incoming["quantity"] - incoming["filled"]
+            if need <= 0:
+                break
+            resting = tx.get(trades_file, oid)
+            if resting is None or remaining(resting) <= 0:
+                continue
+            me, them = account(order["user"]), account(resting["user"])
+            if me is None or them is None:
+                continue
+            buyer, seller = (me, them) if side == "Buy" else (them, me)
+            fill_price = resting["price"]
+            qty = min(need, remaining(resting), int(buyer["cash"] // fill_price))
+            if qty <= 0:
+                if buyer is me:
+                    break
+                continue
+            apply_fill(buyer, seller, ticker, qty, fill_price)
+            resting["filled"] = resting.get("filled", 0) + qty
+            resting["matched"] = remaining(resting) == 0
+            incoming["filled"] += qty
+            tx.put(trades_file, oid, resting)
+            fills.append({
+                "ticker": ticker,
+                "buyer": order["user"] if side == "Buy" else resting["user"],
+                "seller": resting["user"] if side == "Buy" else order["user"],
+                "qty": qty,
+                "price": fill_price,
+                "offer": oid,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        incoming["matched"] = remaining(incoming) == 0
+        incoming["crossed"] = incoming["filled"]  # already counted on the resting offers
+        for name, record in accounts.items():
+            if record is not None:
+                tx.put(users_file, name, record)
+        tx.append(trades_file, incoming)
+        return incoming, fills
+
+    def validate(result):
+        # An offer posted since the scan is not among the transaction's reads;
+        # if it would now be crossed, start over
+        if book.crossing(ticker, side, price, order["user"], order["quantity"]) != scanned:
+            raise ConflictError(f"{ticker} book changed")
+        if check is not None:
+            check(result)
+    return transact(users_file, run, check=validate, after=after)
+
+
+@timed("orderbook.cancel_offer")
+def cancel_offer(trades_file, index, user, expected=None, after=None):
+    # Withdraw what is left of `user`'s open offer `index`; whatever already
+    # filled stays filled. Returns (ok, message, offer).
+    store = get_store(trades_file)
+    store.collection(trades_file, [])
+
+    def run(tx):
+        trade = tx.get(trades_file, index)
+        if trade is None or remaining(trade) <= 0:
+            return False, "This offer is already closed.", trade
+        if expected is not None and any(trade[k] != expected[k] for k in ("user", "ticker", "direction", "price", "quantity")):
+            return False, "This offer is no longer available.", trade
+        if trade["user"] != user:
+            return False, "You can only cancel your own offers.", trade
+        trade["cancelled"] = True
+        tx.put(trades_file, index, trade)
+        return True, "", trade
+    return transact(trades_file, run, after=after)
@@ -0,0 +1,209 @@
+import time
+import zlib
+
+import numpy as np
+
+from storage import get_store, collection_name, transact
+
+# Simulated market prices, one shared path per ticker.
+#
+# Each ticker follows a geometric Brownian motion that starts at the price it
+# was first listed at and advances one step per clock tick. The shock for
+# (ticker, tick) comes from a counter-based hash of (game seed, ticker, tick),
+# so every process and every session computes the exact same path without
+# coordinating, and all tickers are stepped at once with NumPy.
+#
+# market.json holds the game settings under "game" and one record per listed
+# ticker (tickers are always upper case, so they can't collide with "game").
+
+TICK_SECONDS = 60
+VOLATILITY = 0.01  # per tick
+DRIFT = 0.0        # per tick
+GAME_KEY = "game"
+
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(x):
+    # splitmix64 finalizer; uint64 arithmetic wraps, which is what we want
+    x = x ^ (x >> np.uint64(30))
+    x = x * _M1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniform(x):
+    return ((_mix(x) >> np.uint64(11)).astype(np.float64) + 0.5) / float(1 << 53)
+
+
+def shocks(seed, keys, ticks):
+    # Standard normals for every (tick, ticker) pair: shape (len(ticks), len(keys))
+    with np.errstate(over="ignore"):
+        base = (np.uint64(seed) * _GOLDEN) ^ (keys[None, :] * _M1) ^ (ticks[:, None].astype(np.uint64) * _M2)
+        u1 = _uniform(base)
+        u2 = _uniform(base ^ _GOLDEN)
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+def ticker_key(ticker):
+    return zlib.crc32(ticker.encode("utf-8"))
+
+
+def new_game(seed=None, start=None, tick_seconds=TICK_SECONDS, volatility=VOLATILITY, drift=DRIFT):
+    return {
+        "seed": int(seed if seed is not None else time.time_ns() % (1 << 31)),
+        "start": float(start if start is not None else time.time()),
+        "tick_seconds": tick_seconds,
+        "volatility": volatility,
+        "drift": drift,
+    }
+
+
+class PriceEngine:
+    def __init__(self, game, listings=None, clock=time.time):
+        self.clock = clock
+        self.load(game, listings or {})
+
+    def load(self, game, listings):
+        self.game = game
+        self.tickers = []
+        self.slot = {}
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.anchor = np.zeros(0)
+        self.listed_tick = np.zeros(0, dtype=np.int64)
+        self.log_move = np.zeros(0)  # cumulative log return since listing
+        self.prices = np.zeros(0)
+        self.tick = self.current_tick()
+        self._snapshot = {}
+        for ticker, listing in sorted(listings.items(), key=lambda kv: kv[1]["tick"]):
+            self.list(ticker, listing["anchor"], listing["tick"])
+
+    def current_tick(self):
+        return max(0, int((self.clock() - self.game["start"]) // self.game["tick_seconds"]))
+
+    def _step_params(self):
+        g = self.game
+        return g["drift"] - 0.5 * g["volatility"] ** 2, g["volatility"]
+
+    def _path(self, keys, first, last):
+        # Sum of log returns over ticks first+1 .. last for each key
+        if last <= first or len(keys) == 0:
+            return np.zeros(len(keys))
+        mu, sigma = self._step_params()
+        z = shocks(self.game["seed"], keys, np.arange(first + 1, last + 1))
+        return (mu + sigma * z).sum(axis=0)
+
+    def list(self, ticker, anchor, tick):
+        if ticker in self.slot:
+            return
+        key = np.array([ticker_key(ticker)], dtype=np.uint64)
+        self.slot[ticker] = len(self.tickers)
+        self.tickers.append(ticker)
+        self.keys = np.append(self.keys, key)
+        self.anchor = np.append(self.anchor, float(anchor))
+        self.listed_tick = np.append(self.listed_tick, int(tick))
+        self.log_move = np.append(self.log_move, self._path(key, int(tick), max(self.tick, int(tick)))[0])
+        self.prices = np.round(self.anchor * np.exp(self.log_move), 2)
+        self._snapshot = dict(zip(self.tickers, self.prices.tolist()))
+
+    def advance(self):
+        # Step every ticker up to the current clock tick in one vectorized pass
+        now = self.current_tick()
+        if now <= self.tick:
+            return False
+        started = np.maximum(self.listed_tick, self.tick)
+        mu, sigma = self._step_params()
+        z = shocks(self.game["seed"], self.keys, np.arange(self.tick + 1, now + 1))
+        steps = mu + sigma * z
+        # Tickers listed in the future of the last tick only move after their listing
+        live = np.arange(self.tick + 1, now + 1)[:, None] > started[None, :]
+        self.log_move += (steps * live).sum(axis=0)
+        self.tick = now
+        self.prices = np.round(self.anchor * np.exp(self.log_move), 2)
+        self._snapshot = dict(zip(self.tickers, self.prices.tolist()))
+        return True
+
+    def snapshot(self):
+        return self._snapshot
+
+    def price(self, ticker, default=None):
+        return self._snapshot.get(ticker, default)
+
+    def value(self, positions):
+        # Market value of {ticker: {"qty", "entry_price"}}; unlisted tickers at entry
+        if not positions:
+            return 0.0
+        qty = np.fromiter((p["qty"] for p in positions.values()), dtype=np.float64, count=len(positions))
+        px = np.fromiter(
+            (self._snapshot.get(t, p["entry_price"]) for t, p in positions.items()),
+            dtype=np.float64, count=len(positions),
+        )
+        return float(qty @ px)
+
+
+def get_price_engine(market_file):
+    store = get_store(market_file)
+    name = collection_name(market_file)
+    store.collection(market_file, {})
+    if GAME_KEY not in store.collections[name]:
+        start_game(market_file, only_if_missing=True)
+
+    def build(store):
+        def listings():
+            market = store.collections.get(name) or {}
+            return {t: v for t, v in market.items() if t != GAME_KEY}
+
+        engine = PriceEngine(store.collections[name][GAME_KEY], listings())
+
+        def on_op(op):
+            if op is None or (op[0] == name and (op[1] == "replace" or op[2] == GAME_KEY)):
+                market = store.collections.get(name) or {}
+                if GAME_KEY in market:
+                    engine.load(market[GAME_KEY], listings())
+            elif op[0] == name and op[1] == "put":
+                engine.list(op[2], op[3]["anchor"], op[3]["tick"])
+        store.listeners.append(on_op)
+        return engine
+    return store.index(("prices", name), build)
+
+
+def start_game(market_file, seed=None, only_if_missing=False):
+    # A new game gets a fresh seed and clock and forgets every listing
+    store = get_store(market_file)
+    store.collection(market_file, {})
+    if only_if_missing:
+        def run(tx):
+            if tx.get(market_file, GAME_KEY) is None:
+                tx.put(market_file, GAME_KEY, new_game(seed))
+        transact(market_file, run)
+    else:
+        store.write([[collection_name(market_file), "replace", {GAME_KEY: new_game(seed)}]])
+
+
+def list_tickers(market_file, first_prices):
+    # List any of {ticker: first traded price} not already listed, anchored at that price
+    engine = get_price_engine(market_file)
+    missing = {t: p for t, p in first_prices.items() if t and t != GAME_KEY and t not in engine.slot}
+    if not missing:
+        return
+
+    def run(tx):
+        tick = engine.current_tick()
+        for ticker, price in missing.items():
+            if tx.get(market_file, ticker) is None:
+                tx.put(market_file, ticker, {"anchor": float(price), "tick": tick})
+    transact(market_file, run)
+
+
+def current_market(market_file):
+    # The shared engine, advanced to the current tick; every view reads the
+    # same snapshot from it ({ticker: price}, O(1) per lookup)
+    store = get_store(market_file)
+    engine = get_price_engine(market_file)
+    store.refresh()
+    with store.lock():
+        engine.advance()
+        return engine
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Replays a classroom's journal (journal.jsonl, written by engine.py) through a
+# fresh engine at full speed, on a clock that follows the recorded times, and
+# prints where everyone ended up: positions, realized and unrealized PnL, and
+# the leaderboard (students only; liquidity bots are replayed but not
+# reported). Use it to regrade a session, to see what a rule change
+# would have done to it, or as a benchmark. No Streamlit needed.
+#
+#   python replay.py data/classes/ABC123/journal.jsonl
+#   python replay.py journal.jsonl --json > final.json
+#   python replay.py journal.jsonl --check data/classes/ABC123   # same result as the live class?
+#   python replay.py journal.jsonl --out /tmp/regraded            # keep the replayed data directory (and a timeline)
+#   python replay.py journal.jsonl --no-risk                      # without buying power and risk limits
+
+
+def replay(journal_path, data_dir, checks=True, timeline=False):
+    # (engine, entries, indexes of entries that no longer applied); checks=False
+    # replays without the pre-trade risk checks, timeline=True also rebuilds the
+    # session's timeline in data_dir
+    from engine import Engine, read_journal
+    entries = read_journal(journal_path)
+    now = [entries[0]["t"] if entries else time.time()]
+    engine = Engine(data_dir, journal=False, clock=lambda: now[0], publish=False, checks=checks, timeline=timeline)
+    skipped = []
+    for i, entry in enumerate(entries):
+        now[0] = entry["t"]
+        if not engine.apply(entry):
+            skipped.append(i)
+    return engine, entries, skipped
+
+
+def results(engine, top=50):
+    from utils import read_users, is_bot
+    from leaderboard import standings
+    from analytics import class_performance
+    users = read_users(engine.users_file)
+    market = engine.market()
+    perf, teams = class_performance(engine.users_file, engine.closed_trades_file, engine.market_file)
+    board = standings(engine.users_file, engine.market_file, n=top)
+    students = {}
+    for name in sorted(users):
+        if is_bot(name):
+            continue
+        record = users[name]
+        positions = {
+            t: {"qty": p["qty"], "entry_price": p["entry_price"], "price": market.price(t, p["entry_price"])}
+            for t, p in sorted(record.get("positions", {}).items()) if p["qty"]
+        }
+        students[name] = {
+            "team": record.get("team") or "No Team",
+            "cash": record["cash"],
+            "net_worth": record["cash"] + market.value(record.get("positions", {})),
+            "realized": perf[name]["realized"],
+            "unrealized": perf[name]["unrealized"],
+            "trades": perf[name]["trades"],
+            "positions": positions,
+        }
+    return {
+        "prices": dict(sorted(market.snapshot().items())),
+        "students": students,
+        "leaderboard": [{"name": name, "net_worth": worth} for name, worth in board["top"]],
+        "teams": [
+            {"team": team, "net_worth": worth, "members": members, "realized": teams[team]["realized"]}
+            for team, worth, members in board["teams"]
+        ],
+    }
+
+
+def differences(engine, live_dir, limit=10):
+    # Where the replayed class differs from the live one (users and open offers)
+    from utils import read_users, read_trades
+    live = os.path.join(live_dir, "users.json"), os.path.join(live_dir, "trades.json")
+    out = []
+    mine, theirs = read_users(engine.users_file), read_users(live[0])
+    for name in sorted(set(mine) | set(theirs)):
+        if mine.get(name) != theirs.get(name):
+            out.append(f"student {name}: replayed {mine.get(name)} vs live {theirs.get(name)}")
+    mine, theirs = read_trades(engine.trades_file), read_trades(live[1])
+    if list(mine) != list(theirs):
+        out.append(f"open offers: {len(mine)} replayed vs {len(theirs)} live")
+    return out[:limit]
+
+
+def print_results(result):
+    print(f"{'#':>3}  {'student':<20} {'net worth':>12}")
+    for rank, row in enumerate(result["leaderboard"], start=1):
+        print(f"{rank:>3}  {row['name']:<20} {row['net_worth']:>12,.2f}")
+    print(f"\n{'team':<20} {'members':>7} {'net worth':>12} {'realized':>11}")
+    for row in result["teams"]:
+        print(f"{row['team']:<20} {row['members']:>7} {row['net_worth']:>12,.2f} {row['realized']:>+11,.2f}")
+    print(f"\n{'student':<20} {'team':<12} {'cash':>11} {'realized':>11} {'unrealized':>11}  positions")
+    for name, s in result["students"].items():
+        held = " ".join(f"{t} {p['qty']:+d}@{p['entry_price']:g}" for t, p in s["positions"].items())
+        print(f"{name:<20} {s['team']:<12} {s['cash']:>11,.2f} {s['realized']:>+11,.2f} {s['unrealized']:>+11,.2f}  {held}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a classroom journal and print the final standings")
+    parser.add_argument("journal", help="a classroom's journal.jsonl")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--top", type=int, default=50, help="leaderboard length (default 50)")
+    parser.add_argument("--out", help="replay into this (empty) data directory and keep it")
+    parser.add_argument("--check", metavar="DATA_DIR", help="compare the result with this live classroom")
+    parser.add_argument("--no-risk", action="store_true", help="skip the pre-trade risk checks (buying power, limits)")
+    args = parser.parse_args()
+
+    data_dir = args.out or tempfile.mkdtemp(prefix="replay-")
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        if os.listdir(args.out):
+            parser.error(f"{args.out} is not empty")
+    try:
+        start = time.perf_counter()
+        engine, entries, skipped = replay(args.journal, data_dir, checks=not args.no_risk, timeline=bool(args.out))
+        elapsed = time.perf_counter() - start
+        result = results(engine, args.top)
+        result["replay"] = {"entries": len(entries), "skipped": skipped, "seconds": elapsed}
+        if args.json:
+            json.dump(result, sys.stdout, indent=2)
+            print()
+        else:
+            print_results(result)
+        rate = len(entries) / elapsed if elapsed else 0.0
+        print(f"\nreplayed {len(entries):,} entries in {elapsed * 1e3:,.0f} ms ({rate:,.0f}/s); "
+              f"{len(skipped)} no longer applied", file=sys.stderr)
+        if args.check:
+            diffs = differences(engine, args.check)
+            for line in diffs:
+                print(line, file=sys.stderr)
+            print(f"{'differs from' if diffs else 'matches'} {args.check}", file=sys.stderr)
+            return 1 if diffs else 0
+    finally:
+        if not args.out:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
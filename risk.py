@@ -0,0 +1,231 @@
+import os
+
+from storage import get_store, collection_name
+from metrics import timed
+from utils import remaining
+
+# Pre-trade risk checks, run by the engine before an offer is posted or taken.
+#
+# An open Buy offer reserves price x open quantity of the student's cash, so
+# buying power is cash minus those reservations; a fill or a cancel releases
+# them. Open Sell offers count as short exposure for the part not covered by
+# shares the student already holds. On top of that the teacher sets two limits
+# per classroom (risk.json): how far short a student may go in total, and how
+# much of their equity one ticker may take.
+#
+# The checks never scan positions or the order book: an exposure cache keeps
+# per-student cash, cost basis, reservations and a running short total, plus
+# per-ticker position and open quantity on each side. It follows the store
+# through its listeners (a user put re-reads that student's positions, a trade
+# put swaps that one offer's contribution), so a check is a few dict lookups.
+# Exposure is valued at cost (entry or offer price), not at market.
+
+RISK_NAME = "risk"
+DEFAULT_LIMITS = {
+    "short_limit": 10000.0,  # total short exposure per student, in $; 0 means no short selling
+    "concentration": 1.0,    # largest share of a student's equity in one ticker, long or short
+}
+EPSILON = 1e-9
+
+
+class RiskError(Exception):
+    pass
+
+
+class Account:
+    __slots__ = ("cash", "cost", "reserved", "short", "tickers")
+
+    def __init__(self):
+        self.cash = 0.0
+        self.cost = 0.0      # positions at entry price, shorts negative
+        self.reserved = 0.0  # cash held for open Buy offers
+        self.short = 0.0     # sum of _short() over tickers
+        self.tickers = {}    # ticker -> [qty, entry, bid qty, bid $, ask qty, ask $]
+
+    def equity(self):
+        return self.cash + self.cost
+
+    def buying_power(self):
+        return self.cash - self.reserved
+
+
+def _long(cell):
+    return max(cell[0], 0) * cell[1] + cell[3]
+
+
+def _short(cell):
+    # An open short at entry, plus open Sells beyond the shares held, at their offer price
+    qty, entry, _, _, ask_qty, ask_value = cell
+    uncovered = ask_qty - max(qty, 0)
+    return max(-qty, 0) * entry + (uncovered * ask_value / ask_qty if uncovered > 0 else 0.0)
+
+
+def _exposure(cell):
+    return max(_long(cell), _short(cell))
+
+
+class Exposure:
+    def __init__(self, users, trades):
+        self.load(users, trades)
+
+    def load(self, users, trades):
+        self.accounts = {}
+        self.offers = {}  # offer index -> (user, ticker, side, open qty, price)
+        for name, record in users.items():
+            self.update_user(name, record)
+        for oid, trade in enumerate(trades):
+            self.update_offer(oid, trade)
+
+    def _account(self, name):
+        acct = self.accounts.get(name)
+        if acct is None:
+            acct = self.accounts[name] = Account()
+        return acct
+
+    def _cell(self, acct, ticker):
+        cell = acct.tickers.get(ticker)
+        if cell is None:
+            cell = acct.tickers[ticker] = [0, 0.0, 0, 0.0, 0, 0.0]
+        return cell
+
+    def update_user(self, name, record):
+        acct = self._account(name)
+        positions = record.get("positions", {})
+        acct.cash = record["cash"]
+        acct.cost = 0.0
+        for ticker in set(acct.tickers) | set(positions):
+            cell = self._cell(acct, ticker)
+            pos = positions.get(ticker)
+            acct.short -= _short(cell)
+            cell[0], cell[1] = (pos["qty"], pos["entry_price"]) if pos else (0, 0.0)
+            acct.short += _short(cell)
+            acct.cost += cell[0] * cell[1]
+
+    def remove_user(self, name):
+        acct = self.accounts.get(name)
+        if acct is not None:
+            self.update_user(name, {"cash": 0.0})
+
+    def update_offer(self, oid, trade):
+        old = self.offers.pop(oid, None)
+        if old is not None:
+            self._add_offer(old, -1)
+        if trade is not None and remaining(trade) > 0:
+            new = self.offers[oid] = (trade["user"], trade["ticker"], trade["direction"], remaining(trade), trade["price"])
+            self._add_offer(new, 1)
+
+    def _add_offer(self, offer, sign):
+        name, ticker, side, qty, price = offer
+        acct = self._account(name)
+        cell = self._cell(acct, ticker)
+        acct.short -= _short(cell)
+        if side == "Buy":
+            cell[2] += sign * qty
+            cell[3] += sign * qty * price
+            acct.reserved += sign * qty * price
+        else:
+            cell[4] += sign * qty
+            cell[5] += sign * qty * price
+        acct.short += _short(cell)
+
+    def check(self, name, ticker, side, price, quantity, limits):
+        # None if `name` may add a `side` of `quantity` at `price`, else why not
+        acct = self.accounts.get(name)
+        if acct is None:
+            return "You're not in this game."
+        cell = acct.tickers.get(ticker) or [0, 0.0, 0, 0.0, 0, 0.0]
+        value = price * quantity
+        after = list(cell)
+        if side == "Buy":
+            free = acct.buying_power()
+            if value > free + EPSILON:
+                return (f"Not enough buying power: this needs ${value:,.2f} and you have ${max(free, 0):,.2f} free "
+                        f"(${acct.reserved:,.2f} is held for your open Buy offers).")
+            after[2] += quantity
+            after[3] += value
+        else:
+            after[4] += quantity
+            after[5] += value
+            short = acct.short - _short(cell) + _short(after)
+            if short > acct.short + EPSILON and short > limits["short_limit"] + EPSILON:
+                return (f"That would leave you ${short:,.2f} short, over the class limit of "
+                        f"${limits['short_limit']:,.2f}.")
+        exposure = _exposure(after)
+        if exposure > _exposure(cell) + EPSILON:
+            cap = limits["concentration"] * acct.equity()
+            if exposure > cap + EPSILON:
+                return (f"That would put ${exposure:,.2f} into {ticker}, over the class limit of "
+                        f"{limits['concentration']:.0%} of your equity (${max(cap, 0):,.2f}).")
+        return None
+
+
+def _limits_path(store):
+    return os.path.join(store.data_dir, RISK_NAME + ".json")
+
+
+def get_exposure(users_file, trades_file):
+    store = get_store(users_file)
+    users_name, trades_name = collection_name(users_file), collection_name(trades_file)
+    store.collection(users_file, {})
+    store.collection(trades_file, [])
+
+    def build(store):
+        exposure = Exposure(store.collections.get(users_name) or {}, store.collections.get(trades_name) or [])
+
+        def on_op(op):
+            if op is None or (op[0] in (users_name, trades_name) and op[1] == "replace"):
+                exposure.load(store.collections.get(users_name) or {}, store.collections.get(trades_name) or [])
+            elif op[0] == users_name and op[1] == "put":
+                exposure.update_user(op[2], store.collections[users_name][op[2]])
+            elif op[0] == users_name and op[1] == "delete":
+                exposure.remove_user(op[2])
+            elif op[0] == trades_name and op[1] == "put":
+                exposure.update_offer(op[2], store.collections[trades_name][op[2]])
+        store.listeners.append(on_op)
+        return exposure
+    return store.index(("risk", users_name, trades_name), build)
+
+
+def limits(users_file):
+    store = get_store(users_file)
+    saved = store.collection(_limits_path(store), {})
+    return {key: saved.get(key, default) for key, default in DEFAULT_LIMITS.items()}
+
+
+def set_limits(users_file, **changes):
+    unknown = set(changes) - set(DEFAULT_LIMITS)
+    if unknown:
+        raise ValueError(f"unknown risk limits: {', '.join(sorted(unknown))}")
+    if any(value < 0 for value in changes.values()):
+        raise ValueError("risk limits can't be negative")
+    store = get_store(users_file)
+    store.collection(_limits_path(store), {})
+    store.write([[RISK_NAME, "put", key, float(value)] for key, value in changes.items()])
+    return limits(users_file)
+
+
+@timed("risk.check_order")
+def check_order(users_file, trades_file, name, ticker, side, price, quantity):
+    # None if the order is within the student's buying power and the class
+    # limits, else a message for them. Call under the store lock to act on it.
+    store = get_store(users_file)
+    exposure = get_exposure(users_file, trades_file)
+    store.refresh()
+    with store.lock():
+        return exposure.check(name, ticker, side, price, quantity, limits(users_file))
+
+
+def account_risk(users_file, trades_file, name):
+    # What the trade and portfolio pages show: cash, reservations, buying power, exposure
+    store = get_store(users_file)
+    exposure = get_exposure(users_file, trades_file)
+    store.refresh()
+    with store.lock():
+        acct = exposure.accounts.get(name) or Account()
+        return {
+            "cash": acct.cash,
+            "reserved": acct.reserved,
+            "buying_power": acct.buying_power(),
+            "short": acct.short,
+            "equity": acct.equity(),
+        }
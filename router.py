@@ -0,0 +1,64 @@
+import argparse
+import html
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlparse, parse_qs
+
+from classrooms import normalize_code, shard_for
+
+# Front door for several app processes (shards). It never proxies traffic: a
+# student opens /?class=CODE, gets redirected to the shard that owns CODE, and
+# their Streamlit session talks to that shard directly from then on.
+#
+#   streamlit run app.py --server.port 8501   (with MONEYHUB_SHARDS / MONEYHUB_SHARD set)
+#   streamlit run app.py --server.port 8502
+#   python router.py --port 8500 http://localhost:8501 http://localhost:8502
+
+FORM = """<!doctype html><html><head><meta charset="utf-8"><title>MoneyHub</title></head>
+<body style="font-family:sans-serif;max-width:420px;margin:80px auto;text-align:center">
+<h2>📊 MoneyHub Trading</h2>{error}
+<form method="get"><input name="class" placeholder="Class code" autofocus style="font-size:20px;text-transform:uppercase">
+<button type="submit" style="font-size:20px">Join</button></form>
+<p><a href="{demo}">or try the demo class</a></p></body></html>"""
+
+
+def make_handler(shards):
+    class Router(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            code = (query.get("class") or [""])[0]
+            if not code:
+                return self.page("")
+            try:
+                code = normalize_code(code)
+            except ValueError as e:
+                return self.page(f"<p style='color:#c00'>{html.escape(str(e))}</p>")
+            self.send_response(307)
+            self.send_header("Location", shard_for(code, shards).rstrip("/") + "/?" + urlencode({"class": code}))
+            self.end_headers()
+
+        def page(self, error):
+            body = FORM.format(error=error, demo=html.escape(shard_for("", shards))).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return Router
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send each classroom's sessions to its shard")
+    parser.add_argument("shards", nargs="+", help="base URL of every app process, e.g. http://localhost:8501")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8500)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.shards))
+    print(f"Routing {len(args.shards)} shards on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+import json
+import os
+import random
+import threading
+import time
+import atexit
+from contextlib import contextmanager
+from types import MappingProxyType
+
+from metrics import timed, count
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+# Every write is appended to one write-ahead log per data directory. The JSON
+# files (users.json, trades.json, ...) are the compacted snapshots: on startup
+# we load each snapshot and replay the log on top of it.
+#
+# Log lines look like {"seq": 7, "ops": [["users", "put", "Wahid", {...}], ...]}.
+# All ops in one line are applied together, and every op overwrites a whole
+# record, so replaying the log over a newer snapshot gives the same result.
+#
+# Several processes (and every Streamlit session thread) can share a data
+# directory. Appends happen under a short cross-process lock after catching up
+# on whatever the others wrote. Each record's version is the seq of its last
+# write, which is what transactions compare-and-swap on.
+
+LOG_NAME = "wal.jsonl"
+LOCK_NAME = "wal.lock"
+GROUP_COMMIT_SIZE = 64        # fsync after this many unsynced records...
+GROUP_COMMIT_INTERVAL = 0.05  # ...or after this many seconds, whichever first
+COMPACT_MIN_BYTES = 1 << 20   # never compact a log smaller than this
+MAX_RETRIES = 200
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class ConflictError(Exception):
+    pass
+
+
+def get_store(filepath):
+    data_dir = os.path.dirname(os.path.abspath(filepath))
+    store = _stores.get(data_dir)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(data_dir)
+            if store is None:
+                store = _stores[data_dir] = Store(data_dir)
+    return store
+
+
+def collection_name(filepath):
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+
+def copy_value(value):
+    # Records are plain JSON (dicts, lists, scalars); this is much cheaper than copy.deepcopy
+    if isinstance(value, dict):
+        return {k: copy_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_value(v) for v in value]
+    return value
+
+
+def apply_op(collections, op):
+    name, kind = op[0], op[1]
+    if kind == "replace":
+        collections[name] = copy_value(op[2])
+        return
+    target = collections.get(name)
+    if kind == "put":
+        key, value = op[2], op[3]
+        if target is None:
+            target = collections[name] = [] if isinstance(key, int) else {}
+        if isinstance(target, list):
+            while len(target) <= key:
+                target.append(None)
+        target[key] = copy_value(value)
+    elif kind == "delete":
+        if target is not None and op[2] in target:
+            del target[op[2]]
+
+
+# Returns (records, good_bytes); a torn last line left by a crash is dropped.
+def read_log(path, offset=0):
+    records = []
+    good = 0
+    if not os.path.exists(path):
+        return records, good
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            good += len(line)
+    count("storage_bytes_read_total", good)
+    count("storage_log_records_read_total", len(records))
+    return records, good
+
+
+def write_json_atomic(filepath, data, indent=2):
+    tmp = filepath + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filepath)
+
+
+class Store:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.log_path = os.path.join(data_dir, LOG_NAME)
+        self.lock_path = os.path.join(data_dir, LOCK_NAME)
+        self.collections = {}
+        self.versions = {}
+        self.replaced = {}
+        self.paths = {}
+        self.empties = {}
+        self.indexes = {}
+        self.views = {}
+        self.changed = {}
+        self.listeners = []
+        self.seq = 0
+        self.base_seq = 0
+        self.log_bytes = 0
+        self.snapshot_bytes = 0
+        self._log = None
+        self._log_ino = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+        with self.lock():
+            self._reload()
+
+    @contextmanager
+    def lock(self):
+        # Re-entrant in-process lock plus an flock on wal.lock for other processes
+        with self._thread_lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                if self._lock_file is None:
+                    self._lock_file = open(self.lock_path, "a+b")
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _reload(self):
+        self._close_log()
+        self.collections = {}
+        self.versions = {}
+        self.replaced = {}
+        self.views = {}
+        self.snapshot_bytes = 0
+        records, good = read_log(self.log_path)
+        self._truncate_torn(good)
+        self._log_ino = os.stat(self.log_path).st_ino if os.path.exists(self.log_path) else None
+        self.log_bytes = good
+        # A compacted log starts with an empty header record carrying the snapshots' seq
+        self.base_seq = records[0]["seq"] if records and not records[0]["ops"] else 0
+        self.seq = self.base_seq
+        for name, filepath in list(self.paths.items()):
+            self._load_snapshot(name, filepath, self.empties.get(name))
+        self._apply_records(records)
+        for fn in self.listeners:
+            fn(None)
+
+    def _truncate_torn(self, good):
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > good:
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good)
+
+    def _apply_records(self, records):
+        for record in records:
+            for op in record["ops"]:
+                name = op[0]
+                if name not in self.collections:
+                    path = self.paths.get(name) or os.path.join(self.data_dir, name + ".json")
+                    self._load_snapshot(name, path, None)
+                apply_op(self.collections, op)
+                if op[1] == "replace":
+                    # Every record in it is new: nothing read before may commit over it
+                    self.versions[name] = {}
+                    self.replaced[name] = record["seq"]
+                else:
+                    self.versions.setdefault(name, {})[op[2]] = record["seq"]
+                self.changed[name] = record["seq"]
+                for fn in self.listeners:
+                    fn(op)
+            self.seq = record["seq"]
+
+    def _load_snapshot(self, name, filepath, empty):
+        self.paths[name] = filepath
+        if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+            size = os.path.getsize(filepath)
+            self.snapshot_bytes += size
+            count("storage_bytes_read_total", size)
+            with open(filepath, "r", encoding="utf-8") as f:
+                self.collections[name] = json.load(f)
+        elif empty is not None:
+            self.collections[name] = copy_value(empty)
+
+    def refresh(self):
+        # Catch up on records other processes appended since we last looked
+        with self.lock():
+            if not os.path.exists(self.log_path):
+                if self._log_ino is not None:
+                    self._reload()
+                return
+            st = os.stat(self.log_path)
+            if st.st_ino != self._log_ino or st.st_size < self.log_bytes:
+                self._reload()
+            elif st.st_size > self.log_bytes:
+                records, good = read_log(self.log_path, self.log_bytes)
+                self._truncate_torn(self.log_bytes + good)
+                self.log_bytes += good
+                self._apply_records(records)
+
+    def collection(self, filepath, empty):
+        name = collection_name(filepath)
+        if name not in self.collections or name not in self.paths:
+            with self.lock():
+                self.empties[name] = empty
+                if name not in self.collections:
+                    self._load_snapshot(name, filepath, empty)
+                elif name not in self.paths:
+                    self.paths[name] = filepath
+                if name not in self.collections:
+                    self.collections[name] = copy_value(empty)
+        return self.collections[name]
+
+    def index(self, key, factory):
+        # Derived in-memory indexes (order books, rankings, ...) built once per
+        # store and kept current through listeners: fn(op) after every applied
+        # op, fn(None) after a full reload.
+        with self.lock():
+            if key not in self.indexes:
+                self.indexes[key] = factory(self)
+            return self.indexes[key]
+
+    def view(self, filepath, empty):
+        # Read-only snapshot shared by every session in the process: a shallow
+        # copy of the collection, made at most once per change to it. Writes
+        # replace records instead of mutating them, so the records can be shared.
+        name = collection_name(filepath)
+        self.collection(filepath, empty)
+        self.refresh()
+        with self.lock():
+            version = self.changed.get(name, 0)
+            cached = self.views.get(name)
+            if cached is None or cached[0] != version:
+                data = self.collections[name]
+                frozen = MappingProxyType(dict(data)) if isinstance(data, dict) else tuple(data)
+                cached = self.views[name] = (version, frozen)
+            return cached[1]
+
+    def version(self, name, key):
+        return self.versions.get(name, {}).get(key, self.replaced.get(name, self.base_seq))
+
+    @timed("storage.write")
+    def write(self, ops, expect=None, check=None, after=None):
+        # ops may use [name, "append", value]; the list index is assigned under the lock.
+        # expect maps (name, key) -> version; any mismatch raises ConflictError.
+        # check() and after() run under the lock too: check before anything is
+        # appended (it may raise to abort the write), after once the record is
+        # applied, so whatever it logs is in commit order.
+        with self.lock():
+            self.refresh()
+            for (name, key), version in (expect or {}).items():
+                if self.version(name, key) != version:
+                    raise ConflictError(f"{name}[{key!r}] changed")
+            if check is not None:
+                check()
+            ops = [self._resolve(op) for op in ops]
+            record = {"seq": self.seq + 1, "ops": ops}
+            data = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+            if self._log is None:
+                self._log = open(self.log_path, "ab")
+                self._log_ino = os.fstat(self._log.fileno()).st_ino
+            self._log.write(data)
+            self._log.flush()
+            self.log_bytes += len(data)
+            count("storage_bytes_written_total", len(data))
+            self._unsynced += 1
+            now = time.monotonic()
+            if self._unsynced >= GROUP_COMMIT_SIZE or now - self._last_sync >= GROUP_COMMIT_INTERVAL:
+                self.sync()
+            self._apply_records([record])
+            if after is not None:
+                after()
+            if self.log_bytes > max(COMPACT_MIN_BYTES, self.snapshot_bytes):
+                self.compact()
+            return ops
+
+    def _resolve(self, op):
+        if op[1] == "append":
+            return [op[0], "put", len(self.collections.get(op[0]) or []), op[2]]
+        return op
+
+    def sync(self):
+        if self._log is not None and self._unsynced:
+            os.fsync(self._log.fileno())
+            count("storage_fsyncs_total")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @timed("storage.compact")
+    def compact(self):
+        with self.lock():
+            self.refresh()
+            self.sync()
+            total = 0
+            for name, data in self.collections.items():
+                path = self.paths.get(name) or os.path.join(self.data_dir, name + ".json")
+                write_json_atomic(path, data)
+                total += os.path.getsize(path)
+            # Snapshots are durable now, so the log can start over. A crash before
+            # the swap just replays records the snapshots already contain.
+            header = (json.dumps({"seq": self.seq, "ops": []}) + "\n").encode("utf-8")
+            tmp = self.log_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(header)
+                f.flush()
+                os.fsync(f.fileno())
+            self._close_log()
+            os.replace(tmp, self.log_path)
+            self._log_ino = os.stat(self.log_path).st_ino
+            self.log_bytes = len(header)
+            self.snapshot_bytes = total
+            count("storage_bytes_written_total", total + len(header))
+            self.base_seq = self.seq
+            self.versions = {}
+            self.replaced = {}
+
+    def _close_log(self):
+        if self._log is not None:
+            self.sync()
+            self._log.close()
+            self._log = None
+
+    def close(self):
+        with self._thread_lock:
+            self._close_log()
+
+
+class Transaction:
+    # Reads hand back private copies and remember each record's version; writes
+    # are buffered and committed as one log record only if none of those changed.
+    def __init__(self, store):
+        self.store = store
+        self.reads = {}
+        self.ops = []
+
+    def get(self, filepath, key, default=None):
+        name = collection_name(filepath)
+        with self.store.lock():
+            target = self.store.collections.get(name)
+            if isinstance(target, list):
+                value = target[key] if 0 <= key < len(target) else default
+            else:
+                value = (target or {}).get(key, default)
+            self.reads[(name, key)] = self.store.version(name, key)
+            return copy_value(value)
+
+    def put(self, filepath, key, value):
+        self.ops.append([collection_name(filepath), "put", key, value])
+
+    def append(self, filepath, value):
+        self.ops.append([collection_name(filepath), "append", value])
+
+
+def transact(filepath, fn, retries=MAX_RETRIES, check=None, after=None):
+    # Optimistic concurrency: run fn against copies without holding the lock,
+    # then validate and append under it; on conflict back off briefly and rerun.
+    # check(result) and after(result) are Store.write's hooks for the attempt
+    # that commits; neither runs if fn wrote nothing.
+    store = get_store(filepath)
+    for attempt in range(retries):
+        store.refresh()
+        tx = Transaction(store)
+        result = fn(tx)
+        if not tx.ops:
+            return result
+        try:
+            store.write(tx.ops, expect=tx.reads,
+                        check=check and (lambda: check(result)), after=after and (lambda: after(result)))
+            return result
+        except ConflictError:
+            count("storage_conflicts_total")
+            time.sleep(random.uniform(0, 0.001 * min(attempt + 1, 10)))
+    raise ConflictError(f"gave up after {retries} attempts")
+
+
+if hasattr(os, "register_at_fork"):
+    # A forked child must not share its parent's lock and log file descriptors
+    os.register_at_fork(after_in_child=_stores.clear)
+
+
+@atexit.register
+def _sync_all():
+    for store in _stores.values():
+        store.close()
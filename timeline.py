@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, deque
+
+from storage import collection_name, copy_value, write_json_atomic
+from prices import PriceEngine, GAME_KEY
+from metrics import timed, count
+from utils import is_bot
+
+# The classroom's history, for looking at any past moment of a session.
+#
+# timeline.jsonl is an ordered log of what changed students' accounts: one
+# JSON line per join, fill, close, roster change or reset, holding the changed
+# student records as they were right after it, plus any newly listed tickers.
+# The engine appends it inside the commit (under the store lock), like the
+# journal, so it is in commit order across processes. Every CHECKPOINT_BYTES
+# of timeline, the writer that crosses the mark also saves the whole state
+# (every student, the game and its listings) to checkpoints/, named by the
+# timeline offset it stands for and its time.
+#
+# state_at(t) loads the last checkpoint at or before t and applies only the
+# events after it, up to t: one file read and at most CHECKPOINT_BYTES of
+# tail, however long the session. Prices at t are recomputed from the game,
+# which is deterministic in time (prices.py).
+
+TIMELINE_NAME = "timeline.jsonl"
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_BYTES = 256 * 1024
+CACHED_CHECKPOINTS = 8
+RECENT_EVENTS = 20
+
+
+class Timeline:
+    # The writing side; one per engine
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, TIMELINE_NAME)
+        self.checkpoint_dir = os.path.join(data_dir, CHECKPOINT_DIR)
+        self._file = None
+        self._game = None
+        self._listed = set()
+        self._checkpoint = None  # offset of the newest checkpoint we know of
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def record(self, store, users_file, market_file, t, kind, names=(), **fields):
+        # Call under the store lock, from the commit the event describes.
+        # "start" and "reset" events carry every student and the new game.
+        users = store.collections.get(collection_name(users_file)) or {}
+        market = store.collections.get(collection_name(market_file)) or {}
+        event = {"t": t, "kind": kind}
+        if kind in ("start", "reset"):
+            event["game"] = market.get(GAME_KEY)
+            event["users"] = dict(users)
+        else:
+            event["users"] = {name: users.get(name) for name in names}
+        listings = self._new_listings(market)
+        if listings:
+            event["listings"] = listings
+        event.update(fields)
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write((json.dumps(event, separators=(",", ":")) + "\n").encode("utf-8"))
+        self._file.flush()
+        offset = os.fstat(self._file.fileno()).st_size
+        if self._checkpoint is None or offset - self._checkpoint >= CHECKPOINT_BYTES:
+            known = checkpoints(os.path.dirname(self.path))
+            self._checkpoint = known[-1][1] if known else 0
+            if offset - self._checkpoint >= CHECKPOINT_BYTES:
+                self.checkpoint(t, offset, users, market)
+
+    def _new_listings(self, market):
+        # Tickers listed since this writer last said so; everything after a new game
+        game = market.get(GAME_KEY)
+        if game != self._game:
+            self._game = copy_value(game)
+            self._listed = set()
+        elif len(market) - (GAME_KEY in market) == len(self._listed):
+            return None
+        new = {t: v for t, v in market.items() if t != GAME_KEY and t not in self._listed}
+        self._listed.update(new)
+        return new
+
+    def checkpoint(self, t, offset, users, market):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        state = {
+            "t": t,
+            "offset": offset,
+            "game": market.get(GAME_KEY),
+            "listings": {k: v for k, v in market.items() if k != GAME_KEY},
+            "users": users,
+        }
+        write_json_atomic(os.path.join(self.checkpoint_dir, f"{offset:012d}-{t!r}.json"), state, indent=None)
+        self._checkpoint = offset
+        count("timeline_checkpoints_total")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def checkpoints(data_dir):
+    # [(t, offset, path)] in timeline order
+    directory = os.path.join(data_dir, CHECKPOINT_DIR)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    out = []
+    for name in names:
+        if name.endswith(".json"):
+            offset, t = name[:-5].split("-", 1)
+            out.append((float(t), int(offset), os.path.join(directory, name)))
+    out.sort(key=lambda c: c[1])
+    return out
+
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def _load_checkpoint(path):
+    # Checkpoints never change once written, so the last few stay parsed
+    with _loaded_lock:
+        state = _loaded.get(path)
+        if state is not None:
+            _loaded.move_to_end(path)
+            return state
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    with _loaded_lock:
+        _loaded[path] = state
+        if len(_loaded) > CACHED_CHECKPOINTS:
+            _loaded.popitem(last=False)
+    return state
+
+
+def apply_event(state, event):
+    if event["kind"] in ("start", "reset"):
+        state["game"] = event["game"]
+        state["listings"] = {}
+        state["users"] = {}
+    for name, record in event["users"].items():
+        if record is None:
+            state["users"].pop(name, None)
+        else:
+            state["users"][name] = record
+    state["listings"].update(event.get("listings", ()))
+    state["t"] = event["t"]
+
+
+@timed("timeline.state_at")
+def state_at(data_dir, when):
+    # {"t", "game", "listings", "users", "events"} as of time `when`: the last
+    # checkpoint at or before it plus the events since, up to `when`. "events"
+    # are the last few of those, newest last.
+    known = checkpoints(data_dir)
+    i = bisect_right([c[0] for c in known], when)
+    if i:
+        base = _load_checkpoint(known[i - 1][2])
+        offset = base["offset"]
+        state = {"t": base["t"], "game": base["game"], "listings": dict(base["listings"]), "users": dict(base["users"])}
+    else:
+        offset = 0
+        state = {"t": None, "game": None, "listings": {}, "users": {}}
+    events = deque(maxlen=RECENT_EVENTS)
+    scanned = 0
+    try:
+        with open(os.path.join(data_dir, TIMELINE_NAME), "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                if event["t"] > when:
+                    break
+                scanned += 1
+                apply_event(state, event)
+                events.append(event)
+    except FileNotFoundError:
+        pass
+    count("timeline_events_replayed_total", scanned)
+    state["events"] = list(events)
+    return state
+
+
+def time_range(data_dir):
+    # (first, last) event times, or None before anything was recorded
+    path = os.path.join(data_dir, TIMELINE_NAME)
+    try:
+        with open(path, "rb") as f:
+            first = f.readline()
+            if not first.endswith(b"\n"):
+                return None
+            # Read backwards, four times more each round, until the tail holds
+            # a whole line: the one cut at the start of the chunk doesn't count
+            size = os.fstat(f.fileno()).st_size
+            chunk = 64 * 1024
+            while True:
+                start = max(0, size - chunk)
+                f.seek(start)
+                tail = f.read(size - start)
+                lines = tail[:tail.rfind(b"\n")].split(b"\n")
+                for line in reversed(lines if start == 0 else lines[1:]):
+                    try:
+                        return json.loads(first)["t"], json.loads(line)["t"]
+                    except ValueError:
+                        continue
+                if start == 0:
+                    break
+                chunk *= 4
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def market_at(state):
+    # The simulated market as it stood at state["t"]
+    when = state["t"]
+    engine = PriceEngine(state["game"], {}, clock=lambda: when)
+    tick = engine.current_tick()
+    for ticker, listing in sorted(state["listings"].items(), key=lambda kv: kv[1]["tick"]):
+        if listing["tick"] <= tick:
+            engine.list(ticker, listing["anchor"], listing["tick"])
+    return engine
+
+
+def standings_at(state, market=None):
+    # [(name, team, cash, net worth)] best first, marked at that moment's
+    # prices; students only, like the live leaderboard
+    market = market or market_at(state)
+    rows = [
+        (name, record.get("team") or "No Team", record["cash"], record["cash"] + market.value(record.get("positions", {})))
+        for name, record in state["users"].items() if not is_bot(name)
+    ]
+    rows.sort(key=lambda r: (-r[3], r[0]))
+    return rows
+
+
+def describe(event):
+    # One line for the "what just happened" list
+    kind = event["kind"]
+    if kind == "fill":
+        return "; ".join(f"{f['buyer']} bought {f['qty']} {f['ticker']} from {f['seller']} at ${f['price']:.2f}"
+                         for f in event["fills"])
+    if kind == "close":
+        (name,) = event["users"]
+        closed = event["closed"]
+        return f"{name} closed {closed['ticker']} at ${closed['exit_price']:.2f} (PnL ${closed['pnl']:+,.2f})"
+    if kind == "join":
+        return f"{next(iter(event['users']))} joined"
+    if kind == "roster":
+        return f"Roster change: {', '.join(sorted(event['users']))}"
+    return "New game started" if kind == "reset" else "Timeline started"
@@ -1,33 +1,208 @@
-import json
-import os
+from storage import get_store, collection_name, copy_value, transact
+from metrics import timed
+
+# load_* hand back a private copy of the stored state; read_* hand back the
+# process-wide read-only view (shared by every session, rebuilt only after a
+# write, so a rerun that changed nothing costs O(1)). Writes are appended to
+# the store's log, so put_user / append_trade cost the same no
+# matter how much history is on disk; save_* still replace a whole collection.
+# match_trade / close_position / create_user are transactions: they re-read
+# what they touch and only commit if nobody else changed it in the meantime.
 
 def load_users(filepath="data/users.json"):
-    if not os.path.exists(filepath) or os.path.getsize(filepath) == 0:
-        return {}
-    with open(filepath, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return _load(filepath, {})
+
+
+def read_users(filepath="data/users.json"):
+    return get_store(filepath).view(filepath, {})
 
 
 def save_users(filepath="data/users.json", data=None):
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    _write(filepath, {}, ["replace", data or {}])
+
+def put_user(filepath, name, record):
+    _write(filepath, {}, ["put", name, record])
 
 def load_trades(filepath="data/trades.json"):
-    if not os.path.exists(filepath) or os.path.getsize(filepath) == 0:
-        return []
-    with open(filepath, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return _load(filepath, [])
+
+def read_trades(filepath="data/trades.json"):
+    return get_store(filepath).view(filepath, [])
 
 def save_trades(filepath="data/trades.json", data=None):
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    _write(filepath, [], ["replace", data or []])
+
+def append_trade(filepath, trade):
+    return _write(filepath, [], ["append", trade])[2]
 
 def load_closed_trades(filepath="data/closed_trades.json"):
-    if not os.path.exists(filepath) or os.path.getsize(filepath) == 0 :
-        return []
-    with open(filepath, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return _load(filepath, [])
+
+def read_closed_trades(filepath="data/closed_trades.json"):
+    return get_store(filepath).view(filepath, [])
 
 def save_closed_trades(data, filepath="data/closed_trades.json"):
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    _write(filepath, [], ["replace", data or []])
+
+def append_closed_trade(filepath, trade):
+    return _write(filepath, [], ["append", trade])[2]
+
+
+# Liquidity bots (bots.py) trade like students but are not students: they are
+# left out of rankings and class statistics. The name prefix is what marks
+# them, so students can't pick it.
+BOT_PREFIX = "bot-"
+BOT_TEAM = "🤖 Bots"
+
+
+def is_bot(name):
+    return name.startswith(BOT_PREFIX)
+
+
+def remaining(trade):
+    # Open quantity of an offer; older records have no "filled" field
+    if trade.get("matched") or trade.get("cancelled"):
+        return 0
+    return trade["quantity"] - trade.get("filled", 0)
+
+
+def filled(trade):
+    # Shares traded on an offer; in older records only a matched offer traded
+    # (all of it), a cancelled one none
+    return trade.get("filled", trade["quantity"] if trade.get("matched") else 0)
+
+
+def apply_fill(buyer, seller, ticker, qty, price):
+    # Cash moves from buyer to seller; the buyer's entry price is averaged in,
+    # and a seller without the ticker opens a short at the fill price.
+    total = price * qty
+    buyer["cash"] -= total
+    seller["cash"] += total
+
+    positions = buyer.setdefault("positions", {})
+    if ticker in positions:
+        old_qty = positions[ticker]["qty"]
+        old_price = positions[ticker]["entry_price"]
+        new_qty = old_qty + qty
+        avg_price = (old_price * old_qty + price * qty) / new_qty if new_qty else price
+        positions[ticker] = {"qty": new_qty, "entry_price": avg_price}
+    else:
+        positions[ticker] = {"qty": qty, "entry_price": price}
+
+    positions = seller.setdefault("positions", {})
+    if ticker in positions:
+        positions[ticker]["qty"] -= qty
+    else:
+        positions[ticker] = {"qty": -qty, "entry_price": price}
+
+
+@timed("utils.create_user")
+def create_user(users_file, name, team, cash=10000, check=None, after=None):
+    _attach(users_file, {})
+
+    def run(tx):
+        record = tx.get(users_file, name)
+        if record is None:
+            record = {"cash": cash, "positions": {}, "pnl": 0, "team": team}
+            tx.put(users_file, name, record)
+        return record
+    return transact(users_file, run, check=check, after=after)
+
+
+@timed("utils.match_trade")
+def match_trade(users_file, trades_file, index, taker, expected=None, check=None, after=None):
+    # Accept what is left of open offer `index` on behalf of `taker`. Returns
+    # (ok, message, trade); the cash transfer, both positions and the offer
+    # update commit as one record. Archiving renumbers open offers, so a caller
+    # holding an index from an earlier read passes the offer it saw as `expected`.
+    # check/after are the commit hooks of transact().
+    _attach(users_file, {})
+    _attach(trades_file, [])
+    _same_store(users_file, trades_file)
+
+    def run(tx):
+        trade = tx.get(trades_file, index)
+        if trade is None or remaining(trade) <= 0:
+            return False, "This offer has already been taken.", trade
+        if expected is not None and any(trade[k] != expected[k] for k in ("user", "ticker", "direction", "price", "quantity")):
+            return False, "This offer is no longer available.", trade
+        if trade["user"] == taker:
+            return False, "You can't accept your own offer.", trade
+        buyer, seller = (taker, trade["user"]) if trade["direction"] == "Sell" else (trade["user"], taker)
+        buyer_rec = tx.get(users_file, buyer)
+        seller_rec = tx.get(users_file, seller)
+        if buyer_rec is None or seller_rec is None:
+            return False, "That trader is no longer in the game.", trade
+        qty = remaining(trade)
+        if buyer_rec["cash"] < trade["price"] * qty:
+            if buyer == taker:
+                return False, "You don't have enough cash to complete this trade.", trade
+            return False, f"{buyer} doesn't have enough cash to complete this trade.", trade
+        apply_fill(buyer_rec, seller_rec, trade["ticker"], qty, trade["price"])
+        trade["filled"] = trade["quantity"]
+        trade["matched"] = True
+        tx.put(users_file, buyer, buyer_rec)
+        tx.put(users_file, seller, seller_rec)
+        tx.put(trades_file, index, trade)
+        return True, "", trade
+    return transact(users_file, run, check=check, after=after)
+
+
+@timed("utils.close_position")
+def close_position(users_file, closed_trades_file, name, ticker, market_price, timestamp, after=None):
+    # Returns the closed-trade record, or None if there was nothing to close
+    _attach(users_file, {})
+    _attach(closed_trades_file, [])
+    _same_store(users_file, closed_trades_file)
+
+    def run(tx):
+        user = tx.get(users_file, name)
+        pos = (user or {}).get("positions", {}).get(ticker)
+        if not pos or pos["qty"] == 0:
+            return None
+        qty = pos["qty"]
+        entry_price = pos["entry_price"]
+        pnl = qty * (market_price - entry_price)
+        direction = "Long" if qty > 0 else "Short"
+
+        # Adjust cash correctly
+        if qty > 0:
+            user["cash"] += qty * market_price
+        else:
+            user["cash"] -= abs(qty) * market_price
+        pos["qty"] = 0
+
+        closed = {
+            "user": name,
+            "team": user.get("team") or "No Team",
+            "ticker": ticker,
+            "qty": qty,
+            "entry_price": entry_price,
+            "exit_price": market_price,
+            "pnl": pnl,
+            "timestamp": timestamp,
+            "direction": direction,
+        }
+        tx.put(users_file, name, user)
+        tx.append(closed_trades_file, closed)
+        return closed
+    return transact(users_file, run, after=after)
+
+
+def _attach(filepath, empty):
+    return get_store(filepath).collection(filepath, empty)
+
+def _load(filepath, empty):
+    store = get_store(filepath)
+    _attach(filepath, empty)
+    store.refresh()
+    with store.lock():
+        return copy_value(_attach(filepath, empty))
+
+def _write(filepath, empty, op):
+    _attach(filepath, empty)
+    return get_store(filepath).write([[collection_name(filepath)] + op])[0]
+
+def _same_store(*filepaths):
+    if len({id(get_store(p)) for p in filepaths}) != 1:
+        raise ValueError("files written together must live in the same data directory")